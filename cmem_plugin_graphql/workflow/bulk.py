@@ -0,0 +1,23 @@
+"""Bulk mutation module"""
+
+from typing import Any
+
+# result of a bulk mutation (None if it failed), number of entities, number of failed entities
+BulkResult = tuple[dict[str, Any] | None, int, int]
+
+
+def failed_items(errors: list[Any], size: int) -> set[int] | None:
+    """Get the list indexes of the items which caused errors
+
+    The index of an item is the first list index in the path of an error, e.g.
+    3 in ["createItems", 3, "id"]. None is returned if an error can not be
+    mapped to an item, so the whole mutation has to be considered failed.
+    """
+    failed: set[int] = set()
+    for error in errors:
+        path = error.get("path") if isinstance(error, dict) else None
+        index = next((_ for _ in path or () if isinstance(_, int)), None)
+        if index is None or not 0 <= index < size:
+            return None
+        failed.add(index)
+    return failed
@@ -0,0 +1,173 @@
+"""Cache module"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, ClassVar
+
+# a cache directory is pruned after every PRUNE_FRACTION-th part of max_size writes
+PRUNE_FRACTION = 10
+
+
+def auth_identity(headers: dict[str, str]) -> str:
+    """Get a non-reversible identity of the credentials in the request headers"""
+    authorization = headers.get("Authorization", "")
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+
+class JsonCache:
+    """Cache for JSON objects with a time to live
+
+    Entries are held in memory, in an LRU of at most max_size entries (unlimited
+    if None). Each cache has its own memory, unless a shared memory is given. If a
+    directory is given, entries are also persisted there as JSON files. The
+    directory is pruned on the first write and then after every PRUNE_FRACTION-th
+    part of max_size writes: expired files are removed, then the oldest files
+    down to max_size files. Entries older than ttl seconds are ignored, a ttl of
+    0 disables the cache.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        directory: str = "",
+        max_size: int | None = None,
+        memory: OrderedDict[str, tuple[float, Any]] | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self.max_size = max_size
+        self.memory: OrderedDict[str, tuple[float, Any]] = (
+            memory if memory is not None else OrderedDict()
+        )
+        self.prune_interval = max(1, (max_size or 0) // PRUNE_FRACTION)
+        # writes since the directory was pruned, None before it was pruned
+        self.unpruned_writes: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """True, if entries are cached"""
+        return self.ttl > 0
+
+    def _is_fresh(self, created: float) -> bool:
+        return time.time() - created < self.ttl
+
+    def _remember(self, key: str, created: float, value: Any) -> None:  # noqa: ANN401
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        if self.max_size is not None:
+            while len(self.memory) > self.max_size:
+                self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Any | None:  # noqa: ANN401
+        """Get a cached value or None"""
+        if not self.enabled:
+            return None
+        entry = self.memory.get(key)
+        if entry and self._is_fresh(entry[0]):
+            self.memory.move_to_end(key)
+            return entry[1]
+        if self.directory:
+            path = self.directory / f"{key}.json"
+            try:
+                created = path.stat().st_mtime
+                if self._is_fresh(created):
+                    value = json.loads(path.read_text(encoding="utf-8"))
+                    self._remember(key, created, value)
+                    return value
+            except (OSError, json.decoder.JSONDecodeError):
+                pass
+        return None
+
+    def set(self, key: str, value: Any) -> None:  # noqa: ANN401
+        """Store a value"""
+        if not self.enabled:
+            return
+        self._remember(key, time.time(), value)
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                json.dump(value, file)
+            Path(temp_name).replace(self.directory / f"{key}.json")
+            if self.unpruned_writes is None or self.unpruned_writes + 1 >= self.prune_interval:
+                self.prune()
+            else:
+                self.unpruned_writes += 1
+
+    def prune(self) -> None:
+        """Remove expired files and the oldest files beyond max_size from the directory"""
+        if self.directory is None:
+            return
+        files: list[tuple[float, Path]] = []
+        for path in self.directory.glob("*.json"):
+            with suppress(OSError):
+                created = path.stat().st_mtime
+                if self._is_fresh(created):
+                    files.append((created, path))
+                else:
+                    path.unlink()
+        if self.max_size is not None and len(files) > self.max_size:
+            files.sort()
+            for _, path in files[: len(files) - self.max_size]:
+                with suppress(OSError):
+                    path.unlink()
+        self.unpruned_writes = 0
+
+    def clear(self) -> None:
+        """Clear the in-memory cache"""
+        self.memory.clear()
+
+
+class SchemaCache(JsonCache):
+    """Cache for GraphQL introspection results
+
+    Entries are keyed by endpoint URL and auth identity. Entries older than ttl
+    seconds are refetched. There are only a few schemata, so all schema caches
+    share one memory for the lifetime of the process.
+    """
+
+    _memory: ClassVar[OrderedDict[str, tuple[float, Any]]] = OrderedDict()
+
+    def __init__(self, ttl: float = 3600, directory: str = "") -> None:
+        super().__init__(ttl=ttl, directory=directory, memory=self._memory)
+
+    @staticmethod
+    def key(url: str, headers: dict[str, str]) -> str:
+        """Get the cache key for an endpoint and its credentials"""
+        return hashlib.sha256(f"{url}\n{auth_identity(headers)}".encode()).hexdigest()
+
+
+class ResponseCache(JsonCache):
+    """Cache for results of GraphQL query operations
+
+    Entries are keyed by endpoint URL, auth identity, the normalized document and
+    the variable values. Cached results are shared and must not be modified.
+    Hits and misses of this instance are counted.
+    """
+
+    def __init__(self, ttl: float = 0, max_size: int = 1000, directory: str = "") -> None:
+        super().__init__(ttl=ttl, directory=directory, max_size=max_size)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url: str, headers: dict[str, str], query: str, variable_values: Any) -> str:  # noqa: ANN401
+        """Get the cache key for a request"""
+        variables = json.dumps(variable_values or {}, sort_keys=True)
+        request = f"{url}\n{auth_identity(headers)}\n{query}\n{variables}"
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Get a cached result or None and count the hit or miss"""
+        result: dict[str, Any] | None = super().get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
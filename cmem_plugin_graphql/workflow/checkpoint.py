@@ -0,0 +1,138 @@
+"""Checkpoint module"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import IO, Any
+
+# seconds between two saved states
+CHECKPOINT_INTERVAL = 1.0
+
+
+class Checkpoint:
+    """Progress and partial output of an execution, kept in a local directory
+
+    The state records the position of the execution (completed input entities or
+    pages), the variables of the next page and the start time of the execution.
+    Successful results are appended to a JSON Lines file, the state records its
+    size, so a later execution can replay the results and resume at the position.
+    The state is saved at most every CHECKPOINT_INTERVAL seconds and on close.
+    After a successful execution, finish removes the files and keeps the start
+    time as watermark of the next incremental execution. The key needs to
+    identify the execution, the position is applied to whatever input comes next.
+    """
+
+    def __init__(self, directory: str, key: str) -> None:
+        self.directory = Path(directory)
+        self.state_path = self.directory / f"{key}.state.json"
+        self.output_path = self.directory / f"{key}.results.jsonl"
+        self.watermark_path = self.directory / f"{key}.watermark.json"
+        self.state: dict[str, Any] = {}
+        self.output: IO[bytes] | None = None
+        self.saved = 0.0
+
+    @staticmethod
+    def key(*parts: Any) -> str:  # noqa: ANN401
+        """Get the key of an execution from its task and configuration"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @property
+    def position(self) -> int:
+        """Number of completed input entities or pages"""
+        return int(self.state.get("position", 0))
+
+    @property
+    def resumed(self) -> bool:
+        """True, if the execution continues an interrupted execution"""
+        return self.position > 0
+
+    def _load(self) -> dict[str, Any] | None:
+        """Load the state of an interrupted execution, None if there is no valid state"""
+        try:
+            state: dict[str, Any] = json.loads(self.state_path.read_text(encoding="utf-8"))
+            complete = self.output_path.stat().st_size >= int(state["output_size"])
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+        return state if complete else None
+
+    def start(self) -> None:
+        """Load the state of an interrupted execution, or start a new one"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.state = self._load() or {
+            "position": 0,
+            "output_size": 0,
+            "started": datetime.now(tz=UTC).isoformat(timespec="seconds"),
+        }
+        # results after the last saved state are fetched again
+        with self.output_path.open("ab") as output:
+            output.truncate(self.state["output_size"])
+        self.output = self.output_path.open("ab")
+        self.saved = time.monotonic()
+
+    def replay(self) -> Iterator[dict[str, Any]]:
+        """Get the results of the interrupted execution"""
+        if not self.resumed:
+            return
+        with self.output_path.open(encoding="utf-8") as output:
+            for line in output:
+                yield json.loads(line)
+
+    def add(self, result: dict[str, Any] | None, entities: int = 1, **state: Any) -> None:  # noqa: ANN401
+        """Record a completed entity or page (result None if it failed)
+
+        A result of several input entities (e.g. a bulk mutation) completes entities.
+        """
+        if self.output is None:
+            raise RuntimeError("Checkpoint is not started.")
+        if result is not None:
+            self.output.write(json.dumps(result).encode("utf-8") + b"\n")
+        self.state.update(state, position=self.position + entities)
+        if time.monotonic() - self.saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        """Save the state, after the partial output was flushed"""
+        if self.output is None:
+            return
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.state["output_size"] = self.output.tell()
+        file_descriptor, temp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            json.dump(self.state, file)
+        Path(temp_name).replace(self.state_path)
+        self.saved = time.monotonic()
+
+    def close(self) -> None:
+        """Save the state and close the partial output, so the execution can be resumed"""
+        if self.output is None:
+            return
+        self.save()
+        self.output.close()
+        self.output = None
+
+    def finish(self) -> None:
+        """Remove state and partial output, keep the start time as watermark"""
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+        if "started" in self.state:
+            self.watermark_path.write_text(
+                json.dumps({"watermark": self.state["started"]}), encoding="utf-8"
+            )
+        self.state_path.unlink(missing_ok=True)
+        self.output_path.unlink(missing_ok=True)
+        self.state = {}
+
+    def watermark(self) -> str | None:
+        """Get the start time of the last successful execution (ISO 8601), if known"""
+        try:
+            value = json.loads(self.watermark_path.read_text(encoding="utf-8"))["watermark"]
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+        return str(value)
@@ -0,0 +1,105 @@
+"""JSON codec and HTTP body compression module
+
+orjson serializes JSON if it is installed and decodes it if this is asked for,
+brotli and zstd compression are available if one of the packages aiohttp uses
+for them is installed. aiohttp is only imported when a session asks for the
+supported response encodings.
+"""
+
+import gzip
+import json
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import brotlicffi as brotli
+except ImportError:
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+try:
+    from compression import zstd  # type: ignore[import-not-found]
+except ImportError:
+    try:
+        from backports import zstd  # type: ignore[import-not-found,no-redef]
+    except ImportError:
+        zstd = None
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_DEFLATE = "deflate"
+COMPRESSION_BROTLI = "br"
+COMPRESSION_ZSTD = "zstd"
+
+COMPRESSION_MODES = OrderedDict(
+    {
+        COMPRESSION_NONE: "No compression",
+        COMPRESSION_GZIP: "gzip",
+        COMPRESSION_BROTLI: "Brotli (needs the brotli package)",
+        COMPRESSION_ZSTD: "Zstandard (needs Python 3.14 or the backports.zstd package)",
+    }
+)
+
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    COMPRESSION_GZIP: lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+    COMPRESSION_DEFLATE: lambda data: zlib.compress(data, level=6),
+}
+if brotli is not None:
+    COMPRESSORS[COMPRESSION_BROTLI] = lambda data: brotli.compress(data, quality=5)
+if zstd is not None:
+    COMPRESSORS[COMPRESSION_ZSTD] = zstd.compress
+
+
+def accept_encoding() -> str:
+    """Get the content codings of responses which aiohttp can decode"""
+    from aiohttp import compression_utils
+
+    encodings = [COMPRESSION_GZIP, COMPRESSION_DEFLATE]
+    if getattr(compression_utils, "HAS_BROTLI", False):
+        encodings.append(COMPRESSION_BROTLI)
+    if getattr(compression_utils, "HAS_ZSTD", False):
+        encodings.append(COMPRESSION_ZSTD)
+    return ", ".join(encodings)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a request body with a content coding"""
+    compressor = COMPRESSORS.get(encoding)
+    if compressor is None:
+        raise ValueError(f"Compression '{encoding}' is not available.")
+    return compressor(data)
+
+
+def dumps(value: Any) -> bytes:  # noqa: ANN401
+    """Serialize a value as UTF-8 encoded JSON
+
+    Values orjson can not serialize, e.g. integers beyond 64 bits, are serialized
+    with json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: str | bytes, fast: bool = False) -> Any:  # noqa: ANN401
+    """Deserialize JSON text or UTF-8 encoded JSON
+
+    With fast, orjson is used, which decodes integers beyond 64 bits as floats.
+    """
+    if fast:
+        if orjson is None:
+            raise ValueError("Fast JSON decoding needs the orjson package.")
+        return orjson.loads(data)
+    return json.loads(data)
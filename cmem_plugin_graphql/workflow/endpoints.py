@@ -0,0 +1,119 @@
+"""Endpoint load balancing module"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aiohttp
+
+BALANCING_LEAST_OUTSTANDING = "least_outstanding"
+BALANCING_LATENCY = "latency"
+
+BALANCING_MODES = OrderedDict(
+    {
+        BALANCING_LEAST_OUTSTANDING: "Least outstanding requests",
+        BALANCING_LATENCY: "Latency weighted",
+    }
+)
+
+# consecutive failed requests which eject an endpoint
+EJECTION_FAILURES = 3
+# seconds an endpoint is ejected, doubled with each further ejection
+EJECTION_SECONDS = 5.0
+MAX_EJECTION_SECONDS = 60.0
+# weight of the latest round trip in the latency average of an endpoint
+LATENCY_WEIGHT = 0.3
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Check if a failed request indicates an unhealthy endpoint
+
+    Connection errors, timeouts and server errors (5xx) count, GraphQL errors
+    and rejected requests (4xx) do not.
+    """
+    import aiohttp
+    from gql.transport.exceptions import TransportServerError
+
+    if isinstance(error, TransportServerError):
+        return error.code is not None and error.code >= 500  # noqa: PLR2004
+    return isinstance(error, aiohttp.ClientConnectionError | TimeoutError)
+
+
+class Endpoint:
+    """A replica of the GraphQL endpoint with its connection pool and health"""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.session: aiohttp.ClientSession | None = None
+        self.outstanding = 0
+        # average round trip in seconds, 0 until the first request returned
+        self.latency = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now: float) -> bool:
+        """Check if the endpoint is ejected at time now (monotonic)"""
+        return now < self.ejected_until
+
+    def cost(self, mode: str) -> tuple[float, ...]:
+        """Get the cost of sending the next request to this endpoint"""
+        if mode == BALANCING_LATENCY:
+            return (self.outstanding + 1) * self.latency, self.outstanding, self.failures
+        return self.outstanding, self.failures, self.latency
+
+
+class EndpointPool:
+    """Distribute requests across the replicas of a GraphQL endpoint
+
+    Each endpoint has its own keep-alive connection pool. Each request is sent to
+    the endpoint with the least outstanding requests or, latency weighted, with the
+    lowest latency average times outstanding requests (endpoints without measured
+    latency are tried first). Ties go to endpoints with fewer recent failures.
+    After EJECTION_FAILURES consecutive failed requests, an endpoint is ejected for
+    EJECTION_SECONDS, doubled with each further ejection up to MAX_EJECTION_SECONDS.
+    If all endpoints are ejected, the one whose ejection ends first is used.
+    """
+
+    def __init__(self, urls: Sequence[str], mode: str = BALANCING_LEAST_OUTSTANDING) -> None:
+        if not urls:
+            raise ValueError("Endpoint pool needs at least one URL.")
+        if mode not in BALANCING_MODES:
+            raise ValueError(f"Unknown load balancing '{mode}'.")
+        self.endpoints = [Endpoint(_) for _ in dict.fromkeys(urls)]
+        self.mode = mode
+
+    def acquire(self) -> Endpoint:
+        """Choose the endpoint of the next request"""
+        now = time.monotonic()
+        available = [_ for _ in self.endpoints if not _.is_ejected(now)]
+        if available:
+            endpoint = min(available, key=lambda _: _.cost(self.mode))
+        else:
+            endpoint = min(self.endpoints, key=lambda _: _.ejected_until)
+        endpoint.outstanding += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, seconds: float, failed: bool = False) -> bool:
+        """Record the round trip of a request, True if the endpoint got ejected"""
+        endpoint.outstanding -= 1
+        if endpoint.latency:
+            endpoint.latency += LATENCY_WEIGHT * (seconds - endpoint.latency)
+        else:
+            endpoint.latency = seconds
+        if not failed:
+            endpoint.failures = 0
+            endpoint.ejections = 0
+            return False
+        endpoint.failures += 1
+        if endpoint.failures < EJECTION_FAILURES or len(self.endpoints) == 1:
+            return False
+        duration = min(MAX_EJECTION_SECONDS, EJECTION_SECONDS * 2**endpoint.ejections)
+        endpoint.ejected_until = time.monotonic() + duration
+        endpoint.ejections += 1
+        endpoint.failures = 0
+        # the latency is measured again when the endpoint is back
+        endpoint.latency = 0.0
+        return True
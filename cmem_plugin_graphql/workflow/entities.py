@@ -0,0 +1,228 @@
+"""Output entities module"""
+
+import json
+import uuid
+from collections import deque
+from collections.abc import Iterator
+from itertools import chain, islice
+from typing import Any
+
+from cmem_plugin_base.dataintegration.entity import (
+    Entities,
+    Entity,
+    EntityPath,
+    EntitySchema,
+)
+from cmem_plugin_base.dataintegration.plugins import PluginLogger
+
+from cmem_plugin_graphql.workflow.projection import Projection
+
+ROOT_PATH = "root"
+# number of results the schemata are derived from
+SCHEMA_SAMPLE_SIZE = 100
+
+# kinds of the values of a key
+KIND_NULL = "null"
+KIND_VALUE = "value"
+KIND_VALUES = "values"
+KIND_LIST = "list"
+KIND_OBJECT = "object"
+KIND_OBJECTS = "objects"
+KIND_JSON = "json"
+RELATION_KINDS = (KIND_OBJECT, KIND_OBJECTS)
+MULTI_VALUE_KINDS = (KIND_LIST, KIND_VALUES, KIND_OBJECTS)
+
+Kinds = dict[str, dict[str, str]]
+
+
+def get_kind(value: Any) -> str:  # noqa: ANN401
+    """Get the kind of a value"""
+    if isinstance(value, dict):
+        return KIND_OBJECT
+    if not isinstance(value, list):
+        return KIND_NULL if value is None else KIND_VALUE
+    if not value:
+        return KIND_LIST
+    objects = [isinstance(_, dict) for _ in value if _ is not None]
+    if not any(objects):
+        return KIND_VALUES
+    return KIND_OBJECTS if all(objects) else KIND_JSON
+
+
+def merge_kinds(kind: str, other: str) -> str:
+    """Get the kind which holds the values of both kinds
+
+    Objects and values of the same key are output as JSON values.
+    """
+    if other in (kind, KIND_NULL):
+        return kind
+    if kind == KIND_NULL:
+        return other
+    if KIND_LIST in (kind, other):
+        items = other if kind == KIND_LIST else kind
+        return {KIND_VALUE: KIND_VALUES, KIND_OBJECT: KIND_OBJECTS}.get(items, items)
+    if {kind, other} == {KIND_VALUE, KIND_VALUES}:
+        return KIND_VALUES
+    if {kind, other} == {KIND_OBJECT, KIND_OBJECTS}:
+        return KIND_OBJECTS
+    return KIND_JSON
+
+
+def collect_kinds(data: dict[str, Any], path: str, kinds: Kinds) -> None:
+    """Merge the kinds of the (nested) values of a result into kinds"""
+    path_kinds = kinds.setdefault(path, {})
+    for key, value in data.items():
+        path_kinds[key] = merge_kinds(path_kinds.get(key, KIND_NULL), get_kind(value))
+        items = [value] if isinstance(value, dict) else value if isinstance(value, list) else []
+        for item in items:
+            if isinstance(item, dict):
+                collect_kinds(item, f"{path}/{key}", kinds)
+
+
+def get_schemas(kinds: Kinds, path: str = ROOT_PATH) -> dict[str, EntitySchema]:
+    """Get the entity schema of each path which is reachable by relations"""
+    path_kinds = kinds.get(path, {})
+    schemas = {
+        path: EntitySchema(
+            type_uri="",
+            paths=[
+                EntityPath(
+                    path=key,
+                    is_relation=kind in RELATION_KINDS,
+                    is_single_value=kind not in MULTI_VALUE_KINDS,
+                )
+                for key, kind in path_kinds.items()
+            ],
+        )
+    }
+    for key, kind in path_kinds.items():
+        if kind in RELATION_KINDS:
+            schemas.update(get_schemas(kinds, f"{path}/{key}"))
+    return schemas
+
+
+def entity_value(value: Any) -> str:  # noqa: ANN401
+    """Get the entity value of a value, objects and lists are JSON values"""
+    if isinstance(value, dict | list):
+        return json.dumps(value)
+    return f"{value}"
+
+
+class LazyEntityBuilder:
+    """Build output entities from a stream of results while they arrive
+
+    The schemata are derived from the first SCHEMA_SAMPLE_SIZE results, keys which
+    hold objects in some and other values in other results are JSON values. Later
+    results are converted as they arrive, values which do not fit into the
+    schemata are output as JSON values or, for relations and unknown keys, left
+    out, with a warning for each key. Results are only pulled from the stream
+    when one of the entity collections is iterated, so downstream tasks can
+    consume entities while queries are still running. Entities of the other
+    collections are buffered until they are consumed.
+    """
+
+    def __init__(
+        self,
+        sample: list[dict[str, Any]],
+        results: Iterator[dict[str, Any]],
+        log: PluginLogger | None = None,
+    ) -> None:
+        self.kinds: Kinds = {}
+        for result in sample:
+            collect_kinds(result, ROOT_PATH, self.kinds)
+        self.schemas = get_schemas(self.kinds)
+        self.results = chain(sample, results)
+        self.queues: dict[str, deque[Entity]] = {path: deque() for path in self.schemas}
+        self.log = log or PluginLogger()
+        self.warned: set[tuple[str, str]] = set()
+
+    def _warn(self, path: str, key: str, message: str) -> None:
+        """Log a warning about the values of a key, once per key"""
+        if (path, key) not in self.warned:
+            self.warned.add((path, key))
+            self.log.warning(f"Values of '{key}' in '{path}' {message}.")
+
+    def _pump(self) -> bool:
+        """Convert the next result into entities, False if there are no more results"""
+        result = next(self.results, None)
+        if result is None:
+            return False
+        self._add_entity(ROOT_PATH, result)
+        return True
+
+    def _relation_values(self, path: str, key: str, value: Any) -> list[str]:  # noqa: ANN401
+        """Create the sub entities of a relation value and get their URIs"""
+        items = value if isinstance(value, list) else [value]
+        if get_kind(value) not in (self.kinds[path][key], KIND_OBJECT, KIND_LIST):
+            self._warn(path, key, "do not fit into the schema, only objects are output")
+        sub_path = f"{path}/{key}"
+        return [self._add_entity(sub_path, _) for _ in items if isinstance(_, dict)]
+
+    def _values(self, path: str, key: str, value: Any) -> list[str]:  # noqa: ANN401
+        """Get the entity values of a value"""
+        kind = self.kinds[path][key]
+        if kind in (KIND_LIST, KIND_VALUES) and isinstance(value, list):
+            return [entity_value(_) for _ in value]
+        if isinstance(value, dict | list) and kind != KIND_JSON:
+            self._warn(path, key, "do not fit into the schema, they are output as JSON")
+        return [entity_value(value)]
+
+    def _add_entity(self, path: str, data: dict[str, Any]) -> str:
+        """Create the entity (and sub entities) of data at path and return its URI"""
+        schema = self.schemas[path]
+        values: list[list[str]] = []
+        for entity_path in schema.paths:
+            value = data.get(entity_path.path)
+            if value is None:
+                values.append([""])
+            elif entity_path.is_relation:
+                values.append(self._relation_values(path, entity_path.path, value))
+            else:
+                values.append(self._values(path, entity_path.path, value))
+        for key in data.keys() - self.kinds[path].keys():
+            self._warn(path, key, "are not in the schema, they are left out")
+        uri = f"urn:uuid:{uuid.uuid4()!s}"
+        self.queues[path].append(Entity(uri=uri, values=values))
+        return uri
+
+    def _entities(self, path: str) -> Iterator[Entity]:
+        queue = self.queues[path]
+        while True:
+            while queue:
+                yield queue.popleft()
+            if not self._pump():
+                return
+
+    def build(self) -> Entities:
+        """Get the lazy entities with their sub entities"""
+        return Entities(
+            entities=self._entities(ROOT_PATH),
+            schema=self.schemas[ROOT_PATH],
+            sub_entities=[
+                Entities(entities=self._entities(path), schema=schema)
+                for path, schema in self.schemas.items()
+                if path != ROOT_PATH
+            ],
+        )
+
+
+def build_lazy_entities(
+    results: Iterator[dict[str, Any]], log: PluginLogger | None = None
+) -> Entities | None:
+    """Build lazy output entities from results, None if there are no results"""
+    sample = list(islice(results, SCHEMA_SAMPLE_SIZE))
+    if not sample:
+        return None
+    return LazyEntityBuilder(sample, results, log).build()
+
+
+def build_projected_entities(results: Iterator[dict[str, Any]], projection: Projection) -> Entities:
+    """Build lazy output entities with the columns of a projection, one per row of a result"""
+    return Entities(
+        entities=(
+            Entity(uri=f"urn:uuid:{uuid.uuid4()!s}", values=values)
+            for result in results
+            for values in projection.rows(result)
+        ),
+        schema=EntitySchema(type_uri="", paths=[EntityPath(path=_) for _ in projection.columns]),
+    )
@@ -1,15 +1,20 @@
-"""GraphQL workflow plugin module"""
+"""GraphQL workflow plugin module
+
+The plugin module is loaded by the plugin discovery of every DataIntegration
+worker, so the GraphQL client, its transports and the template machinery are
+imported on first use (when the plugin is created or executed), not here.
+"""
 
-import io
 import json
-from collections.abc import Iterator, Sequence
-from typing import Any
+import time
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any
 
-import jinja2
-import validators
 from cmem_plugin_base.dataintegration.context import ExecutionContext, ExecutionReport
 from cmem_plugin_base.dataintegration.description import Plugin, PluginParameter
 from cmem_plugin_base.dataintegration.entity import Entities
+from cmem_plugin_base.dataintegration.parameter.choice import ChoiceParameterType
 from cmem_plugin_base.dataintegration.parameter.dataset import DatasetParameterType
 from cmem_plugin_base.dataintegration.parameter.multiline import (
     MultilineStringParameterType,
@@ -19,16 +24,50 @@ from cmem_plugin_base.dataintegration.ports import (
     UnknownSchemaPort,
 )
 from cmem_plugin_base.dataintegration.utils import write_to_dataset
-from cmem_plugin_base.dataintegration.utils.entity_builder import build_entities_from_data
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
-from graphql import GraphQLError, GraphQLSyntaxError
 
+from cmem_plugin_graphql.workflow.bulk import BulkResult, failed_items
+from cmem_plugin_graphql.workflow.cache import ResponseCache, SchemaCache
+from cmem_plugin_graphql.workflow.checkpoint import Checkpoint
+from cmem_plugin_graphql.workflow.codec import COMPRESSION_MODES, COMPRESSION_NONE
+from cmem_plugin_graphql.workflow.endpoints import BALANCING_LEAST_OUTSTANDING, BALANCING_MODES
+from cmem_plugin_graphql.workflow.entities import build_lazy_entities, build_projected_entities
+from cmem_plugin_graphql.workflow.metrics import (
+    STAGE_PARSE,
+    STAGE_RENDER,
+    STAGE_UPLOAD,
+    STAGE_WRITE,
+    Metrics,
+)
+from cmem_plugin_graphql.workflow.pagination import (
+    PAGINATION_MODES,
+    PAGINATION_NONE,
+    next_page_variables,
+)
+from cmem_plugin_graphql.workflow.persisted import PERSISTED_QUERIES_MODES, PERSISTED_QUERIES_NONE
+from cmem_plugin_graphql.workflow.projection import parse_projection
+from cmem_plugin_graphql.workflow.stages import StageContext, staged
 from cmem_plugin_graphql.workflow.utils import (
+    batched,
     get_dict,
+    get_template,
     is_jinja_template,
+    parse_query,
+)
+from cmem_plugin_graphql.workflow.writer import (
+    OUTPUT_FORMAT_JSON,
+    OUTPUT_FORMATS,
+    JsonResultWriter,
 )
 
+if TYPE_CHECKING:
+    from graphql import DocumentNode
+
+    from cmem_plugin_graphql.workflow.session import GraphQLRequest
+    from cmem_plugin_graphql.workflow.template_variables import VariableTemplate
+
+# minimum seconds between progress report updates
+REPORT_INTERVAL = 1.0
+
 
 @Plugin(
     label="GraphQL query",
@@ -93,6 +132,40 @@ fruits {
             advanced=True,
             default_value="",
         ),
+        PluginParameter(
+            name="output_format",
+            label="Output format",
+            description="The format of the file written to the target JSON dataset."
+            " JSON Lines writes one result per line and needs a dataset which reads"
+            " JSON Lines.",
+            param_type=ChoiceParameterType(OUTPUT_FORMATS),
+            advanced=True,
+            default_value=OUTPUT_FORMAT_JSON,
+        ),
+        PluginParameter(
+            name="pretty_print",
+            label="Pretty print",
+            description="Indent the JSON array written to the target dataset. Disable"
+            " this to reduce the size of large outputs.",
+            advanced=True,
+            default_value=True,
+        ),
+        PluginParameter(
+            name="projection",
+            label="Projection",
+            description="""Columns of the output entities, one `column: path` per line.
+
+            Only the selected values of the results are converted into entities, e.g.:
+            id: $.fruits[*].id
+            name: $.fruits[*].fruit_name
+            With `[*]`, each item of the list is one row, other columns are repeated
+            in each row. Without column name, the last key of the path is used.
+            Not used with a target dataset.
+            """,
+            advanced=True,
+            default_value="",
+            param_type=MultilineStringParameterType(),
+        ),
         PluginParameter(
             name="oauth_access_token",
             label="OAuth access token",
@@ -101,38 +174,504 @@ fruits {
             advanced=True,
             default_value="",
         ),
+        PluginParameter(
+            name="max_concurrent_requests",
+            label="Maximum concurrent requests",
+            description="The maximum number of queries sent in parallel when a query"
+            " is executed per input entity. Results are still output in input order."
+            " Use 1 if the operations depend on each other (e.g. ordered mutations).",
+            advanced=True,
+            default_value=1,
+        ),
+        PluginParameter(
+            name="connection_pool_size",
+            label="Connection pool size",
+            description="The maximum number of keep-alive connections to the GraphQL"
+            " endpoint. All queries of a task execution share this connection pool.",
+            advanced=True,
+            default_value=10,
+        ),
+        PluginParameter(
+            name="graphql_replica_urls",
+            label="Replica endpoint URLs",
+            description="""Further URLs of the same GraphQL endpoint, one per line.
+
+            Requests are distributed across the endpoint URL and these replicas, each
+            with its own connection pool. A replica whose requests fail repeatedly
+            (connection errors, timeouts, server errors) is ejected for a while.
+            """,
+            advanced=True,
+            default_value="",
+            param_type=MultilineStringParameterType(),
+        ),
+        PluginParameter(
+            name="load_balancing",
+            label="Load balancing",
+            description="How requests are distributed across the endpoint URL and its"
+            " replicas: to the endpoint with the least outstanding requests, or weighted"
+            " by the measured latency of the endpoints.",
+            param_type=ChoiceParameterType(BALANCING_MODES),
+            advanced=True,
+            default_value=BALANCING_LEAST_OUTSTANDING,
+        ),
+        PluginParameter(
+            name="batch_size",
+            label="Batch size",
+            description="The number of per-entity operations sent together in one HTTP"
+            " request as a JSON array (Apollo-style query batching). Only use a value"
+            " greater than 1 if the endpoint supports batching.",
+            advanced=True,
+            default_value=1,
+        ),
+        PluginParameter(
+            name="persisted_queries",
+            label="Persisted queries",
+            description="Send Apollo automatic persisted queries: only the sha256 hash of"
+            " the query is sent, the full query only if the endpoint does not know the hash"
+            " yet. With GET, query operations are sent as HTTP GET requests, so CDNs and"
+            " gateway caches can answer them. The endpoint needs to support APQ.",
+            param_type=ChoiceParameterType(PERSISTED_QUERIES_MODES),
+            advanced=True,
+            default_value=PERSISTED_QUERIES_NONE,
+        ),
+        PluginParameter(
+            name="request_compression",
+            label="Request compression",
+            description="Compress request bodies (POST) with this content coding. The"
+            " endpoint needs to accept compressed requests.",
+            param_type=ChoiceParameterType(COMPRESSION_MODES),
+            advanced=True,
+            default_value=COMPRESSION_NONE,
+        ),
+        PluginParameter(
+            name="response_compression",
+            label="Response compression",
+            description="Ask the endpoint for compressed responses (gzip, deflate and, if"
+            " installed, Brotli and Zstandard). Disable it, if the compression costs more"
+            " than it saves, e.g. in a fast local network.",
+            advanced=True,
+            default_value=True,
+        ),
+        PluginParameter(
+            name="fast_json_decoding",
+            label="Fast JSON decoding",
+            description="Decode responses with orjson (needs the orjson package), which is"
+            " faster for large responses. Integers beyond 64 bits lose their precision.",
+            advanced=True,
+            default_value=False,
+        ),
+        PluginParameter(
+            name="template_variables",
+            label="Template variables",
+            description="Rewrite the jinja placeholders of a query template into GraphQL"
+            " variables, so the query is parsed and validated only once and each entity"
+            " only sends variable values. Placeholders need to be argument values, e.g."
+            ' `item(id: "{{ id }}")` or `first: {{ count }}`. The variable types are taken'
+            " from the schema or the template variable types. If the query can not be"
+            " rewritten, it is rendered per entity as before.",
+            advanced=True,
+            default_value=False,
+        ),
+        PluginParameter(
+            name="template_variable_types",
+            label="Template variable types",
+            description="""GraphQL types of the jinja placeholders, one per line.
+
+            Needed for placeholders without schema, e.g.: id: ID!
+            """,
+            advanced=True,
+            default_value="",
+            param_type=MultilineStringParameterType(),
+        ),
+        PluginParameter(
+            name="bulk_variable",
+            label="Bulk variable",
+            description="Name of a list variable of the query (e.g. `input` of"
+            " `mutation ($input: [ItemInput!]!) { createItems(input: $input) { id } }`)."
+            " If set, the rendered query variables of each input entity are one item of"
+            " this list and one operation is sent per bulk size entities. Errors with the"
+            " index of an item in their path only fail the entity of this item.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="bulk_size",
+            label="Bulk size",
+            description="Number of input entities sent as items of the bulk variable.",
+            advanced=True,
+            default_value=100,
+        ),
+        PluginParameter(
+            name="worker_processes",
+            label="Worker processes",
+            description="Number of processes which execute the per-entity queries. With more"
+            " than one, the input entities are split into shards which are rendered, sent"
+            " and decoded in parallel processes (each with its own connection pool), the"
+            " results keep the input order. Useful for very large inputs, when one CPU"
+            " core is saturated.",
+            advanced=True,
+            default_value=1,
+        ),
+        PluginParameter(
+            name="shard_size",
+            label="Shard size",
+            description="Number of input entities a worker process handles at a time.",
+            advanced=True,
+            default_value=1000,
+        ),
+        PluginParameter(
+            name="stage_queue_size",
+            label="Stage queue size",
+            description="Number of results buffered between fetching and the output"
+            " (conversion into entities or writing to the dataset). Fetching runs in its"
+            " own thread and pauses while the queue is full, so a slow output throttles"
+            " the requests. Use 0 to fetch and output one after another in one thread.",
+            advanced=True,
+            default_value=100,
+        ),
+        PluginParameter(
+            name="rate_limit",
+            label="Rate limit",
+            description="The maximum number of requests per second sent to the endpoint."
+            " Use 0 for no limit. Independent of this limit, fewer requests are sent in"
+            " parallel while the endpoint rejects requests because of load (429, 503).",
+            advanced=True,
+            default_value=0,
+        ),
+        PluginParameter(
+            name="max_retries",
+            label="Maximum retries",
+            description="The number of times a request is retried after the endpoint"
+            " rejected it (429, 503) or, for queries, after a gateway error (502, 504) or"
+            " a connection error."
+            " Retries wait with exponential backoff or as requested by Retry-After.",
+            advanced=True,
+            default_value=3,
+        ),
+        PluginParameter(
+            name="retry_backoff",
+            label="Retry backoff",
+            description="The base delay in seconds before the first retry, doubled for"
+            " every further retry.",
+            advanced=True,
+            default_value=0.5,
+        ),
+        PluginParameter(
+            name="pagination",
+            label="Pagination",
+            description="Follow pages automatically when the query is not executed per"
+            " input entity. Each page is output as soon as it arrives. Cursor pagination"
+            " reads pageInfo { hasNextPage endCursor } of the connection, offset pagination"
+            " increases the offset variable by the number of received items until a page"
+            " is empty.",
+            param_type=ChoiceParameterType(PAGINATION_MODES),
+            advanced=True,
+            default_value=PAGINATION_NONE,
+        ),
+        PluginParameter(
+            name="pagination_path",
+            label="Pagination path",
+            description="Dot separated path to the paginated connection (cursor) or list"
+            " (offset) in the response data, e.g. `fruits` or `shop.products`.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="pagination_variable",
+            label="Pagination variable",
+            description="The name of the query variable which receives the cursor"
+            " (e.g. `after`) or the offset (e.g. `offset`) of the next page.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="fetch_schema",
+            label="Validate queries against the schema",
+            description="Fetch the schema of the endpoint with an introspection query and"
+            " validate queries locally before sending them.",
+            advanced=True,
+            default_value=True,
+        ),
+        PluginParameter(
+            name="schema_cache_ttl",
+            label="Schema cache lifetime",
+            description="The number of seconds a fetched schema is reused for the same"
+            " endpoint and access token. Use 0 to fetch the schema on every execution.",
+            advanced=True,
+            default_value=3600,
+        ),
+        PluginParameter(
+            name="schema_cache_directory",
+            label="Schema cache directory",
+            description="Optional local directory where fetched schemas are persisted,"
+            " so they survive restarts of the plugin process.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="response_cache_ttl",
+            label="Response cache lifetime",
+            description="The number of seconds results of query operations are reused for"
+            " identical requests (same endpoint, access token, query and variables)."
+            " Mutations are never cached. Use 0 to disable the response cache.",
+            advanced=True,
+            default_value=0,
+        ),
+        PluginParameter(
+            name="response_cache_size",
+            label="Response cache size",
+            description="The maximum number of results held by the response cache of an"
+            " execution, in memory and in the response cache directory.",
+            advanced=True,
+            default_value=1000,
+        ),
+        PluginParameter(
+            name="response_cache_directory",
+            label="Response cache directory",
+            description="Optional local directory where cached results are persisted,"
+            " so they can be reused by later executions and plugin processes. Expired and"
+            " the oldest results beyond the response cache size are removed.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="checkpoint_directory",
+            label="Checkpoint directory",
+            description="Optional local directory where the progress and the results of an"
+            " execution are recorded. If an execution fails, the next execution of the task"
+            " with the same configuration and input paths replays the recorded results and"
+            " resumes after the last completed input entity or page. The input entities"
+            " are not compared: the next execution skips as many input entities as were"
+            " completed, so it needs to get the same input.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="incremental_variable",
+            label="Incremental variable",
+            description="Name of a query variable which gets the start time (ISO 8601, UTC)"
+            " of the last successful execution, e.g. to fetch only records changed since"
+            " then. It is null for the first execution. Needs a checkpoint directory, not"
+            " used for queries executed per entity.",
+            advanced=True,
+            default_value="",
+        ),
+        PluginParameter(
+            name="log_metrics",
+            label="Log metrics",
+            description="Log the timings (latency percentiles per stage), request rate,"
+            " transferred bytes and counters of each execution as one JSON line.",
+            advanced=True,
+            default_value=False,
+        ),
     ],
 )
 class GraphQLPlugin(WorkflowPlugin):
     """GraphQL Workflow Plugin to query GraphQL APIs"""
 
     # pylint: disable=too-many-arguments
-    def __init__(  # nosec
+    def __init__(  # noqa: PLR0913 # nosec
         self,
         graphql_url: str,
         graphql_query: str,
         graphql_variable_values: str = "",
         graphql_dataset: str = "",
+        output_format: str = OUTPUT_FORMAT_JSON,
+        pretty_print: bool = True,
+        projection: str = "",
         oauth_access_token: str = "",
+        max_concurrent_requests: int = 1,
+        connection_pool_size: int = 10,
+        graphql_replica_urls: str = "",
+        load_balancing: str = BALANCING_LEAST_OUTSTANDING,
+        batch_size: int = 1,
+        persisted_queries: str = PERSISTED_QUERIES_NONE,
+        request_compression: str = COMPRESSION_NONE,
+        response_compression: bool = True,
+        fast_json_decoding: bool = False,
+        template_variables: bool = False,
+        template_variable_types: str = "",
+        bulk_variable: str = "",
+        bulk_size: int = 100,
+        worker_processes: int = 1,
+        shard_size: int = 1000,
+        stage_queue_size: int = 100,
+        rate_limit: float = 0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        pagination: str = PAGINATION_NONE,
+        pagination_path: str = "",
+        pagination_variable: str = "",
+        fetch_schema: bool = True,
+        schema_cache_ttl: int = 3600,
+        schema_cache_directory: str = "",
+        response_cache_ttl: int = 0,
+        response_cache_size: int = 1000,
+        response_cache_directory: str = "",
+        checkpoint_directory: str = "",
+        incremental_variable: str = "",
+        log_metrics: bool = False,
     ) -> None:
+        # the parameters create the plugins of worker processes
+        self.parameters = {key: value for key, value in locals().items() if key != "self"}
         self.graphql_query: str = ""
         self.graphql_variable_values: str = ""
         self.jinja_query: bool = False
         self.jinja_variable_values: bool = False
 
-        if not validators.url(graphql_url):
-            raise ValueError("Provide a valid GraphQL URL.")
+        from cmem_plugin_graphql.workflow.session import GraphQLSession
+        from cmem_plugin_graphql.workflow.template_variables import parse_variable_types
 
-        self.graphql_url = graphql_url
+        self.set_endpoints(graphql_url, graphql_replica_urls, load_balancing)
         self.set_graphql_query(graphql_query)
         self.set_graphql_variable_values(graphql_variable_values)
         self.graphql_dataset = graphql_dataset
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'.")
+        self.output_format = output_format
+        self.pretty_print = pretty_print
+        self.projection = parse_projection(projection)
         self.headers = {}
         if oauth_access_token:
             self.headers["Authorization"] = f"Bearer {oauth_access_token}"
+        if max_concurrent_requests < 1:
+            raise ValueError("Maximum concurrent requests needs to be a positive integer.")
+        self.max_concurrent_requests = max_concurrent_requests
+        if connection_pool_size < 1:
+            raise ValueError("Connection pool size needs to be a positive integer.")
+        self.connection_pool_size = connection_pool_size
+        if batch_size < 1:
+            raise ValueError("Batch size needs to be a positive integer.")
+        self.batch_size = batch_size
+        self.set_transport(
+            persisted_queries, request_compression, response_compression, fast_json_decoding
+        )
+        self.template_variables = template_variables
+        self.template_variable_types = tuple(parse_variable_types(template_variable_types).items())
+        self.variable_template: VariableTemplate | None = None
+        self.set_bulk(bulk_variable, bulk_size)
+        self.set_stages(worker_processes, shard_size, stage_queue_size)
+        self.set_throttling(rate_limit, max_retries, retry_backoff)
+        self.set_pagination(pagination, pagination_path, pagination_variable)
+        self.fetch_schema = fetch_schema
+        self.schema_cache = SchemaCache(ttl=schema_cache_ttl, directory=schema_cache_directory)
+        if response_cache_size < 1:
+            raise ValueError("Response cache size needs to be a positive integer.")
+        self.response_cache = ResponseCache(
+            ttl=response_cache_ttl,
+            max_size=response_cache_size,
+            directory=response_cache_directory,
+        )
+        self.set_checkpoint(checkpoint_directory, incremental_variable)
+        self.log_metrics = log_metrics
+        self.metrics = Metrics()
+        # called with the metrics of each execution, e.g. to export them to a monitoring system
+        self.metrics_hook: Callable[[dict[str, Any]], None] | None = None
+        self.session = GraphQLSession(
+            url=[self.graphql_url, *self.graphql_replica_urls],
+            headers=self.headers,
+            max_in_flight=self.max_concurrent_requests,
+            pool_size=self.connection_pool_size,
+            fetch_schema=self.fetch_schema,
+            schema_cache=self.schema_cache,
+            response_cache=self.response_cache,
+            rate_limit=self.rate_limit,
+            max_retries=self.max_retries,
+            retry_backoff=self.retry_backoff,
+            metrics=self.metrics,
+            persisted_queries=self.persisted_queries,
+            request_compression=self.request_compression,
+            response_compression=self.response_compression,
+            load_balancing=self.load_balancing,
+            fast_json_decoding=self.fast_json_decoding,
+        )
 
         self._set_ports()
 
+    def set_pagination(self, pagination: str, path: str, variable: str) -> None:
+        """Validate and set pagination, pagination_path and pagination_variable"""
+        if pagination not in PAGINATION_MODES:
+            raise ValueError(f"Unknown pagination mode '{pagination}'.")
+        if pagination != PAGINATION_NONE and not (path and variable):
+            raise ValueError("Pagination needs a pagination path and a pagination variable.")
+        self.pagination = pagination
+        self.pagination_path = path
+        self.pagination_variable = variable
+
+    def set_endpoints(self, url: str, replica_urls: str, load_balancing: str) -> None:
+        """Validate and set graphql_url, graphql_replica_urls and load_balancing"""
+        import validators
+
+        if not validators.url(url):
+            raise ValueError("Provide a valid GraphQL URL.")
+        urls = [_.strip() for _ in replica_urls.splitlines() if _.strip()]
+        for replica_url in urls:
+            if not validators.url(replica_url):
+                raise ValueError(f"Provide a valid GraphQL replica URL instead of '{replica_url}'.")
+        if load_balancing not in BALANCING_MODES:
+            raise ValueError(f"Unknown load balancing '{load_balancing}'.")
+        self.graphql_url = url
+        self.graphql_replica_urls = urls
+        self.load_balancing = load_balancing
+
+    def set_transport(
+        self,
+        persisted_queries: str,
+        request_compression: str,
+        response_compression: bool,
+        fast_json_decoding: bool,
+    ) -> None:
+        """Validate and set the persisted queries, compression and JSON decoding options"""
+        if persisted_queries not in PERSISTED_QUERIES_MODES:
+            raise ValueError(f"Unknown persisted queries mode '{persisted_queries}'.")
+        if request_compression not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown request compression '{request_compression}'.")
+        self.persisted_queries = persisted_queries
+        self.request_compression = request_compression
+        self.response_compression = response_compression
+        self.fast_json_decoding = fast_json_decoding
+
+    def set_checkpoint(self, directory: str, incremental_variable: str) -> None:
+        """Validate and set checkpoint_directory and incremental_variable"""
+        if incremental_variable and not directory:
+            raise ValueError("Incremental variable needs a checkpoint directory.")
+        self.checkpoint_directory = directory
+        self.incremental_variable = incremental_variable
+        self.checkpoint: Checkpoint | None = None
+
+    def set_bulk(self, bulk_variable: str, bulk_size: int) -> None:
+        """Validate and set bulk_variable and bulk_size"""
+        if bulk_variable and self.jinja_query:
+            raise ValueError("Bulk mutations need a query without jinja template.")
+        if bulk_size < 1:
+            raise ValueError("Bulk size needs to be a positive integer.")
+        self.bulk_variable = bulk_variable
+        self.bulk_size = bulk_size
+
+    def set_stages(self, worker_processes: int, shard_size: int, stage_queue_size: int) -> None:
+        """Validate and set worker_processes, shard_size and stage_queue_size"""
+        if worker_processes < 1:
+            raise ValueError("Worker processes needs to be a positive integer.")
+        if shard_size < 1:
+            raise ValueError("Shard size needs to be a positive integer.")
+        if stage_queue_size < 0:
+            raise ValueError("Stage queue size must not be negative.")
+        self.worker_processes = worker_processes
+        self.shard_size = shard_size
+        self.stage_queue_size = stage_queue_size
+
+    def set_throttling(self, rate_limit: float, max_retries: int, retry_backoff: float) -> None:
+        """Validate and set rate_limit, max_retries and retry_backoff"""
+        if rate_limit < 0:
+            raise ValueError("Rate limit must not be negative.")
+        if max_retries < 0:
+            raise ValueError("Maximum retries must not be negative.")
+        if retry_backoff < 0:
+            raise ValueError("Retry backoff must not be negative.")
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
     def set_graphql_variable_values(self, variable_values: str) -> None:
         """Validate and set graphql_variable_values"""
         try:
@@ -150,103 +689,395 @@ class GraphQLPlugin(WorkflowPlugin):
 
     def set_graphql_query(self, query: str) -> None:
         """Validate and set graphql_query"""
+        from graphql import GraphQLSyntaxError
+
         query = query.strip()
         try:
             if is_jinja_template(query):
                 self.jinja_query = True
             else:
-                gql(query)
+                parse_query(query)
 
             self.graphql_query = query
         except GraphQLSyntaxError as ex:
             raise ValueError("Query string is not Valid.") from ex
 
-    def execute(self, inputs: Sequence[Entities], context: ExecutionContext) -> Entities:
+    def execute(self, inputs: Sequence[Entities], context: ExecutionContext) -> Entities | None:
         """Execute GraphQL query"""
         self.log.info("Start GraphQL query.")
         dataset_id = (
             f"{context.task.project_id()}:{self.graphql_dataset}" if self.graphql_dataset else None
         )
-        processed_entities: int = 0
-        failed_entities: int = 0
-        payload = []
-        if inputs and self.jinja_query or self.jinja_variable_values:
-            for entities in inputs:
-                for result in self.process_entities(entities=entities):
-                    if not result:
-                        failed_entities += 1
-                    else:
-                        payload.append(result)
-                        processed_entities += 1
-
-                    context.report.update(
-                        ExecutionReport(
-                            entity_count=processed_entities + failed_entities,
-                            operation="wait",
-                            operation_desc="queries sent",
-                        )
-                    )
-
-        else:
-            # Select your transport with a defined url endpoint
-            transport = AIOHTTPTransport(url=self.graphql_url, headers=self.headers)
-            # Create a GraphQL client using the defined transport
-            client = Client(transport=transport, fetch_schema_from_transport=True)
-            result = client.execute(
-                document=gql(self.graphql_query),
-                variable_values=json.loads(self.graphql_variable_values),
+        results: Iterator[dict[str, Any]]
+        if self.stage_queue_size:
+            stage_context = StageContext(context)
+            results = stage_context.relay(
+                staged(
+                    self.execute_results(inputs, stage_context, final_report=not dataset_id),
+                    self.stage_queue_size,
+                    self.metrics,
+                )
             )
-            processed_entities += 1
-            payload.append(result)
+        else:
+            results = self.execute_results(inputs, context, final_report=not dataset_id)
+        if not dataset_id and self.projection:
+            return build_projected_entities(results, self.projection)
+        if not dataset_id:
+            return build_lazy_entities(results, self.log)
+
+        with JsonResultWriter(self.output_format, self.pretty_print) as writer:
+            for result in results:
+                with self.metrics.time(STAGE_WRITE):
+                    writer.write(result)
+            with self.metrics.time(STAGE_UPLOAD):
+                write_to_dataset(dataset_id, writer.finish(), context=context.user)
+        self.finish_checkpoint()
+        self.publish_report(context)
+        return None
+
+    def get_checkpoint(
+        self, inputs: Sequence[Entities], context: ExecutionContext
+    ) -> Checkpoint | None:
+        """Get the checkpoint of the task and its configuration, None if disabled
 
+        The key contains the paths of the input schemata, not the input entities,
+        which are only read once.
+        """
+        if not self.checkpoint_directory:
+            return None
+        key = Checkpoint.key(
+            [[_.path for _ in entities.schema.paths] for entities in inputs],
+            context.task.project_id(),
+            context.task.task_id(),
+            self.graphql_url,
+            self.graphql_query,
+            self.graphql_variable_values,
+            self.pagination,
+            self.pagination_path,
+            self.pagination_variable,
+            self.incremental_variable,
+        )
+        return Checkpoint(self.checkpoint_directory, key)
+
+    def finish_checkpoint(self) -> None:
+        """Remove the checkpoint of a successful execution"""
+        if self.checkpoint is not None:
+            self.checkpoint.finish()
+            self.checkpoint = None
+
+    def execute_results(
+        self, inputs: Sequence[Entities], context: ExecutionContext, final_report: bool = True
+    ) -> Generator[dict[str, Any], None, None]:
+        """Execute the queries and yield the successful results
+
+        With final_report, the report is published and the checkpoint is finished
+        when all results are consumed.
+        """
+        self.metrics.reset()
+        self.response_cache.hits = self.response_cache.misses = 0
+        self.checkpoint = checkpoint = self.get_checkpoint(inputs, context)
+        try:
+            if checkpoint is not None:
+                checkpoint.start()
+                for result in checkpoint.replay():
+                    self.metrics.count("resumed_entities")
+                    self.metrics.count("processed_entities")
+                    yield result
+            per_entity = self.jinja_query or bool(self.bulk_variable)
+            if inputs and per_entity or self.jinja_variable_values:
+                yield from self._entity_results(inputs, context, checkpoint)
+            else:
+                for result in self.execute_query(checkpoint):
+                    self.metrics.count("processed_entities")
+                    yield result
+        finally:
+            self.session.close()
+            if checkpoint is not None:
+                checkpoint.close()
+
+        if final_report:
+            self.finish_checkpoint()
+            self.publish_report(context)
+
+    def _entity_results(
+        self,
+        inputs: Sequence[Entities],
+        context: ExecutionContext,
+        checkpoint: Checkpoint | None,
+    ) -> Iterator[dict[str, Any]]:
+        """Execute the queries of the input entities and yield the successful results"""
+        last_update = 0.0
+        rows: Iterator[dict[str, str]] = chain.from_iterable(get_dict(_) for _ in inputs)
+        if checkpoint is not None:
+            rows = islice(rows, checkpoint.position, None)
+        results: Iterator[BulkResult] = (
+            self.process_bulk(rows)
+            if self.bulk_variable
+            else ((_, 1, 0 if _ else 1) for _ in self._process(rows))
+        )
+        for result, entities, failed in results:
+            if checkpoint is not None:
+                checkpoint.add(result, entities=entities)
+            if failed:
+                self.metrics.count("failed_entities", failed)
+            if failed < entities:
+                self.metrics.count("processed_entities", entities - failed)
+            if result:
+                yield result
+
+            if time.monotonic() - last_update >= REPORT_INTERVAL:
+                last_update = time.monotonic()
+                context.report.update(
+                    ExecutionReport(
+                        entity_count=self.metrics.counters.get("processed_entities", 0)
+                        + self.metrics.counters.get("failed_entities", 0),
+                        operation="wait",
+                        operation_desc="queries sent",
+                    )
+                )
+
+    def publish_report(self, context: ExecutionContext) -> None:
+        """Publish the final execution report and the metrics of the execution"""
+        counters = self.metrics.counters
+        if self.response_cache.enabled:
+            counters["response_cache_hits"] = self.response_cache.hits
+            counters["response_cache_misses"] = self.response_cache.misses
         summary: list[tuple[str, str]] = []
         warnings: list[str] = []
-        summary.append(("Failed entities", str(failed_entities)))
+        summary.append(("Failed entities", str(counters.get("failed_entities", 0))))
+        summary.append(("Deduplicated requests", str(self.session.deduplicated)))
+        summary.append(("Retried requests", str(self.session.retries)))
+        if counters.get("ejected_endpoints"):
+            warnings.append(
+                f"Endpoints were ejected {counters['ejected_endpoints']} times"
+                " after repeatedly failing requests."
+            )
+        if counters.get("resumed_entities"):
+            summary.append(("Resumed entities", str(counters["resumed_entities"])))
+        if self.response_cache.enabled:
+            summary.append(("Response cache hits", str(self.response_cache.hits)))
+            summary.append(("Response cache misses", str(self.response_cache.misses)))
+        summary.extend(self.metrics.summary())
         context.report.update(
             ExecutionReport(
-                entity_count=processed_entities,
+                entity_count=counters.get("processed_entities", 0),
                 operation="read" if self.graphql_query.startswith("query") else "write",
                 operation_desc="entities processed",
                 summary=summary,
                 warnings=warnings,
             )
         )
-        if dataset_id:
-            write_to_dataset(
-                dataset_id,
-                io.StringIO(json.dumps(payload, indent=2)),
-                context=context.user,
-            )
+        if self.log_metrics:
+            self.log.info(f"GraphQL metrics: {json.dumps(self.metrics.as_dict())}")
+        if self.metrics_hook is not None:
+            self.metrics_hook(self.metrics.as_dict())
 
-        return build_entities_from_data(payload)
+    def execute_query(self, checkpoint: Checkpoint | None = None) -> Iterator[dict[str, Any]]:
+        """Execute the (not templated) query and yield the result of each page"""
+        self.session.open()
+        document = parse_query(self.graphql_query)
+        variable_values: dict[str, Any] | None = json.loads(self.graphql_variable_values)
+        if checkpoint is not None:
+            if self.incremental_variable:
+                variable_values = {
+                    **json.loads(self.graphql_variable_values),
+                    self.incremental_variable: checkpoint.watermark(),
+                }
+            if checkpoint.resumed:
+                variable_values = checkpoint.state.get("variables")
+        while variable_values is not None:
+            page = self.session.run(
+                self.session.execute(document=document, variable_values=variable_values)
+            )
+            variable_values = (
+                None
+                if self.pagination == PAGINATION_NONE
+                else next_page_variables(
+                    self.pagination,
+                    page,
+                    self.pagination_path,
+                    self.pagination_variable,
+                    variable_values,
+                )
+            )
+            if checkpoint is not None:
+                checkpoint.add(page, variables=variable_values)
+            yield page
 
     def process_entities(self, entities: Entities) -> Iterator[dict[str, Any] | None]:
-        """Process entities"""
-        # Select your transport with a defined url endpoint
-        transport = AIOHTTPTransport(url=self.graphql_url, headers=self.headers)
-        # Create a GraphQL client using the defined transport
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        environment = jinja2.Environment(autoescape=True)
-        for jinja_variable_values in get_dict(entities):
-            result = None
-            template = environment.from_string(self.graphql_query)
-            query = template.render(jinja_variable_values)
-
-            template = environment.from_string(self.graphql_variable_values)
-            variable_values = template.render(jinja_variable_values)
-            try:
-                result = client.execute(
-                    document=gql(query),
-                    variable_values=json.loads(variable_values),
+        """Process entities
+
+        Results are yielded in input order with None for failed entities. With
+        more than one worker process, shards of shard_size entities are processed
+        in worker processes and their metrics are merged into the plugin metrics.
+        """
+        return self._process(get_dict(entities))
+
+    def _process(self, rows: Iterable[dict[str, str]]) -> Iterator[dict[str, Any] | None]:
+        """Process the values of entities, in worker processes if configured"""
+        from cmem_plugin_graphql.workflow.shard import run_sharded
+
+        if self.worker_processes == 1:
+            yield from self.process_rows(rows)
+            return
+        for shard in run_sharded(self, batched(rows, self.shard_size)):
+            self.metrics.merge(shard.metrics)
+            self.response_cache.hits += shard.cache_hits
+            self.response_cache.misses += shard.cache_misses
+            yield from shard.results
+
+    def process_rows(self, rows: Iterable[dict[str, str]]) -> Iterator[dict[str, Any] | None]:
+        """Process the values of entities in this process
+
+        Queries are sent concurrently (up to max_concurrent_requests at a time),
+        optionally batch_size operations per HTTP request. Results are yielded in
+        input order with None for failed entities.
+        The plugin session is opened if needed and kept open for further calls,
+        execute closes it at the end of the task.
+        """
+        self.session.open()
+        self.variable_template = self.get_variable_template()
+        requests = map(self._prepare_request, rows)
+        if self.batch_size > 1:
+            for results in self.session.map(
+                self._execute_batch, batched(requests, self.batch_size)
+            ):
+                yield from results
+        else:
+            yield from self.session.map(self._execute_request, requests)
+
+    def process_bulk(self, rows: Iterable[dict[str, str]]) -> Iterator[BulkResult]:
+        """Process the values of entities as items of bulk mutations
+
+        The variables rendered for each entity are collected into lists of
+        bulk_size items, which are sent as bulk_variable of the query (up to
+        max_concurrent_requests at a time). Results are yielded in input order.
+        """
+        self.session.open()
+        document = parse_query(self.graphql_query)
+        items = map(self._prepare_item, rows)
+
+        async def execute(chunk: list[dict[str, Any] | None]) -> BulkResult:
+            return await self._execute_bulk(document, chunk)
+
+        yield from self.session.map(execute, batched(items, self.bulk_size))
+
+    def _prepare_item(self, jinja_variable_values: dict[str, str]) -> dict[str, Any] | None:
+        """Render the bulk item of an entity, None if this fails"""
+        with self.metrics.time(STAGE_RENDER):
+            item = get_template(self.graphql_variable_values).render(jinja_variable_values)
+        try:
+            with self.metrics.time(STAGE_PARSE):
+                value: dict[str, Any] = json.loads(item)
+        except json.decoder.JSONDecodeError as ex:
+            self.log.error(f"Failed entity: {type(ex)}")  # noqa: TRY400
+            return None
+        return value
+
+    async def _execute_bulk(
+        self, document: "DocumentNode", items: list[dict[str, Any] | None]
+    ) -> BulkResult:
+        """Send the prepared items as one bulk mutation"""
+        from gql.transport.exceptions import TransportQueryError
+
+        from cmem_plugin_graphql.workflow.session import REQUEST_ERRORS
+
+        valid = [_ for _ in items if _ is not None]
+        failed = len(items) - len(valid)
+        if not valid:
+            return None, len(items), failed
+        try:
+            result = await self.session.execute(document, {self.bulk_variable: valid})
+        except TransportQueryError as ex:
+            failed_indexes = failed_items(ex.errors or [], len(valid))
+            if ex.data is None or failed_indexes is None:
+                self.log.error(f"Failed bulk mutation: {type(ex)}")  # noqa: TRY400
+                return None, len(items), len(items)
+            # the indexes of the failed items in the chunk, including the ones not sent
+            positions = [index for index, item in enumerate(items) if item is not None]
+            failed_positions = sorted(positions[_] for _ in failed_indexes)
+            self.log.error(f"Failed bulk items: {failed_positions}")  # noqa: TRY400
+            return ex.data, len(items), failed + len(failed_indexes)
+        except REQUEST_ERRORS as ex:
+            self.log.error(f"Failed bulk mutation: {type(ex)}")  # noqa: TRY400
+            return None, len(items), len(items)
+        return result, len(items), failed
+
+    def get_variable_template(self) -> "VariableTemplate | None":
+        """Get the query template with placeholders rewritten into variables
+
+        None, if template_variables is off or the query can not be rewritten.
+        """
+        if not (self.template_variables and self.jinja_query):
+            return None
+        from cmem_plugin_graphql.workflow.template_variables import rewrite_template
+
+        template = rewrite_template(
+            self.graphql_query, self.session.schema, self.template_variable_types
+        )
+        if template is None:
+            self.log.info("Query template can not be rewritten, it is rendered per entity.")
+        return template
+
+    def _prepare_request(self, jinja_variable_values: dict[str, str]) -> "GraphQLRequest | None":
+        """Render query and variables for an entity, None if this fails"""
+        from graphql import GraphQLError
+
+        template = self.variable_template
+        try:
+            with self.metrics.time(STAGE_RENDER):
+                variable_values = get_template(self.graphql_variable_values).render(
+                    jinja_variable_values
                 )
-            except (
-                GraphQLError,
-                GraphQLSyntaxError,
-                json.decoder.JSONDecodeError,
-            ) as ex:
-                self.log.error(f"Failed entity: {type(ex)}")  # noqa: TRY400
-
-            yield result
+                if template is None:
+                    query = get_template(self.graphql_query).render(jinja_variable_values)
+                else:
+                    placeholder_values = template.variable_values(jinja_variable_values)
+            with self.metrics.time(STAGE_PARSE):
+                if template is None:
+                    return parse_query(query), json.loads(variable_values)
+                return template.document, {**json.loads(variable_values), **placeholder_values}
+        except (
+            GraphQLError,
+            json.decoder.JSONDecodeError,
+        ) as ex:
+            self.log.error(f"Failed entity: {type(ex)}")  # noqa: TRY400
+        return None
+
+    async def _execute_request(self, request: "GraphQLRequest | None") -> dict[str, Any] | None:
+        """Execute a prepared request, None if this fails"""
+        from cmem_plugin_graphql.workflow.session import REQUEST_ERRORS
+
+        if request is None:
+            return None
+        document, variable_values = request
+        try:
+            return await self.session.execute(document=document, variable_values=variable_values)
+        except REQUEST_ERRORS as ex:
+            self.log.error(f"Failed entity: {type(ex)}")  # noqa: TRY400
+        return None
+
+    async def _execute_batch(
+        self, requests: "list[GraphQLRequest | None]"
+    ) -> list[dict[str, Any] | None]:
+        """Execute prepared requests in one batch, None for each failed request"""
+        from cmem_plugin_graphql.workflow.session import REQUEST_ERRORS
+
+        try:
+            batch_results = iter(
+                await self.session.execute_batch([_ for _ in requests if _ is not None])
+            )
+        except REQUEST_ERRORS as ex:
+            self.log.error(f"Failed batch: {type(ex)}")  # noqa: TRY400
+            return [None] * len(requests)
+        results: list[dict[str, Any] | None] = []
+        for request in requests:
+            result = None if request is None else next(batch_results)
+            if isinstance(result, Exception):
+                self.log.error(f"Failed entity: {type(result)}")
+                result = None
+            results.append(result)
+        return results
 
     def _set_ports(self) -> None:
         """Define input/output ports based on the configuration"""
@@ -0,0 +1,233 @@
+"""Execution metrics module"""
+
+import math
+import time
+from array import array
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+
+from cmem_plugin_graphql.workflow import codec
+
+STAGE_RENDER = "render"
+STAGE_PARSE = "parse"
+STAGE_REQUEST = "request"
+STAGE_DECODE = "decode"
+STAGE_WRITE = "write"
+STAGE_UPLOAD = "upload"
+# waiting times of the fetch and output stages connected by a bounded queue
+STAGE_FETCH_BLOCKED = "fetch_blocked"
+STAGE_OUTPUT_IDLE = "output_idle"
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Get the nearest-rank percentile of sorted values, 0 if there are no values"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+def _statistics(values: Sequence[float]) -> dict[str, float]:
+    """Get count, total and percentiles of durations"""
+    timings = sorted(values)
+    result = {"count": float(len(timings)), "total": math.fsum(timings)}
+    for percent in PERCENTILES:
+        result[f"p{percent}"] = percentile(timings, percent)
+    return result
+
+
+class Metrics:
+    """Timings and counters of a task execution
+
+    The duration of each stage (rendering, parsing, network round trip, JSON
+    decoding, writing) is recorded per call, so percentiles can be derived.
+    The JSON (de)serializers of the metrics count the bytes sent and received
+    and time the decoding of responses. The wire bytes are the (compressed)
+    bytes of HTTP bodies sent and received for GraphQL operations. Round trips
+    and failures of HTTP requests are also recorded per endpoint URL. The depth
+    of queues between pipeline stages is sampled whenever an item is taken.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new measurement"""
+        self.started = time.perf_counter()
+        self.timings: dict[str, array[float]] = {}
+        self.counters: dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wire_bytes_sent = 0
+        self.wire_bytes_received = 0
+        self.endpoint_timings: dict[str, array[float]] = {}
+        self.endpoint_failures: dict[str, int] = {}
+        self.queue_depths: dict[str, array[int]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage"""
+        timings = self.timings.get(stage)
+        if timings is None:
+            timings = self.timings[stage] = array("d")
+        timings.append(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Record the duration of the block as stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record_endpoint(self, url: str, seconds: float, failed: bool = False) -> None:
+        """Record the round trip of an HTTP request to an endpoint"""
+        self.endpoint_timings.setdefault(url, array("d")).append(seconds)
+        if failed:
+            self.endpoint_failures[url] = self.endpoint_failures.get(url, 0) + 1
+
+    def record_queue(self, name: str, depth: int) -> None:
+        """Record the number of items waiting in a queue"""
+        self.queue_depths.setdefault(name, array("l")).append(depth)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increase a counter"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def encode(self, value: Any) -> bytes:  # noqa: ANN401
+        """Serialize a request body as UTF-8 encoded JSON and count its bytes"""
+        data = codec.dumps(value)
+        self.bytes_sent += len(data)
+        return data
+
+    def dumps(self, value: Any) -> str:  # noqa: ANN401
+        """Serialize a request body and count its bytes"""
+        return self.encode(value).decode("utf-8")
+
+    def loads(self, data: str | bytes, fast: bool = False) -> Any:  # noqa: ANN401
+        """Deserialize a response body, count its bytes and time the decoding"""
+        start = time.perf_counter()
+        value = codec.loads(data, fast)
+        self.record(STAGE_DECODE, time.perf_counter() - start)
+        self.bytes_received += len(data if isinstance(data, bytes) else data.encode("utf-8"))
+        return value
+
+    def merge(self, other: "Metrics") -> None:
+        """Add the timings, counters and bytes of another measurement (e.g. of a worker)"""
+        for stage, timings in other.timings.items():
+            self.timings.setdefault(stage, array("d")).extend(timings)
+        for name, value in other.counters.items():
+            self.count(name, value)
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.wire_bytes_sent += other.wire_bytes_sent
+        self.wire_bytes_received += other.wire_bytes_received
+        for url, timings in other.endpoint_timings.items():
+            self.endpoint_timings.setdefault(url, array("d")).extend(timings)
+        for url, failures in other.endpoint_failures.items():
+            self.endpoint_failures[url] = self.endpoint_failures.get(url, 0) + failures
+        for name, depths in other.queue_depths.items():
+            self.queue_depths.setdefault(name, array("l")).extend(depths)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the start of the measurement"""
+        return time.perf_counter() - self.started
+
+    @property
+    def requests(self) -> int:
+        """Number of sent requests (including retries)"""
+        return len(self.timings.get(STAGE_REQUEST, ()))
+
+    def stage(self, stage: str) -> dict[str, float]:
+        """Get count, total and percentiles (in seconds) of a stage"""
+        return _statistics(self.timings.get(stage, ()))
+
+    def endpoint(self, url: str) -> dict[str, float]:
+        """Get requests, failures and round trip percentiles (in seconds) of an endpoint"""
+        result = _statistics(self.endpoint_timings.get(url, ()))
+        return {
+            "requests": result.pop("count"),
+            "failures": float(self.endpoint_failures.get(url, 0)),
+            **result,
+        }
+
+    def queue(self, name: str) -> dict[str, float]:
+        """Get the mean, maximum and percentiles of the sampled depth of a queue"""
+        depths = sorted(self.queue_depths.get(name, ()))
+        result = {
+            "mean": sum(depths) / len(depths) if depths else 0.0,
+            "max": float(depths[-1]) if depths else 0.0,
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent}"] = percentile(depths, percent)
+        return result
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get all metrics as a JSON serializable dictionary"""
+        elapsed = self.elapsed
+        return {
+            "elapsed": elapsed,
+            "requests": self.requests,
+            "requests_per_second": self.requests / elapsed if elapsed else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "wire_bytes_sent": self.wire_bytes_sent,
+            "wire_bytes_received": self.wire_bytes_received,
+            "counters": dict(self.counters),
+            "stages": {stage: self.stage(stage) for stage in self.timings},
+            "endpoints": {url: self.endpoint(url) for url in self.endpoint_timings},
+            "queues": {name: self.queue(name) for name in self.queue_depths},
+        }
+
+    def summary(self) -> list[tuple[str, str]]:
+        """Get the metrics as execution report summary"""
+        metrics = self.as_dict()
+        latency = metrics["stages"].get(STAGE_REQUEST)
+        summary = [
+            ("Requests", str(metrics["requests"])),
+            ("Requests per second", f"{metrics['requests_per_second']:.1f}"),
+        ]
+        if latency:
+            summary.append(
+                (
+                    "Request latency p50 / p95 / p99",
+                    " / ".join(f"{latency[f'p{_}'] * 1000:.1f} ms" for _ in PERCENTILES),
+                )
+            )
+        if len(metrics["endpoints"]) > 1:
+            for url, endpoint in metrics["endpoints"].items():
+                latency = " / ".join(f"{endpoint[f'p{_}'] * 1000:.1f} ms" for _ in PERCENTILES)
+                summary.append(
+                    (
+                        f"Endpoint {url}",
+                        f"{endpoint['requests']:.0f} requests, {endpoint['failures']:.0f} failed,"
+                        f" latency p50 / p95 / p99 {latency}",
+                    )
+                )
+        summary.append(("Bytes sent", str(metrics["bytes_sent"])))
+        summary.append(("Bytes received", str(metrics["bytes_received"])))
+        summary.append(("Bytes sent on the wire", str(metrics["wire_bytes_sent"])))
+        summary.append(("Bytes received on the wire", str(metrics["wire_bytes_received"])))
+        for stage, label in (
+            (STAGE_RENDER, "rendering"),
+            (STAGE_PARSE, "parsing"),
+            (STAGE_DECODE, "decoding"),
+            (STAGE_WRITE, "writing"),
+            (STAGE_UPLOAD, "uploading"),
+            (STAGE_FETCH_BLOCKED, "fetching waited for the output"),
+            (STAGE_OUTPUT_IDLE, "output waited for results"),
+        ):
+            if stage in metrics["stages"]:
+                summary.append((f"Time {label}", f"{metrics['stages'][stage]['total']:.3f} s"))
+        for name, depth in metrics["queues"].items():
+            summary.append(
+                (
+                    f"Queue depth {name} mean / p95 / max",
+                    f"{depth['mean']:.1f} / {depth['p95']:.0f} / {depth['max']:.0f}",
+                )
+            )
+        return summary
@@ -0,0 +1,60 @@
+"""Pagination module"""
+
+from collections import OrderedDict
+from typing import Any
+
+PAGINATION_NONE = "none"
+PAGINATION_CURSOR = "cursor"
+PAGINATION_OFFSET = "offset"
+
+PAGINATION_MODES = OrderedDict(
+    {
+        PAGINATION_NONE: "No pagination",
+        PAGINATION_CURSOR: "Cursor (Relay pageInfo)",
+        PAGINATION_OFFSET: "Offset",
+    }
+)
+
+
+def get_path(data: dict[str, Any], path: str) -> Any:  # noqa: ANN401
+    """Get the value at a dot separated path in a response"""
+    value: Any = data
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            raise ValueError(f"Pagination path '{path}' not found in the response.")
+        value = value[key]
+    return value
+
+
+def next_page_variables(
+    mode: str,
+    page: dict[str, Any],
+    path: str,
+    variable: str,
+    variable_values: dict[str, Any],
+) -> dict[str, Any] | None:
+    """Get the variables for the page after page, None if page is the last page
+
+    In cursor mode, path points to a Relay connection and the endCursor of its
+    pageInfo is passed in variable. In offset mode, path points to a list and
+    variable is increased by the number of items in this list.
+    """
+    connection = get_path(page, path)
+    if mode == PAGINATION_CURSOR:
+        page_info = connection.get("pageInfo") if isinstance(connection, dict) else None
+        if not page_info or "hasNextPage" not in page_info or "endCursor" not in page_info:
+            raise ValueError(
+                f"Pagination path '{path}' needs to select pageInfo {{ hasNextPage endCursor }}."
+            )
+        cursor = page_info["endCursor"]
+        if not page_info["hasNextPage"] or cursor in (None, variable_values.get(variable)):
+            return None
+        return {**variable_values, variable: cursor}
+    if mode == PAGINATION_OFFSET:
+        if not isinstance(connection, list):
+            raise ValueError(f"Pagination path '{path}' does not point to a list.")
+        if not connection:
+            return None
+        offset = int(variable_values.get(variable) or 0)
+        return {**variable_values, variable: offset + len(connection)}
+    return None
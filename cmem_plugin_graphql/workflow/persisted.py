@@ -0,0 +1,63 @@
+"""Automatic persisted queries (APQ) module"""
+
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from cmem_plugin_graphql.workflow.utils import DOCUMENT_CACHE_SIZE
+
+PERSISTED_QUERIES_NONE = "none"
+PERSISTED_QUERIES_POST = "post"
+PERSISTED_QUERIES_GET = "get"
+
+PERSISTED_QUERIES_MODES = OrderedDict(
+    {
+        PERSISTED_QUERIES_NONE: "Send the full query",
+        PERSISTED_QUERIES_POST: "Automatic persisted queries (POST)",
+        PERSISTED_QUERIES_GET: "Automatic persisted queries (GET for queries)",
+    }
+)
+
+NOT_FOUND_MESSAGE = "PersistedQueryNotFound"
+NOT_FOUND_CODE = "PERSISTED_QUERY_NOT_FOUND"
+
+# GET requests without a preflight header are blocked by Apollo Server CSRF prevention
+GET_HEADERS = {"Apollo-Require-Preflight": "true"}
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def query_hash(query: str) -> str:
+    """Get the sha256 hash of a query, as used by Apollo APQ"""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def persisted_operation(
+    query: str, variable_values: dict[str, Any] | None, include_query: bool = False
+) -> dict[str, Any]:
+    """Get the request body of an operation identified by the hash of its query
+
+    With include_query, the query is sent as well, so the server can register it.
+    """
+    operation: dict[str, Any] = {
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+    }
+    if include_query:
+        operation["query"] = query
+    if variable_values:
+        operation["variables"] = variable_values
+    return operation
+
+
+def is_persisted_query_not_found(answer: Any) -> bool:  # noqa: ANN401
+    """Check if the server does not know the hash of a persisted query"""
+    if not isinstance(answer, dict) or not isinstance(answer.get("errors"), list):
+        return False
+    for error in answer["errors"]:
+        if not isinstance(error, dict):
+            continue
+        extensions = error.get("extensions")
+        code = extensions.get("code") if isinstance(extensions, dict) else None
+        if error.get("message") == NOT_FOUND_MESSAGE or code == NOT_FOUND_CODE:
+            return True
+    return False
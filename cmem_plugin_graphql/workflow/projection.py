@@ -0,0 +1,138 @@
+"""Result projection module"""
+
+import json
+import re
+from collections.abc import Callable, Iterator
+from functools import lru_cache
+from typing import Any
+
+# a key (optionally after a dot), a list index or [*] for all items of a list
+STEP = re.compile(r"\.?([^.\[\]\s]+)|\[(\*|\d+)\]")
+
+Step = str | int
+Getter = Callable[[Any], Any]
+
+
+def parse_path(path: str) -> tuple[tuple[Step, ...], tuple[Step, ...] | None]:
+    """Parse a JSONPath-like path, e.g. `$.fruits[*].name` or `shop.owner.name`
+
+    The steps before [*] and after it are returned, the latter are None if the
+    path does not contain [*].
+    """
+    text = path.strip().removeprefix("$")
+    steps: list[Step | None] = []
+    position = 0
+    while position < len(text):
+        match = STEP.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid projection path '{path}'.")
+        key, index = match.groups()
+        steps.append(key if key is not None else None if index == "*" else int(index))
+        position = match.end()
+    if not steps or steps.count(None) > 1:
+        raise ValueError(f"Projection path '{path}' needs a key and at most one [*].")
+    if None not in steps:
+        return tuple(steps), None  # type: ignore[arg-type]
+    split = steps.index(None)
+    return tuple(steps[:split]), tuple(steps[split + 1 :])  # type: ignore[arg-type]
+
+
+def compile_getter(steps: tuple[Step, ...]) -> Getter:
+    """Compile steps into a function which gets their value, None if missing"""
+
+    def get(value: Any) -> Any:  # noqa: ANN401
+        for step in steps:
+            if not isinstance(value, dict | list):
+                return None
+            try:
+                value = value[step]  # type: ignore[index]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    return get
+
+
+def _string(value: Any) -> str:  # noqa: ANN401
+    if isinstance(value, dict | list):
+        return json.dumps(value)
+    return f"{value}"
+
+
+def entity_values(value: Any) -> list[str]:  # noqa: ANN401
+    """Get the entity values of a projected value"""
+    if value is None:
+        return [""]
+    if isinstance(value, list):
+        return [_string(_) for _ in value if _ is not None]
+    return [_string(value)]
+
+
+class Projection:
+    """Columns of results, compiled once and applied to each result as it arrives
+
+    A column is a JSONPath-like path in the result. Paths with [*] unnest the
+    items of one list into rows, all of them need to share the list before [*].
+    Columns without [*] are repeated in each row of a result. A result without
+    items has no rows. Lists which are not unnested are multiple values, objects
+    are JSON values.
+    """
+
+    def __init__(self, columns: list[tuple[str, str]]) -> None:
+        self.columns = [name for name, _ in columns]
+        if len(set(self.columns)) < len(self.columns):
+            raise ValueError("Projection columns need unique names.")
+        self.unnest: Getter | None = None
+        unnest_steps: tuple[Step, ...] | None = None
+        self.result_getters: list[tuple[int, Getter]] = []
+        self.item_getters: list[tuple[int, Getter]] = []
+        for index, (_, path) in enumerate(columns):
+            steps, item_steps = parse_path(path)
+            if item_steps is None:
+                self.result_getters.append((index, compile_getter(steps)))
+                continue
+            if unnest_steps not in (None, steps):
+                raise ValueError("Projection paths can only unnest one list.")
+            unnest_steps = steps
+            self.item_getters.append((index, compile_getter(item_steps)))
+        if unnest_steps is not None:
+            self.unnest = compile_getter(unnest_steps)
+
+    def rows(self, result: dict[str, Any]) -> Iterator[list[list[str]]]:
+        """Get the entity values of the rows of a result"""
+        row: list[list[str]] = [[] for _ in self.columns]
+        for index, get in self.result_getters:
+            row[index] = entity_values(get(result))
+        if self.unnest is None:
+            yield row
+            return
+        items = self.unnest(result)
+        if not isinstance(items, list):
+            return
+        for item in items:
+            item_row = row.copy()
+            for index, get in self.item_getters:
+                item_row[index] = entity_values(get(item))
+            yield item_row
+
+
+@lru_cache(maxsize=32)
+def parse_projection(text: str) -> Projection | None:
+    """Compile a projection, one `column: path` or `path` per line, None if empty
+
+    Without a column name, the last key of the path is the column name.
+    """
+    columns: list[tuple[str, str]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        name, separator, path = line.partition(":")
+        if not separator:
+            path = name
+            steps, item_steps = parse_path(path)
+            keys = [_ for _ in (*steps, *(item_steps or ())) if isinstance(_, str)]
+            name = keys[-1] if keys else ""
+        if not name.strip() or not path.strip():
+            raise ValueError(f"Invalid projection column '{line.strip()}'.")
+        columns.append((name.strip(), path.strip()))
+    return Projection(columns) if columns else None
@@ -0,0 +1,736 @@
+"""GraphQL session module"""
+
+import asyncio
+import json
+import time
+import weakref
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Coroutine, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import aiohttp
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import (
+    TransportError,
+    TransportProtocolError,
+    TransportQueryError,
+    TransportServerError,
+)
+from graphql import DocumentNode, GraphQLError, GraphQLSchema
+
+from cmem_plugin_graphql.workflow.cache import ResponseCache, SchemaCache
+from cmem_plugin_graphql.workflow.codec import (
+    COMPRESSION_NONE,
+    COMPRESSORS,
+    accept_encoding,
+    compress,
+    orjson,
+)
+from cmem_plugin_graphql.workflow.endpoints import (
+    BALANCING_LEAST_OUTSTANDING,
+    Endpoint,
+    EndpointPool,
+    is_endpoint_failure,
+)
+from cmem_plugin_graphql.workflow.metrics import STAGE_REQUEST, Metrics
+from cmem_plugin_graphql.workflow.persisted import (
+    GET_HEADERS,
+    PERSISTED_QUERIES_GET,
+    PERSISTED_QUERIES_NONE,
+    is_persisted_query_not_found,
+    persisted_operation,
+)
+from cmem_plugin_graphql.workflow.throttle import (
+    OVERLOAD_STATUS_CODES,
+    AdaptiveConcurrency,
+    TokenBucket,
+    is_overloaded,
+    is_retryable,
+    retry_after,
+    retry_delay,
+)
+from cmem_plugin_graphql.workflow.utils import is_query, print_query
+
+if TYPE_CHECKING:
+    from gql.client import AsyncClientSession
+
+GraphQLRequest = tuple[DocumentNode, dict[str, Any] | None]
+RequestKey = tuple[str, str]
+
+# number of recent results shared with later identical requests
+SHARED_RESULTS_SIZE = 1024
+
+# errors which make a single request fail, without affecting other requests
+REQUEST_ERRORS = (GraphQLError, TransportError, aiohttp.ClientError, TimeoutError)
+
+ItemT = TypeVar("ItemT")
+ResultT = TypeVar("ResultT")
+
+
+def run_ordered(
+    loop: asyncio.AbstractEventLoop,
+    function: Callable[[ItemT], Coroutine[Any, Any, ResultT]],
+    items: Iterable[ItemT],
+    max_in_flight: int,
+) -> Iterator[ResultT]:
+    """Run function for all items concurrently and yield results in input order
+
+    At most max_in_flight coroutines are scheduled at the same time. Items are
+    pulled lazily from the iterable, so the input is never fully materialized.
+    """
+    if max_in_flight < 1:
+        raise ValueError("Maximum number of concurrent requests must be at least 1.")
+    pending: deque[asyncio.Task[ResultT]] = deque()
+    try:
+        for item in items:
+            pending.append(loop.create_task(function(item)))
+            if len(pending) >= max_in_flight:
+                yield loop.run_until_complete(pending.popleft())
+        while pending:
+            yield loop.run_until_complete(pending.popleft())
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+
+def _operation_result(item: Any) -> dict[str, Any] | Exception:  # noqa: ANN401
+    """Get the data or the error of a single operation result in an answer"""
+    if not isinstance(item, dict) or ("data" not in item and "errors" not in item):
+        return TransportProtocolError("Invalid GraphQL result.")
+    if item.get("errors"):
+        return TransportQueryError(
+            str(item["errors"][0]), errors=item["errors"], data=item.get("data")
+        )
+    data: dict[str, Any] = item["data"]
+    return data
+
+
+def _is_graphql_answer(answer: Any) -> bool:  # noqa: ANN401
+    """Check if an answer is a GraphQL result or a batch of results"""
+    return isinstance(answer, list) or (
+        isinstance(answer, dict) and ("data" in answer or "errors" in answer)
+    )
+
+
+def _fail(request: "asyncio.Future[Any] | None", error: BaseException) -> None:
+    """Pass the error of a request to the callers sharing it"""
+    if request is None or request.done():
+        return
+    if isinstance(error, Exception):
+        request.set_exception(error)
+    else:
+        request.cancel()
+
+
+class _Client(Client):
+    """gql client which validates every document only once against the schema"""
+
+    def __init__(self, **kwargs: Any) -> None:  # noqa: ANN401
+        super().__init__(**kwargs)
+        self._validated: weakref.WeakSet[DocumentNode] = weakref.WeakSet()
+
+    def validate(self, document: DocumentNode) -> None:
+        """Validate the document, if it was not validated before"""
+        if document not in self._validated:
+            super().validate(document)
+            self._validated.add(document)
+
+
+class GraphQLSession:
+    """Async GraphQL client session driven from synchronous plugin code
+
+    Use it as a context manager or call open and close explicitly.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        url: str | Sequence[str],
+        headers: dict[str, str],
+        max_in_flight: int = 1,
+        pool_size: int = 10,
+        keepalive_timeout: float = 30,
+        fetch_schema: bool = True,
+        schema_cache: SchemaCache | None = None,
+        response_cache: ResponseCache | None = None,
+        rate_limit: float = 0,
+        max_retries: int = 0,
+        retry_backoff: float = 0.5,
+        metrics: Metrics | None = None,
+        persisted_queries: str = PERSISTED_QUERIES_NONE,
+        request_compression: str = COMPRESSION_NONE,
+        response_compression: bool = True,
+        load_balancing: str = BALANCING_LEAST_OUTSTANDING,
+        fast_json_decoding: bool = False,
+    ) -> None:
+        self.endpoints = EndpointPool([url] if isinstance(url, str) else url, load_balancing)
+        self.urls = [_.url for _ in self.endpoints.endpoints]
+        # replicas share the schema and results, the first URL is their cache key
+        self.url = self.urls[0]
+        self.headers = headers
+        self.max_in_flight = max_in_flight
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.fetch_schema = fetch_schema
+        self.schema_cache = schema_cache
+        self.response_cache = response_cache
+        self.rate_limiter = TokenBucket(rate=rate_limit)
+        self.concurrency = AdaptiveConcurrency(maximum=max_in_flight)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.persisted_queries = persisted_queries
+        if request_compression != COMPRESSION_NONE and request_compression not in COMPRESSORS:
+            raise ValueError(f"Request compression '{request_compression}' is not available.")
+        self.request_compression = request_compression
+        self.response_compression = response_compression
+        if fast_json_decoding and orjson is None:
+            raise ValueError("Fast JSON decoding needs the orjson package.")
+        self.fast_json_decoding = fast_json_decoding
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: Client | None = None
+        self._transport: AIOHTTPTransport | None = None
+        self._session: AsyncClientSession | None = None
+        self._requests: dict[RequestKey, asyncio.Future[dict[str, Any]]] = {}
+        self._results: OrderedDict[RequestKey, dict[str, Any]] = OrderedDict()
+
+    def __enter__(self) -> "GraphQLSession":
+        """Open the session"""
+        self.open()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Close the session"""
+        self.close()
+
+    @property
+    def deduplicated(self) -> int:
+        """Number of requests which shared the result of an identical request"""
+        return self.metrics.counters.get("deduplicated_requests", 0)
+
+    @property
+    def retries(self) -> int:
+        """Number of retried requests"""
+        return self.metrics.counters.get("retried_requests", 0)
+
+    @property
+    def is_open(self) -> bool:
+        """True, if the session is connected"""
+        return self._session is not None
+
+    @property
+    def schema(self) -> GraphQLSchema | None:
+        """Schema of the endpoint, if the session is open and the schema is known"""
+        return self._client.schema if self._client is not None else None
+
+    def open(self) -> None:
+        """Create the event loop and connect the client"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._session = self._loop.run_until_complete(self._connect())
+        except BaseException:
+            self.close()
+            raise
+
+    def _connector(self) -> aiohttp.TCPConnector:
+        """Create a keep-alive connection pool (inside the running loop)"""
+        return aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+
+    async def _connect(self) -> "AsyncClientSession":
+        """Connect the client to the first URL which answers, create the endpoint pools"""
+        for position, url in enumerate(self.urls):
+            try:
+                session = await self._connect_client(url)
+                break
+            except Exception as error:
+                if position == len(self.urls) - 1 or not is_endpoint_failure(error):
+                    raise
+        transport = self._transport
+        if transport is None or transport.session is None:
+            raise RuntimeError("GraphQL transport is not connected.")
+        for endpoint in self.endpoints.endpoints:
+            endpoint.session = (
+                transport.session
+                if endpoint.url == transport.url
+                else aiohttp.ClientSession(headers=transport.headers, connector=self._connector())
+            )
+        return session
+
+    async def _connect_client(self, url: str) -> "AsyncClientSession":
+        """Connect the client using a keep-alive connection pool
+
+        The schema used for local validation is taken from the schema cache, if
+        given, and only fetched from the endpoint on a cache miss.
+        """
+        transport = AIOHTTPTransport(
+            url=url,
+            headers={
+                **self.headers,
+                "Accept-Encoding": accept_encoding() if self.response_compression else "identity",
+            },
+            client_session_args={"connector": self._connector()},
+            json_serialize=self.metrics.dumps,
+            json_deserialize=self._loads,
+        )
+        self._transport = transport
+        cache_key = SchemaCache.key(self.url, self.headers)
+        introspection = None
+        if self.fetch_schema and self.schema_cache:
+            introspection = self.schema_cache.get(cache_key)
+        self._client = _Client(
+            transport=transport,
+            introspection=introspection,  # type: ignore[arg-type]
+            fetch_schema_from_transport=self.fetch_schema and introspection is None,
+        )
+        try:
+            session: AsyncClientSession = await self._client.connect_async()
+        except BaseException:
+            await transport.close()
+            raise
+        if introspection is None and self._client.introspection and self.schema_cache:
+            self.schema_cache.set(cache_key, dict(self._client.introspection))
+        return session
+
+    def close(self) -> None:
+        """Close the client and the event loop"""
+        if self._loop is None:
+            return
+        try:
+            pending = [_ for _ in self._requests.values() if not _.done()]
+            for request in pending:
+                request.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._close_endpoints())
+            if self._client is not None and self._session is not None:
+                self._loop.run_until_complete(self._client.close_async())
+        finally:
+            self._requests.clear()
+            self._results.clear()
+            self._loop.close()
+            self._loop = None
+            self._client = None
+            self._transport = None
+            self._session = None
+
+    async def _close_endpoints(self) -> None:
+        """Close the connection pools of the endpoints, except the one of the client"""
+        client_session = self._transport.session if self._transport is not None else None
+        for endpoint in self.endpoints.endpoints:
+            if endpoint.session is not None and endpoint.session is not client_session:
+                await endpoint.session.close()
+            endpoint.session = None
+
+    async def execute(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """Execute a GraphQL document on the connected session
+
+        Identical query operations are sent only once: concurrent requests share
+        the request in flight (single-flight), later requests share one of the last
+        SHARED_RESULTS_SIZE results. Failed requests are forgotten, so a later
+        identical request is sent again.
+        """
+        if self._session is None:
+            raise RuntimeError("GraphQL session is not open.")
+        request_key = self._request_key(document, variable_values)
+        if request_key is None:
+            return await self._execute(document, variable_values)
+        shared = self._shared_result(request_key)
+        if shared is not None:
+            return shared
+        request = self._requests.get(request_key)
+        if request is None:
+            request = asyncio.ensure_future(self._execute(document, variable_values))
+            self._track_request(request_key, request)
+        else:
+            self.metrics.count("deduplicated_requests")
+        # a cancelled caller must not cancel the request shared with other callers
+        return await asyncio.shield(request)
+
+    async def _execute(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        """Execute a GraphQL document, using the response cache"""
+        if self._session is None:
+            raise RuntimeError("GraphQL session is not open.")
+        cache_key = self._response_cache_key(document, variable_values)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
+        result: dict[str, Any] = await self._send(
+            (lambda: self._execute_persisted(document, variable_values))
+            if self.persisted_queries != PERSISTED_QUERIES_NONE
+            else (lambda: self._execute_operation(document, variable_values)),
+            idempotent=is_query(document),
+        )
+        self._cache_result(cache_key, result)
+        return result
+
+    def _validate(self, document: DocumentNode) -> None:
+        """Validate a document against the schema, if the schema is known"""
+        if self._client is not None and self._client.schema:
+            self._client.validate(document)
+
+    async def _execute_operation(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        """Execute a GraphQL document as single operation"""
+        self._validate(document)
+        operation: dict[str, Any] = {"query": print_query(document)}
+        if variable_values:
+            operation["variables"] = variable_values
+        result = _operation_result(await self._request(operation))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _execute_persisted(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        """Execute a GraphQL document as Apollo automatic persisted query
+
+        Only the sha256 hash of the query is sent, the full query only if the server
+        answers PersistedQueryNotFound. In GET mode, query operations are sent as
+        HTTP GET requests, so HTTP caches can answer them.
+        """
+        self._validate(document)
+        query = print_query(document)
+        answer = await self._request(
+            persisted_operation(query, variable_values),
+            get=self.persisted_queries == PERSISTED_QUERIES_GET and is_query(document),
+        )
+        if is_persisted_query_not_found(answer):
+            self.metrics.count("persisted_query_misses")
+            answer = await self._request(
+                persisted_operation(query, variable_values, include_query=True)
+            )
+        result = _operation_result(answer)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @staticmethod
+    def _request_key(
+        document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> RequestKey | None:
+        """Get the key of identical requests, None if the request is not shared"""
+        if not is_query(document):
+            return None
+        return print_query(document), json.dumps(variable_values or {}, sort_keys=True)
+
+    def _shared_result(self, request_key: RequestKey) -> dict[str, Any] | None:
+        """Get the recent result of an identical request"""
+        result = self._results.get(request_key)
+        if result is not None:
+            self._results.move_to_end(request_key)
+            self.metrics.count("deduplicated_requests")
+        return result
+
+    def _track_request(
+        self, request_key: RequestKey, request: "asyncio.Future[dict[str, Any]]"
+    ) -> None:
+        """Share the request with identical requests while it is in flight
+
+        When it succeeds, its result is kept for later identical requests.
+        """
+        self._requests[request_key] = request
+
+        def done(future: "asyncio.Future[dict[str, Any]]") -> None:
+            if self._requests.get(request_key) is future:
+                del self._requests[request_key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._results[request_key] = future.result()
+            self._results.move_to_end(request_key)
+            while len(self._results) > SHARED_RESULTS_SIZE:
+                self._results.popitem(last=False)
+
+        request.add_done_callback(done)
+
+    def _response_cache_key(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> str | None:
+        """Get the response cache key of a request, None if it is not cacheable"""
+        if not self.response_cache or not self.response_cache.enabled or not is_query(document):
+            return None
+        return ResponseCache.key(self.url, self.headers, print_query(document), variable_values)
+
+    def _cached_result(self, cache_key: str | None) -> dict[str, Any] | None:
+        """Get a result from the response cache"""
+        if self.response_cache is None or cache_key is None:
+            return None
+        return self.response_cache.get(cache_key)
+
+    def _cache_result(self, cache_key: str | None, result: dict[str, Any]) -> None:
+        """Store a result in the response cache"""
+        if self.response_cache is not None and cache_key is not None:
+            self.response_cache.set(cache_key, result)
+
+    async def execute_batch(
+        self, requests: Sequence[GraphQLRequest]
+    ) -> list[dict[str, Any] | Exception]:
+        """Execute several GraphQL documents in one HTTP request
+
+        The operations are sent as a JSON array (Apollo-style batching). The
+        result list has one entry per request: the data of the operation or the
+        exception which made this single operation fail.
+        """
+        if self._client is None:
+            raise RuntimeError("GraphQL session is not open.")
+        results: list[dict[str, Any] | Exception] = []
+        positions: list[int] = []
+        unsent: list[GraphQLRequest] = []
+        futures: list[asyncio.Future[dict[str, Any]] | None] = []
+        shared: list[tuple[int, asyncio.Future[dict[str, Any]]]] = []
+        for document, variable_values in requests:
+            found = self._lookup_batch_item(document, variable_values)
+            if isinstance(found, asyncio.Future):
+                shared.append((len(results), found))
+            elif found is None:
+                positions.append(len(results))
+                unsent.append((document, variable_values))
+                futures.append(self._share_request(document, variable_values))
+            results.append(found if isinstance(found, dict | Exception) else {})
+        if unsent:
+            for position, result in zip(
+                positions, await self._send_batch(unsent, futures), strict=True
+            ):
+                results[position] = result
+        for position, request in shared:
+            try:
+                results[position] = await asyncio.shield(request)
+            except Exception as error:  # noqa: BLE001
+                results[position] = error
+        return results
+
+    def _lookup_batch_item(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> "dict[str, Any] | Exception | asyncio.Future[dict[str, Any]] | None":
+        """Get the validation error, a shared request or the cached result of a request
+
+        None is returned, if the request needs to be sent.
+        """
+        try:
+            self._validate(document)
+        except GraphQLError as error:
+            return error
+        request_key = self._request_key(document, variable_values)
+        shared = self._shared_result(request_key) if request_key else None
+        if shared is not None:
+            return shared
+        request = self._requests.get(request_key) if request_key else None
+        if request is not None:
+            self.metrics.count("deduplicated_requests")
+            return request
+        return self._cached_result(self._response_cache_key(document, variable_values))
+
+    def _share_request(
+        self, document: DocumentNode, variable_values: dict[str, Any] | None
+    ) -> "asyncio.Future[dict[str, Any]] | None":
+        """Get a future for the result of a request, None if the request is not shared"""
+        request_key = self._request_key(document, variable_values)
+        if request_key is None:
+            return None
+        request: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._track_request(request_key, request)
+        return request
+
+    async def _send_batch(
+        self,
+        requests: Sequence[GraphQLRequest],
+        futures: Sequence["asyncio.Future[dict[str, Any]] | None"],
+    ) -> list[dict[str, Any] | Exception]:
+        """Send the requests as one batch and resolve the futures of shared requests"""
+        payload: list[dict[str, Any]] = []
+        cache_keys: list[str | None] = []
+        for document, variable_values in requests:
+            if self.persisted_queries != PERSISTED_QUERIES_NONE:
+                operation = persisted_operation(print_query(document), variable_values)
+            else:
+                operation = {"query": print_query(document)}
+                if variable_values:
+                    operation["variables"] = variable_values
+            payload.append(operation)
+            cache_keys.append(self._response_cache_key(document, variable_values))
+        try:
+            answer = await self._send(
+                (lambda: self._post_persisted_batch(payload, requests))
+                if self.persisted_queries != PERSISTED_QUERIES_NONE
+                else (lambda: self._post_batch(payload)),
+                idempotent=all(is_query(document) for document, _ in requests),
+            )
+        except BaseException as error:
+            for request in futures:
+                _fail(request, error)
+            raise
+        results: list[dict[str, Any] | Exception] = []
+        for cache_key, request, item in zip(cache_keys, futures, answer, strict=True):
+            result = _operation_result(item)
+            if isinstance(result, Exception):
+                _fail(request, result)
+            else:
+                self._cache_result(cache_key, result)
+                if request is not None:
+                    request.set_result(result)
+            results.append(result)
+        return results
+
+    async def _send(
+        self, send: Callable[[], Awaitable[ResultT]], idempotent: bool = True
+    ) -> ResultT:
+        """Send a request throttled by rate and concurrency limit, retry if possible
+
+        Requests wait for a token of the token bucket (rate_limit requests per
+        second) and the number of requests in flight adapts to server pushback
+        (AIMD) up to max_in_flight. Failed requests are retried up to max_retries
+        times with jittered exponential backoff, honoring Retry-After (see
+        is_retryable for the retried errors).
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            epoch = await self.concurrency.acquire()
+            overloaded = False
+            start = time.perf_counter()
+            try:
+                return await send()
+            except Exception as error:
+                overloaded = is_overloaded(error)
+                if attempt >= self.max_retries or not is_retryable(error, idempotent):
+                    raise
+                delay = retry_delay(attempt, self.retry_backoff, retry_after(error))
+            finally:
+                self.metrics.record(STAGE_REQUEST, time.perf_counter() - start)
+                self.concurrency.release(epoch, overloaded)
+            attempt += 1
+            self.metrics.count("retried_requests")
+            await asyncio.sleep(delay)
+
+    async def _post_persisted_batch(
+        self, payload: list[dict[str, Any]], requests: Sequence[GraphQLRequest]
+    ) -> list[Any]:
+        """Post a batch, resend persisted queries unknown to the server with their query"""
+        answer = await self._post_batch(payload)
+        missing = [_ for _, item in enumerate(answer) if is_persisted_query_not_found(item)]
+        if missing:
+            self.metrics.count("persisted_query_misses", len(missing))
+            registration = [
+                persisted_operation(print_query(requests[_][0]), requests[_][1], include_query=True)
+                for _ in missing
+            ]
+            for position, item in zip(missing, await self._post_batch(registration), strict=True):
+                answer[position] = item
+        return answer
+
+    async def _post_batch(self, payload: list[dict[str, Any]]) -> list[Any]:
+        """Post a batch of operations and return the list of operation results"""
+        answer = await self._request(payload)
+        if not isinstance(answer, list) or len(answer) != len(payload):
+            raise TransportProtocolError("Server did not return a GraphQL batch result.")
+        return answer
+
+    async def _request(self, payload: Any, get: bool = False) -> Any:  # noqa: ANN401
+        """Send a request body as JSON (POST) or as URL parameters (GET), return the answer
+
+        The request is sent to the endpoint chosen by load balancing. POST bodies
+        are compressed with request_compression, responses are requested
+        compressed with response_compression and decoded with orjson if
+        fast_json_decoding is set. The wire bytes of a compressed response are
+        taken from its Content-Length, the decoded size is used if the length is
+        not known.
+        """
+        endpoint = self.endpoints.acquire()
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await self._request_endpoint(endpoint, payload, get)
+        except Exception as error:
+            failed = is_endpoint_failure(error)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.metrics.record_endpoint(endpoint.url, seconds, failed)
+            if self.endpoints.release(endpoint, seconds, failed):
+                self.metrics.count("ejected_endpoints")
+
+    async def _request_endpoint(self, endpoint: Endpoint, payload: Any, get: bool) -> Any:  # noqa: ANN401
+        """Send a request body to an endpoint and return the answer"""
+        transport = self._transport
+        session = endpoint.session
+        if self._client is None or transport is None or session is None:
+            raise RuntimeError("GraphQL session is not open.")
+        if get:
+            parameters = {
+                key: value if isinstance(value, str) else self.metrics.dumps(value)
+                for key, value in payload.items()
+            }
+            request = session.get(
+                endpoint.url, params=parameters, headers=GET_HEADERS, ssl=transport.ssl
+            )
+        else:
+            body = self.metrics.encode(payload)
+            headers = {"Content-Type": "application/json"}
+            if self.request_compression != COMPRESSION_NONE:
+                body = compress(body, self.request_compression)
+                headers["Content-Encoding"] = self.request_compression
+            self.metrics.wire_bytes_sent += len(body)
+            request = session.post(endpoint.url, data=body, headers=headers, ssl=transport.ssl)
+        async with asyncio.timeout(self._client.execute_timeout), request as response:
+            data = await response.read()
+            compressed = response.headers.get("Content-Encoding", "identity") != "identity"
+            if compressed and response.content_length is not None:
+                self.metrics.wire_bytes_received += response.content_length
+            else:
+                self.metrics.wire_bytes_received += len(data)
+            return self._answer(response, data)
+
+    def _answer(self, response: aiohttp.ClientResponse, data: bytes) -> Any:  # noqa: ANN401
+        """Decode the answer of a response, GraphQL results are returned with any status
+
+        Like gql, a GraphQL result sent with an error status is returned, so its
+        errors fail the operation. Other bodies fail with TransportServerError for
+        error statuses and TransportProtocolError otherwise. Overloaded responses
+        (429, 503) always fail with TransportServerError, so they are retried.
+        """
+        decode_error: ValueError | None = None
+        if response.status not in OVERLOAD_STATUS_CODES:
+            try:
+                answer = self._loads(data)
+            except ValueError as error:
+                decode_error = error
+            else:
+                if _is_graphql_answer(answer):
+                    return answer
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError as error:
+            raise TransportServerError(str(error), error.status) from error
+        reason = "Not a JSON answer" if decode_error else 'No "data" or "errors" keys in answer'
+        raise TransportProtocolError(
+            f"Server did not return a GraphQL result: {reason}: {data[:200]!r}"
+        ) from decode_error
+
+    def _loads(self, data: str | bytes) -> Any:  # noqa: ANN401
+        """Deserialize a response body"""
+        return self.metrics.loads(data, self.fast_json_decoding)
+
+    def run(self, coroutine: Coroutine[Any, Any, ResultT]) -> ResultT:
+        """Run a single coroutine on the session event loop"""
+        if self._loop is None:
+            raise RuntimeError("GraphQL session is not open.")
+        return self._loop.run_until_complete(coroutine)
+
+    def map(
+        self,
+        function: Callable[[ItemT], Coroutine[Any, Any, ResultT]],
+        items: Iterable[ItemT],
+    ) -> Iterator[ResultT]:
+        """Apply the async function to all items with bounded concurrency, in order"""
+        if self._loop is None:
+            raise RuntimeError("GraphQL session is not open.")
+        return run_ordered(self._loop, function, items, self.max_in_flight)
@@ -0,0 +1,80 @@
+"""Sharded execution of entities in worker processes"""
+
+import multiprocessing
+import multiprocessing.util
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from cmem_plugin_graphql.workflow.metrics import Metrics
+
+if TYPE_CHECKING:
+    from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+
+# shards submitted per worker ahead of the shard which is merged next
+SHARDS_PER_WORKER = 2
+
+_worker: "GraphQLPlugin | None" = None
+
+
+@dataclass
+class ShardResult:
+    """Results of a shard (None for failed entities) and the worker measurements"""
+
+    results: list[dict[str, Any] | None]
+    metrics: Metrics
+    cache_hits: int
+    cache_misses: int
+
+
+def _init_worker(plugin_class: type["GraphQLPlugin"], parameters: dict[str, Any]) -> None:
+    """Create the plugin of a worker process, its session is closed when the worker exits"""
+    global _worker  # noqa: PLW0603
+    _worker = plugin_class(**{**parameters, "worker_processes": 1})
+    multiprocessing.util.Finalize(_worker, _worker.session.close, exitpriority=10)
+
+
+def _process_shard(rows: list[dict[str, str]]) -> ShardResult:
+    """Process the entity values of a shard in the worker plugin"""
+    if _worker is None:
+        raise RuntimeError("Worker process is not initialized.")
+    _worker.metrics.reset()
+    _worker.response_cache.hits = _worker.response_cache.misses = 0
+    results = list(_worker.process_rows(rows))
+    return ShardResult(
+        results=results,
+        metrics=_worker.metrics,
+        cache_hits=_worker.response_cache.hits,
+        cache_misses=_worker.response_cache.misses,
+    )
+
+
+def run_sharded(
+    plugin: "GraphQLPlugin", shards: Iterable[list[dict[str, str]]]
+) -> Iterator[ShardResult]:
+    """Process shards of entity values in worker processes, yield results in input order
+
+    Every worker process holds its own plugin and session, created from the
+    plugin parameters. Shards are pulled lazily, at most SHARDS_PER_WORKER per
+    worker are in progress at the same time. Workers are spawned (not forked),
+    so they do not inherit the event loop or threads of this process.
+    """
+    workers = plugin.worker_processes
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(type(plugin), plugin.parameters),
+    )
+    pending: deque[Future[ShardResult]] = deque()
+    try:
+        for shard in shards:
+            pending.append(executor.submit(_process_shard, shard))
+            if len(pending) >= workers * SHARDS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,195 @@
+"""Pipeline stage module"""
+
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+
+from cmem_plugin_base.dataintegration.context import (
+    ExecutionContext,
+    ExecutionReport,
+    ReportContext,
+    TaskContext,
+)
+
+from cmem_plugin_graphql.workflow.metrics import STAGE_FETCH_BLOCKED, STAGE_OUTPUT_IDLE, Metrics
+
+ItemT = TypeVar("ItemT")
+
+# seconds between checks if the consumer stopped, while the queue is full
+STOP_INTERVAL = 0.1
+# items are handed over in chunks of up to CHUNK_SIZE items, at least every
+# FLUSH_INTERVAL seconds (checked when an item arrives)
+CHUNK_SIZE = 32
+FLUSH_INTERVAL = 0.01
+
+
+class _End:
+    """Marks the end of the items, with the error of the producer if it failed"""
+
+    def __init__(self, error: BaseException | None = None) -> None:
+        self.error = error
+
+
+class Stage(Generic[ItemT]):
+    """Pull items in a separate thread and pass them on through a bounded queue
+
+    The producer thread pulls the items (e.g. renders queries, fetches and
+    decodes results) while the consumer iterates earlier items (e.g. converts
+    and writes them). When queue_size items are waiting, the producer pauses, so
+    a slow consumer throttles the producer and memory stays bounded. Items are
+    handed over in chunks, so the threads do not switch for every single item.
+    The time the producer waits for free space and the consumer waits for items,
+    and the queue depth are recorded in the metrics. An error of the producer is
+    raised to the consumer. The items are closed in the producer thread when they
+    are exhausted or the consumer stops, so their cleanup runs in the same thread.
+    """
+
+    def __init__(
+        self, items: Iterator[ItemT], queue_size: int, metrics: Metrics, name: str = "results"
+    ) -> None:
+        if queue_size < 1:
+            raise ValueError("Queue size needs to be a positive integer.")
+        self.items = items
+        self.metrics = metrics
+        self.name = name
+        self.chunk_size = min(CHUNK_SIZE, queue_size)
+        self.buffer: queue.Queue[list[ItemT] | _End] = queue.Queue(
+            maxsize=queue_size // self.chunk_size
+        )
+        self.stopped = threading.Event()
+
+    def _put(self, chunk: "list[ItemT] | _End") -> bool:
+        """Wait for free space and put the chunk, False if the consumer stopped"""
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            try:
+                self.buffer.put(chunk, timeout=STOP_INTERVAL)
+            except queue.Full:
+                continue
+            self.metrics.record(STAGE_FETCH_BLOCKED, time.perf_counter() - start)
+            return True
+        return False
+
+    def _produce(self) -> None:
+        """Pull the items and put them into the queue in chunks"""
+        error: BaseException | None = None
+        chunk: list[ItemT] = []
+        try:
+            try:
+                flushed = time.perf_counter()
+                for item in self.items:
+                    chunk.append(item)
+                    if (
+                        len(chunk) < self.chunk_size
+                        and time.perf_counter() - flushed < FLUSH_INTERVAL
+                    ):
+                        continue
+                    if not self._put(chunk):
+                        return
+                    chunk = []
+                    flushed = time.perf_counter()
+            finally:
+                close = getattr(self.items, "close", None)
+                if close is not None:
+                    close()
+        except BaseException as exception:  # noqa: BLE001
+            error = exception
+        # the items before an error are passed on as well
+        if not chunk or self._put(chunk):
+            self._put(_End(error))
+
+    def _depth(self) -> int:
+        """Get the number of items waiting in the queue"""
+        with self.buffer.mutex:
+            return sum(len(_) for _ in self.buffer.queue if isinstance(_, list))
+
+    def __iter__(self) -> Iterator[ItemT]:
+        """Start the producer and yield its items"""
+        producer = threading.Thread(target=self._produce, name=f"{self.name} stage", daemon=True)
+        producer.start()
+        try:
+            while True:
+                self.metrics.record_queue(self.name, self._depth())
+                start = time.perf_counter()
+                chunk = self.buffer.get()
+                self.metrics.record(STAGE_OUTPUT_IDLE, time.perf_counter() - start)
+                if isinstance(chunk, _End):
+                    if chunk.error is not None:
+                        raise chunk.error
+                    return
+                yield from chunk
+        finally:
+            self.stopped.set()
+            producer.join()
+
+
+class _TaskSnapshot(TaskContext):
+    """Identifiers of a task, read in advance"""
+
+    def __init__(self, task: TaskContext) -> None:
+        self._project_id: str = task.project_id()
+        self._task_id: str = task.task_id()
+
+    def project_id(self) -> str:
+        """Get the project identifier"""
+        return self._project_id
+
+    def task_id(self) -> str:
+        """Get the task identifier"""
+        return self._task_id
+
+
+class _ReportRelay(ReportContext):
+    """Keep the latest execution report until it is forwarded"""
+
+    def __init__(self, report: ReportContext) -> None:
+        self.report = report
+        self.pending: ExecutionReport | None = None
+        self.lock = threading.Lock()
+
+    def update(self, report: ExecutionReport) -> None:
+        """Keep the report"""
+        with self.lock:
+            self.pending = report
+
+    def forward(self) -> None:
+        """Update the report context with the kept report, if any"""
+        with self.lock:
+            report, self.pending = self.pending, None
+        if report is not None:
+            self.report.update(report)
+
+
+class StageContext(ExecutionContext):
+    """Execution context for the producer thread of a stage
+
+    The task identifiers are read in advance and execution reports are kept until
+    relay forwards them while the consumer iterates the items, so the execution
+    context of the plugin (e.g. backed by Corporate Memory) is only called from the
+    consumer thread. The user and workflow are passed on, but not called.
+    """
+
+    def __init__(self, context: ExecutionContext) -> None:
+        self.task = _TaskSnapshot(context.task)
+        self.user = getattr(context, "user", None)
+        self.workflow = getattr(context, "workflow", None)
+        self.relay_report = _ReportRelay(context.report)
+        self.report = self.relay_report
+
+    def relay(self, items: Iterator[ItemT]) -> Iterator[ItemT]:
+        """Yield the items and forward the reports of the producer"""
+        relay_report = self.relay_report
+        for item in items:
+            if relay_report.pending is not None:
+                relay_report.forward()
+            yield item
+        relay_report.forward()
+
+
+def staged(
+    items: Iterator[ItemT], queue_size: int, metrics: Metrics, name: str = "results"
+) -> Iterator[ItemT]:
+    """Pull the items in a separate stage, see Stage"""
+    return iter(Stage(items, queue_size, metrics, name))
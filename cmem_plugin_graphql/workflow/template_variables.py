@@ -0,0 +1,205 @@
+"""Rewrite jinja placeholders of query templates into GraphQL variables"""
+
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import jinja2
+from graphql import (
+    DocumentNode,
+    GraphQLError,
+    GraphQLSchema,
+    NameNode,
+    OperationDefinitionNode,
+    StringValueNode,
+    TypeInfo,
+    TypeInfoVisitor,
+    VariableDefinitionNode,
+    VariableNode,
+    Visitor,
+    parse,
+    parse_type,
+    parse_value,
+    print_ast,
+    value_from_ast_untyped,
+    visit,
+)
+
+from cmem_plugin_graphql.workflow.utils import (
+    TEMPLATE_CACHE_SIZE,
+    get_template,
+    jinja_environment,
+    parse_query,
+)
+
+VARIABLE_PREFIX = "_jinja"
+
+# lexer tokens of jinja syntax other than expressions
+STATEMENT_TOKENS = frozenset(
+    ("block_begin", "comment_begin", "linestatement_begin", "linecomment_begin")
+)
+
+# a quoted placeholder is a string argument, a bare placeholder a literal
+PLACEHOLDER = re.compile(r'(?P<quote>"?)\{\{-?(?P<expression>.*?)-?\}\}(?P=quote)')
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    """A jinja expression which was replaced by a variable"""
+
+    name: str
+    expression: str
+    quoted: bool
+
+    def value(self, values: Mapping[str, Any]) -> Any:  # noqa: ANN401
+        """Get the variable value of an entity
+
+        The expression is rendered like in the original template. The text is read
+        as content of a GraphQL string (quoted) or as GraphQL literal (bare), so the
+        variable has the value which was written into the query text before.
+        """
+        text = get_template(f"{{{{ {self.expression} }}}}").render(values)
+        if self.quoted:
+            node = parse_value(f'"{text}"')
+            if not isinstance(node, StringValueNode):
+                raise GraphQLError(f"Value of '{self.expression}' is not a string.")
+            return node.value
+        return value_from_ast_untyped(parse_value(text))
+
+
+@dataclass(frozen=True)
+class VariableTemplate:
+    """A static GraphQL document and the placeholders which became its variables"""
+
+    document: DocumentNode
+    placeholders: tuple[Placeholder, ...]
+
+    def variable_values(self, values: Mapping[str, Any]) -> dict[str, Any]:
+        """Get the values of the placeholder variables for an entity"""
+        return {_.name: _.value(values) for _ in self.placeholders}
+
+
+def parse_variable_types(declarations: str) -> dict[str, str]:
+    """Parse declared placeholder types, one `expression: Type` per line"""
+    types: dict[str, str] = {}
+    for line in declarations.splitlines():
+        if not line.strip():
+            continue
+        expression, separator, type_ = line.rpartition(":")
+        if not separator or not expression.strip():
+            raise ValueError(f"Invalid variable type declaration '{line.strip()}'.")
+        try:
+            parse_type(type_.strip())
+        except GraphQLError as error:
+            raise ValueError(f"Invalid GraphQL type in '{line.strip()}'.") from error
+        types[expression.strip()] = type_.strip()
+    return types
+
+
+class _VariableUsages(Visitor):
+    """Count the usages of each variable and collect their input types"""
+
+    def __init__(self, type_info: TypeInfo | None) -> None:
+        super().__init__()
+        self.type_info = type_info
+        self.usages: dict[str, int] = {}
+        self.types: dict[str, str] = {}
+
+    def enter_variable(self, node: VariableNode, *_args: Any) -> None:  # noqa: ANN401
+        """Count the usage, keep the input type of the position"""
+        name = node.name.value
+        self.usages[name] = self.usages.get(name, 0) + 1
+        input_type = self.type_info.get_input_type() if self.type_info else None
+        if input_type is not None:
+            self.types[name] = str(input_type)
+
+
+def _variable_usages(document: DocumentNode, schema: GraphQLSchema | None) -> _VariableUsages:
+    """Visit the variable usages of a document, with type information if possible"""
+    if schema is None:
+        usages = _VariableUsages(None)
+        visit(document, usages)
+    else:
+        usages = _VariableUsages(TypeInfo(schema))
+        visit(document, TypeInfoVisitor(usages.type_info, usages))  # type: ignore[arg-type]
+    return usages
+
+
+def _replace_placeholders(template: str) -> tuple[str, tuple[Placeholder, ...]] | None:
+    """Replace the placeholders of a template by variables
+
+    None, if the template has no placeholders or uses more than expressions
+    (statements, comments) or expressions which are not valid.
+    """
+    try:
+        if any(kind in STATEMENT_TOKENS for _, kind, _ in jinja_environment().lex(template)):
+            return None
+    except jinja2.TemplateSyntaxError:
+        return None
+    placeholders: list[Placeholder] = []
+
+    def replace(match: re.Match) -> str:
+        name = f"{VARIABLE_PREFIX}{len(placeholders)}"
+        placeholders.append(
+            Placeholder(
+                name=name,
+                expression=match.group("expression").strip(),
+                quoted=bool(match.group("quote")),
+            )
+        )
+        return f"${name}"
+
+    query = PLACEHOLDER.sub(replace, template)
+    if not placeholders or "{{" in query or "}}" in query:
+        return None
+    try:
+        for placeholder in placeholders:
+            get_template(f"{{{{ {placeholder.expression} }}}}")
+    except jinja2.TemplateSyntaxError:
+        return None
+    return query, tuple(placeholders)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def rewrite_template(
+    template: str,
+    schema: GraphQLSchema | None = None,
+    variable_types: tuple[tuple[str, str], ...] = (),
+) -> VariableTemplate | None:
+    """Rewrite the placeholders of a query template into variables
+
+    Placeholders need to be jinja expressions in argument value positions, either
+    bare or as the complete content of a string. The variable types are taken
+    from variable_types (by expression) or derived from the schema. None is
+    returned if the template can not be rewritten.
+    """
+    replaced = _replace_placeholders(template)
+    if replaced is None:
+        return None
+    query, placeholders = replaced
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return None
+    operations = [_ for _ in document.definitions if isinstance(_, OperationDefinitionNode)]
+    if len(operations) != 1:
+        return None
+    declared = dict(variable_types)
+    usages = _variable_usages(document, schema)
+    definitions = list(operations[0].variable_definitions or ())
+    for placeholder in placeholders:
+        type_ = declared.get(placeholder.expression) or usages.types.get(placeholder.name)
+        # a placeholder inside a string or a comment is no variable usage
+        if type_ is None or usages.usages.get(placeholder.name) != 1:
+            return None
+        definitions.append(
+            VariableDefinitionNode(
+                variable=VariableNode(name=NameNode(value=placeholder.name)),
+                type=parse_type(type_),
+                directives=(),
+            )
+        )
+    operations[0].variable_definitions = tuple(definitions)
+    return VariableTemplate(document=parse_query(print_ast(document)), placeholders=placeholders)
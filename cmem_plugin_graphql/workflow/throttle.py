@@ -0,0 +1,159 @@
+"""Rate limiting and retry module"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from gql.transport.exceptions import TransportServerError
+
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+OVERLOAD_STATUS_CODES = frozenset({429, 503})
+MAX_RETRY_DELAY = 60.0
+
+
+class TokenBucket:
+    """Limit the rate of requests with a token bucket
+
+    One token is added every 1 / rate seconds, up to burst tokens. Each request
+    takes a token and waits until the token is available, so requests pass in
+    the order they asked for a token. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float = 0, burst: float | None = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Take a token, wait until it is available"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # reserve the token, a negative balance is the queue of waiting requests
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class AdaptiveConcurrency:
+    """Limit the number of requests in flight, adapted to server pushback (AIMD)
+
+    The limit starts at maximum. An overloaded request halves the limit, every
+    successful request increases it by 1 / limit (about one per round trip of
+    limit requests) up to maximum. Only the first overload of requests started
+    with the same limit reduces it, so a burst of rejections halves it once.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        if maximum < 1:
+            raise ValueError("Maximum number of concurrent requests must be at least 1.")
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.epoch = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    async def acquire(self) -> int:
+        """Wait for a free slot and return the epoch of the current limit"""
+        while self.in_flight >= int(self.limit):
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # pass a wake up which was not used on to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+        return self.epoch
+
+    def release(self, epoch: int, overloaded: bool = False) -> None:
+        """Free a slot and adapt the limit"""
+        self.in_flight -= 1
+        if overloaded:
+            if epoch == self.epoch:
+                self.limit = max(1.0, self.limit / 2)
+                self.epoch += 1
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Wake up as many waiters as there are free slots"""
+        free = int(self.limit) - self.in_flight
+        while self._waiters and free > 0:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+def _status(error: BaseException) -> int | None:
+    """Get the HTTP status code of a failed request"""
+    if isinstance(error, TransportServerError):
+        return error.code
+    return None
+
+
+def is_overloaded(error: BaseException) -> bool:
+    """Check if the server rejected the request because of load"""
+    return _status(error) in OVERLOAD_STATUS_CODES
+
+
+def is_retryable(error: BaseException, idempotent: bool = True) -> bool:
+    """Check if the failed request can be sent again
+
+    Requests rejected with 429 or 503 were not processed by the server, so they
+    are always retried. Requests which failed with 502 or 504 or on the connection
+    may have been executed by the server, so they are only retried if they are
+    idempotent (query operations).
+    """
+    status = _status(error)
+    if status in OVERLOAD_STATUS_CODES:
+        return True
+    if not idempotent:
+        return False
+    return status in RETRY_STATUS_CODES or isinstance(
+        error, aiohttp.ClientConnectionError | TimeoutError
+    )
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Get the delay requested by the Retry-After header of a failed request"""
+    cause = error.__cause__
+    if not isinstance(cause, aiohttp.ClientResponseError) or not cause.headers:
+        return None
+    value = cause.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=UTC)
+    return max(0.0, (date - datetime.now(tz=UTC)).total_seconds())
+
+
+def retry_delay(attempt: int, backoff: float, requested: float | None = None) -> float:
+    """Get the jittered exponential delay before retry attempt (starting with 0)
+
+    A delay requested by the server (Retry-After) is respected, jitter is added
+    on top, so retries of concurrent requests do not arrive at the same time.
+    """
+    ceiling = min(MAX_RETRY_DELAY, backoff * 2**attempt)
+    if requested is not None:
+        return min(MAX_RETRY_DELAY, requested) + random.uniform(0, backoff)  # noqa: S311 # nosec
+    return random.uniform(0, ceiling)  # noqa: S311 # nosec
@@ -1,11 +1,16 @@
-"""Utils module"""
+"""Utils module
+
+jinja2, gql and graphql are imported on first use, so loading the plugin module
+during plugin discovery stays cheap.
+"""
 
 import json
 import uuid
-from collections.abc import Iterator
-from typing import Any
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Any, TypeVar
 
-import jinja2
 from cmem_plugin_base.dataintegration.entity import (
     Entities,
     Entity,
@@ -13,56 +18,149 @@ from cmem_plugin_base.dataintegration.entity import (
     EntitySchema,
 )
 
+if TYPE_CHECKING:
+    import jinja2
+    from graphql import DocumentNode
+
+T = TypeVar("T")
+
+DOCUMENT_CACHE_SIZE = 1024
+TEMPLATE_CACHE_SIZE = 64
+
+# block, variable and comment start strings of the jinja environment
+JINJA_START_STRINGS = ("{%", "{{", "{#")
+
+
+SCALAR_TYPES = frozenset((int, float, bool, str))
+
 
 def get_dict(entities: Entities) -> Iterator[dict[str, str]]:
     """Get dict from entities"""
-    paths = entities.schema.paths
+    path_index = list(enumerate(path.path for path in entities.schema.paths))
     for entity in entities.entities:
+        values = entity.values
         result = {}
-        for i, path in enumerate(paths):
-            result[path.path] = entity.values[i][0] if entity.values[i] else ""
+        for index, key in path_index:
+            result[key] = values[index][0] if values[index] else ""
         yield result
 
 
+def batched(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Split an iterable into lists of size elements (the last one may be shorter)"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@lru_cache(maxsize=1)
+def jinja_environment() -> "jinja2.Environment":
+    """Get the shared jinja environment"""
+    import jinja2
+
+    return jinja2.Environment(autoescape=True)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
 def is_jinja_template(value: str) -> bool:
-    """Check value contain jinja variables"""
-    environment = jinja2.Environment(autoescape=True)
-    template = environment.from_string(value)
-    res = template.render()
-    return res != value
+    """Check value contain jinja syntax (variables, expressions, statements or comments)
 
+    The value is only tokenized by the lexer of the shared environment, not compiled
+    or rendered. Results are memoized per value.
+    """
+    if not any(start in value for start in JINJA_START_STRINGS):
+        return False
+    return any(kind != "data" for _, kind, _ in jinja_environment().lex(value))
 
-def get_entities_from_list(data: list[dict[str, Any]]) -> Entities:
-    """Generate entities from list"""
-    paths: list[str] = []
-    unique_paths: set[str] = set()
-    entities = []
-    # first pass to extract paths
-    for dict_ in data:
-        unique_paths.update(set(dict_.keys()))
 
-    paths = list(unique_paths)
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def get_template(source: str) -> "jinja2.Template":
+    """Get the compiled jinja template of a source string"""
+    return jinja_environment().from_string(source)
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def parse_query(query: str) -> "DocumentNode":
+    """Parse a GraphQL query, memoized by query text
+
+    The returned document is shared between callers and must not be modified.
+    """
+    from gql import gql
+
+    return gql(query)
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def print_query(document: "DocumentNode") -> str:
+    """Get the normalized query text of a document, memoized per document"""
+    from graphql import print_ast
+
+    return print_ast(document)
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def is_query(document: "DocumentNode") -> bool:
+    """Check that all operations of a document are queries (no mutations or subscriptions)"""
+    from graphql import OperationDefinitionNode, OperationType
+
+    return all(
+        definition.operation == OperationType.QUERY
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    )
+
+
+def get_entities_from_list(
+    data: Iterable[dict[str, Any]], uri_prefix: str | None = None
+) -> Entities:
+    """Generate entities from list
+
+    Paths are collected in order of their first appearance in a single pass over
+    the data. If uri_prefix is given, entity URIs are uri_prefix followed by the
+    row number, otherwise random urn:uuid URIs are generated.
+    """
+    path_index: dict[str, int] = {}
+    rows: list[list[list[Any]]] = []
     for dict_ in data:
-        entity = create_entity(paths, dict_)
-        entities.append(entity)
+        for key in dict_:
+            if key not in path_index:
+                path_index[key] = len(path_index)
+        rows.append(create_values(path_index, dict_))
+
+    width = len(path_index)
+    entities = []
+    for number, values in enumerate(rows):
+        if len(values) < width:
+            values.extend([] for _ in range(width - len(values)))
+        entity_uri = f"{uri_prefix}{number}" if uri_prefix is not None else random_uri()
+        entities.append(Entity(uri=entity_uri, values=values))
 
     schema = EntitySchema(
         type_uri="https://example.org/vocab/RandomValueRow",
-        paths=[EntityPath(path=path) for path in paths],
+        paths=[EntityPath(path=path) for path in path_index],
     )
-    return Entities(entities=entities, schema=schema)
+    return Entities(entities=iter(entities), schema=schema)
 
 
-def create_entity(paths: list[str], dict_: dict[str, Any]) -> Entity:
-    """Create entity from dict based on order from paths list"""
-    values: list[list[str | None]] = []
-    for path in paths:
-        value = dict_.get(path)
+def random_uri() -> str:
+    """Create a random entity URI"""
+    return f"urn:uuid:{uuid.uuid4()!s}"
+
+
+def create_values(path_index: dict[str, int], dict_: dict[str, Any]) -> list[list[Any]]:
+    """Create entity values from dict based on the path positions in path_index"""
+    values: list[list[Any]] = [[] for _ in range(len(path_index))]
+    for path, value in dict_.items():
         if value is None:
-            values.append([])
-        elif type(value) in (int, float, bool, str):
-            values.append([value])
+            continue
+        if type(value) in SCALAR_TYPES:
+            values[path_index[path]] = [value]
         else:
-            values.append([json.dumps(value)])
-    entity_uri = f"urn:uuid:{uuid.uuid4()!s}"
-    return Entity(uri=entity_uri, values=values)
+            values[path_index[path]] = [json.dumps(value)]
+    return values
+
+
+def create_entity(paths: list[str], dict_: dict[str, Any], entity_uri: str | None = None) -> Entity:
+    """Create entity from dict based on order from paths list"""
+    path_index = {path: index for index, path in enumerate(paths)}
+    values = create_values(path_index, {_: dict_[_] for _ in paths if _ in dict_})
+    return Entity(uri=entity_uri or random_uri(), values=values)
@@ -0,0 +1,74 @@
+"""Result writer module"""
+
+import json
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any
+
+OUTPUT_FORMAT_JSON = "json"
+OUTPUT_FORMAT_JSON_LINES = "jsonl"
+
+OUTPUT_FORMATS = OrderedDict(
+    {
+        OUTPUT_FORMAT_JSON: "JSON array",
+        OUTPUT_FORMAT_JSON_LINES: "JSON Lines",
+    }
+)
+
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+class JsonResultWriter:
+    """Serialize results one by one into a spooled temporary file
+
+    Results are written as a JSON array or as JSON Lines. Only SPOOL_MAX_SIZE
+    bytes are held in memory, larger outputs are rolled over to disk. The
+    pretty printed JSON array output is identical to json.dumps(results, indent=2).
+    """
+
+    def __init__(self, output_format: str = OUTPUT_FORMAT_JSON, pretty_print: bool = True) -> None:
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'.")
+        self.json_lines = output_format == OUTPUT_FORMAT_JSON_LINES
+        self.pretty_print = pretty_print and not self.json_lines
+        self.count = 0
+        self.bytes_written = 0
+        self.file: IO[bytes] = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+b")
+
+    def __enter__(self) -> "JsonResultWriter":
+        """Use the writer as context manager"""
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Close the temporary file"""
+        self.close()
+
+    def _write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.bytes_written += len(data)
+        self.file.write(data)
+
+    def write(self, result: Any) -> None:  # noqa: ANN401
+        """Serialize a single result"""
+        if self.json_lines:
+            self._write(json.dumps(result) + "\n")
+        elif self.pretty_print:
+            indented = json.dumps(result, indent=2).replace("\n", "\n  ")
+            self._write(("[\n  " if self.count == 0 else ",\n  ") + indented)
+        else:
+            self._write(("[" if self.count == 0 else ", ") + json.dumps(result))
+        self.count += 1
+
+    def finish(self) -> IO[bytes]:
+        """Finish the serialization and return the file rewound to its start"""
+        if not self.json_lines:
+            if self.count == 0:
+                self._write("[]")
+            else:
+                self._write("\n]" if self.pretty_print else "]")
+        self.file.seek(0)
+        return self.file
+
+    def close(self) -> None:
+        """Close the temporary file"""
+        self.file.close()
@@ -0,0 +1,319 @@
+"""Benchmark of the request pipeline against a local stand-in GraphQL server
+
+Run with `python -m tests.benchmarks.bench_pipeline` (default: 1k, 10k and 100k
+rows). Every case runs GraphQLPlugin.execute with synthetic entities and a
+stub execution context in a fresh process, so the peak memory (max RSS) belongs
+to this case only. Results are appended to tests/benchmarks/results.jsonl and
+compared with the last stored result of the same parameters.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from cmem_plugin_base.dataintegration.context import (
+    ExecutionContext,
+    ExecutionReport,
+    ReportContext,
+    TaskContext,
+)
+from cmem_plugin_base.dataintegration.entity import Entities, Entity, EntityPath, EntitySchema
+
+from cmem_plugin_graphql.workflow.codec import COMPRESSION_MODES, COMPRESSION_NONE
+from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+from cmem_plugin_graphql.workflow.persisted import PERSISTED_QUERIES_MODES, PERSISTED_QUERIES_NONE
+from tests.benchmarks.server import StandInServer
+
+RESULTS_FILE = Path(__file__).parent / "results.jsonl"
+QUERY = "query item($id: ID!) { item(id: $id) { id name payload tags } }"
+VARIABLES = '{"id": "{{ id }}"}'
+
+
+@dataclass
+class BenchmarkCase:
+    """Parameters of a benchmark run"""
+
+    rows: int = 1000
+    latency: float = 0.001
+    payload_size: int = 100
+    error_rate: float = 0.0
+    concurrency: int = 16
+    batch_size: int = 1
+    persisted_queries: str = PERSISTED_QUERIES_NONE
+    worker_processes: int = 1
+    shard_size: int = 1000
+    request_compression: str = COMPRESSION_NONE
+    server_compression: bool = False
+    projection: str = ""
+    stage_queue_size: int = 100
+    # seconds the consumer of the output spends per entity (a slow writer)
+    output_delay: float = 0.0
+
+
+class BenchmarkReportContext(ReportContext):
+    """Report context which keeps the last report and counts the updates"""
+
+    def __init__(self) -> None:
+        self.last: ExecutionReport | None = None
+        self.updates = 0
+
+    def update(self, report: ExecutionReport) -> None:
+        """Keep the report"""
+        self.last = report
+        self.updates += 1
+
+
+class BenchmarkTaskContext(TaskContext):
+    """Task context of the benchmark project"""
+
+    def project_id(self) -> str:
+        """Get the project identifier"""
+        return "benchmark"
+
+    def task_id(self) -> str:
+        """Get the task identifier"""
+        return "graphql"
+
+
+class BenchmarkExecutionContext(ExecutionContext):
+    """Execution context without Corporate Memory"""
+
+    def __init__(self) -> None:
+        self.report = BenchmarkReportContext()
+        self.task = BenchmarkTaskContext()
+        self.user = None
+        self.workflow = None
+
+
+def synthetic_entities(rows: int) -> Entities:
+    """Create entities with one id per row, generated lazily"""
+    return Entities(
+        entities=(Entity(uri=f"urn:row:{_}", values=[[str(_)]]) for _ in range(rows)),
+        schema=EntitySchema(type_uri="", paths=[EntityPath("id")]),
+    )
+
+
+def consume(entities: Entities | None, delay: float = 0.0) -> int:
+    """Consume the output entities and their sub entities, return the root count"""
+    if entities is None:
+        return 0
+    count = 0
+    for _ in entities.entities:
+        count += 1
+        if delay:
+            time.sleep(delay)
+    for sub_entities in entities.sub_entities or []:
+        for _ in sub_entities.entities:
+            pass
+    return count
+
+
+def peak_memory() -> int:
+    """Get the peak resident memory of this process in bytes, 0 on Windows"""
+    if sys.platform == "win32":
+        return 0
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def run_benchmark(case: BenchmarkCase) -> dict[str, Any]:
+    """Run a benchmark case in this process and return the measurements"""
+    with StandInServer(
+        latency=case.latency,
+        payload_size=case.payload_size,
+        error_rate=case.error_rate,
+        compression=case.server_compression,
+    ) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=case.concurrency,
+            batch_size=case.batch_size,
+            persisted_queries=case.persisted_queries,
+            worker_processes=case.worker_processes,
+            shard_size=case.shard_size,
+            request_compression=case.request_compression,
+            projection=case.projection,
+            stage_queue_size=case.stage_queue_size,
+            max_retries=10,
+            retry_backoff=0.01,
+        )
+        context = BenchmarkExecutionContext()
+        start = time.perf_counter()
+        entities = consume(
+            plugin.execute([synthetic_entities(case.rows)], context), case.output_delay
+        )
+        elapsed = time.perf_counter() - start
+        metrics = plugin.metrics.as_dict()
+    return {
+        "entities": entities,
+        "failed": metrics["counters"].get("failed_entities", 0),
+        "seconds": elapsed,
+        "rows_per_second": case.rows / elapsed,
+        "requests": server.requests,
+        "server_errors": server.errors,
+        "get_requests": server.get_requests,
+        "persisted_misses": server.persisted_misses,
+        "latency_p50": metrics["stages"].get("request", {}).get("p50", 0.0),
+        "latency_p99": metrics["stages"].get("request", {}).get("p99", 0.0),
+        "bytes_sent": metrics["bytes_sent"],
+        "bytes_received": metrics["bytes_received"],
+        "wire_bytes_sent": metrics["wire_bytes_sent"],
+        "wire_bytes_received": metrics["wire_bytes_received"],
+        "decode_seconds": metrics["stages"].get("decode", {}).get("total", 0.0),
+        "fetch_blocked_seconds": metrics["stages"].get("fetch_blocked", {}).get("total", 0.0),
+        "output_idle_seconds": metrics["stages"].get("output_idle", {}).get("total", 0.0),
+        "queue_depth_max": metrics["queues"].get("results", {}).get("max", 0.0),
+        "report_updates": context.report.updates,
+        "peak_memory": peak_memory(),
+    }
+
+
+def run_in_subprocess(case: BenchmarkCase) -> dict[str, Any]:
+    """Run a benchmark case in a fresh interpreter"""
+    completed = subprocess.run(  # noqa: S603 # nosec
+        [
+            sys.executable,
+            "-m",
+            "tests.benchmarks.bench_pipeline",
+            "--single",
+            json.dumps(asdict(case)),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    result: dict[str, Any] = json.loads(completed.stdout.splitlines()[-1])
+    return result
+
+
+def git_revision() -> str:
+    """Get the revision of the working copy"""
+    completed = subprocess.run(  # noqa: S603 # nosec
+        ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+        capture_output=True,
+        check=False,
+        text=True,
+    )
+    return completed.stdout.strip() or "unknown"
+
+
+def previous_result(results_file: Path, case: BenchmarkCase) -> dict[str, Any] | None:
+    """Get the last stored result of a case with the same parameters
+
+    Parameters which were added later have their default value in older results.
+    """
+    if not results_file.exists():
+        return None
+    previous = None
+    defaults = asdict(BenchmarkCase())
+    for line in results_file.read_text(encoding="utf-8").splitlines():
+        record = json.loads(line)
+        if asdict(case) == {**defaults, **record["case"]}:
+            previous = record
+    return previous
+
+
+def main(cases: list[BenchmarkCase], results_file: Path | None) -> None:
+    """Run the benchmark cases, print and store the results"""
+    revision = git_revision()
+    for case in cases:
+        result = run_in_subprocess(case)
+        previous = previous_result(results_file, case) if results_file else None
+        change = ""
+        if previous:
+            ratio = result["rows_per_second"] / previous["result"]["rows_per_second"]
+            change = f" ({ratio - 1:+.0%} vs. {previous['revision']})"
+        print(  # noqa: T201
+            f"{case.rows:>8,} rows {result['rows_per_second']:>10,.0f} rows/s{change}"
+            f"  {result['requests']:,} requests  p50 {result['latency_p50'] * 1000:.1f} ms"
+            f"  received {result['wire_bytes_received'] / 2**20:,.1f} MiB"
+            f"  peak {result['peak_memory'] / 2**20:,.0f} MiB"
+        )
+        if results_file:
+            record = {
+                "date": datetime.now(tz=UTC).isoformat(timespec="seconds"),
+                "revision": revision,
+                "python": platform.python_version(),
+                "case": asdict(case),
+                "result": result,
+            }
+            with results_file.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--latency", type=float, default=BenchmarkCase.latency)
+    parser.add_argument("--payload-size", type=int, default=BenchmarkCase.payload_size)
+    parser.add_argument("--error-rate", type=float, default=BenchmarkCase.error_rate)
+    parser.add_argument("--concurrency", type=int, default=BenchmarkCase.concurrency)
+    parser.add_argument("--batch-size", type=int, default=BenchmarkCase.batch_size)
+    parser.add_argument(
+        "--persisted-queries",
+        choices=list(PERSISTED_QUERIES_MODES),
+        default=BenchmarkCase.persisted_queries,
+    )
+    parser.add_argument("--worker-processes", type=int, default=BenchmarkCase.worker_processes)
+    parser.add_argument("--shard-size", type=int, default=BenchmarkCase.shard_size)
+    parser.add_argument(
+        "--request-compression",
+        choices=list(COMPRESSION_MODES),
+        default=BenchmarkCase.request_compression,
+    )
+    parser.add_argument(
+        "--server-compression", action="store_true", help="compress the server responses"
+    )
+    parser.add_argument(
+        "--projection", default=BenchmarkCase.projection, help="output columns, one per line"
+    )
+    parser.add_argument("--stage-queue-size", type=int, default=BenchmarkCase.stage_queue_size)
+    parser.add_argument(
+        "--output-delay", type=float, default=BenchmarkCase.output_delay, help="seconds per entity"
+    )
+    parser.add_argument("--results", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--no-store", action="store_true", help="do not store the results")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if arguments.single:
+        print(json.dumps(run_benchmark(BenchmarkCase(**json.loads(arguments.single)))))  # noqa: T201
+    else:
+        main(
+            [
+                BenchmarkCase(
+                    rows=rows,
+                    latency=arguments.latency,
+                    payload_size=arguments.payload_size,
+                    error_rate=arguments.error_rate,
+                    concurrency=arguments.concurrency,
+                    batch_size=arguments.batch_size,
+                    persisted_queries=arguments.persisted_queries,
+                    worker_processes=arguments.worker_processes,
+                    shard_size=arguments.shard_size,
+                    request_compression=arguments.request_compression,
+                    server_compression=arguments.server_compression,
+                    projection=arguments.projection,
+                    stage_queue_size=arguments.stage_queue_size,
+                    output_delay=arguments.output_delay,
+                )
+                for rows in arguments.rows
+            ],
+            None if arguments.no_store else arguments.results,
+        )
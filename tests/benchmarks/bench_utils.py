@@ -0,0 +1,94 @@
+"""Micro benchmark of the per-row conversion helpers in workflow/utils.py
+
+Run with `python -m tests.benchmarks.bench_utils [rows]` (default: 1,000,000 rows).
+The previous implementations are kept here as reference for the comparison.
+"""
+
+import json
+import sys
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from cmem_plugin_base.dataintegration.entity import Entities, Entity, EntityPath, EntitySchema
+
+from cmem_plugin_graphql.workflow.utils import get_dict, get_entities_from_list
+
+PATHS = ["id", "name", "family", "origin", "climatic_zone"]
+
+
+def previous_get_dict(entities: Entities) -> Iterator[dict[str, str]]:
+    """Get dict from entities (previous implementation)"""
+    paths = entities.schema.paths
+    for entity in entities.entities:
+        result = {}
+        for i, path in enumerate(paths):
+            result[path.path] = entity.values[i][0] if entity.values[i] else ""
+        yield result
+
+
+def previous_get_entities_from_list(data: list[dict[str, Any]]) -> list[Entity]:
+    """Generate entities from list (previous implementation)"""
+    unique_paths: set[str] = set()
+    for dict_ in data:
+        unique_paths.update(set(dict_.keys()))
+    paths = list(unique_paths)
+    entities = []
+    for dict_ in data:
+        values: list[list[Any]] = []
+        for path in paths:
+            value = dict_.get(path)
+            if value is None:
+                values.append([])
+            elif type(value) in (int, float, bool, str):
+                values.append([value])
+            else:
+                values.append([json.dumps(value)])
+        entities.append(Entity(uri=f"urn:uuid:{uuid.uuid4()!s}", values=values))
+    return entities
+
+
+def make_entities(rows: int) -> Callable[[], Entities]:
+    """Create input entities, returns a factory to iterate them repeatedly"""
+    entities = [Entity(f"urn:{i}", [[str(i)], ["name"], [], ["x"], ["y"]]) for i in range(rows)]
+    schema = EntitySchema(type_uri="", paths=[EntityPath(path) for path in PATHS])
+    return lambda: Entities(entities=iter(entities), schema=schema)
+
+
+def make_data(rows: int) -> list[dict[str, Any]]:
+    """Create result rows"""
+    return [
+        {"id": i, "name": "name", "family": None, "origin": {"country": "x"}, "climatic_zone": "y"}
+        for i in range(rows)
+    ]
+
+
+def measure(label: str, rows: int, function: Callable[[], object]) -> float:
+    """Print and return rows per second of function"""
+    start = time.perf_counter()
+    function()
+    rate = rows / (time.perf_counter() - start)
+    print(f"{label:<45} {rate:>12,.0f} rows/s")  # noqa: T201
+    return rate
+
+
+def main(rows: int) -> None:
+    """Run the benchmark"""
+    entities = make_entities(rows)
+    measure("get_dict (previous)", rows, lambda: list(previous_get_dict(entities())))
+    measure("get_dict", rows, lambda: list(get_dict(entities())))
+    data = make_data(rows)
+    measure(
+        "get_entities_from_list (previous)", rows, lambda: previous_get_entities_from_list(data)
+    )
+    measure("get_entities_from_list (uuid URIs)", rows, lambda: get_entities_from_list(data))
+    measure(
+        "get_entities_from_list (counter URIs)",
+        rows,
+        lambda: get_entities_from_list(data, uri_prefix="urn:row:"),
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
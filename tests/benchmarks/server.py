@@ -0,0 +1,292 @@
+"""Local stand-in GraphQL server for benchmarks
+
+The server answers `item(id)` queries and `createItems(input)` bulk mutations of
+a small schema with graphql-core (created items without name fail with an error
+at their list index), also as JSON array batches, as automatic persisted queries (APQ) and via GET.
+Like Apollo Server, GET requests without an Apollo-Require-Preflight header are rejected.
+Latency, payload size and error rate are configurable, failing requests are
+answered with 503 and a Retry-After header. Queries of the given item ids can be
+answered with an HTML page (like a proxy error page) or with a GraphQL error and
+status 500. Compressed requests are accepted, responses are compressed if
+compression is enabled. The server runs in a separate process, so it does not
+compete with the benchmarked client for the GIL.
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import random
+from dataclasses import dataclass
+from functools import lru_cache
+from multiprocessing.sharedctypes import Synchronized
+from typing import Any, cast
+
+from aiohttp import web
+from graphql import (
+    DocumentNode,
+    GraphQLObjectType,
+    GraphQLSchema,
+    build_schema,
+    execute,
+    parse,
+    validate,
+)
+
+SDL = """
+type Item {
+  id: ID!
+  name: String
+  payload: String
+  tags: [String]
+}
+input ItemInput {
+  id: ID!
+  name: String
+}
+type Query {
+  item(id: ID!): Item
+}
+type Mutation {
+  createItems(input: [ItemInput!]!): [Item]
+}
+"""
+
+
+@dataclass
+class ServerConfig:
+    """Behaviour of the stand-in server"""
+
+    latency: float = 0.0
+    payload_size: int = 100
+    error_rate: float = 0.0
+    seed: int = 0
+    compression: bool = False
+    # item ids answered with an HTML page (status 200) or a GraphQL error (status 500)
+    html_ids: tuple[str, ...] = ()
+    failing_ids: tuple[str, ...] = ()
+
+
+class _Handler:
+    """Request handler of the server process"""
+
+    def __init__(self, config: ServerConfig, counters: dict[str, Synchronized]) -> None:
+        self.config = config
+        self.counters = counters
+        self.random = random.Random(config.seed)  # noqa: S311 # nosec
+        self.schema: GraphQLSchema = build_schema(SDL)
+        self.schema.query_type.fields["item"].resolve = self._resolve_item  # type: ignore[union-attr]
+        self.schema.mutation_type.fields["createItems"].resolve = self._create_items  # type: ignore[union-attr]
+        item_type = cast(GraphQLObjectType, self.schema.type_map["Item"])
+        item_type.fields["name"].resolve = self._resolve_name
+        self.parse = lru_cache(maxsize=128)(self._parse)
+        self.persisted: dict[str, str] = {}
+
+    def _resolve_item(self, _root: Any, _info: Any, id: str) -> dict[str, Any]:  # noqa: A002, ANN401
+        return {
+            "id": id,
+            "name": f"item {id}",
+            "payload": "x" * self.config.payload_size,
+            "tags": ["benchmark", f"tag{id}"],
+        }
+
+    def _create_items(
+        self,
+        _root: Any,  # noqa: ANN401
+        _info: Any,  # noqa: ANN401
+        input: list[dict[str, Any]],  # noqa: A002
+    ) -> list[dict[str, Any]]:
+        return [{**self._resolve_item(None, None, _["id"]), "name": _.get("name")} for _ in input]
+
+    @staticmethod
+    def _resolve_name(item: dict[str, Any], _info: Any) -> str:  # noqa: ANN401
+        if not item["name"]:
+            raise ValueError("Item needs a name.")
+        return str(item["name"])
+
+    def _parse(self, query: str) -> DocumentNode | list[Any]:
+        """Parse and validate a query, return the document or the errors"""
+        document = parse(query)
+        errors = validate(self.schema, document)
+        return [_.formatted for _ in errors] if errors else document
+
+    def _query(self, operation: dict[str, Any]) -> str | None:
+        """Get the query of an operation, register persisted queries"""
+        persisted = (operation.get("extensions") or {}).get("persistedQuery")
+        if not persisted:
+            return str(operation["query"])
+        query_hash = persisted["sha256Hash"]
+        if "query" in operation:
+            if hashlib.sha256(operation["query"].encode()).hexdigest() != query_hash:
+                raise web.HTTPBadRequest(text="provided sha does not match query")
+            self.persisted[query_hash] = operation["query"]
+        return self.persisted.get(query_hash)
+
+    def _execute(self, operation: dict[str, Any]) -> dict[str, Any]:
+        self.counters["operations"].value += 1
+        query = self._query(operation)
+        if query is None:
+            self.counters["persisted_misses"].value += 1
+            return {
+                "errors": [
+                    {
+                        "message": "PersistedQueryNotFound",
+                        "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    }
+                ]
+            }
+        document = self.parse(query)
+        if isinstance(document, list):
+            return {"errors": document}
+        result = execute(self.schema, document, variable_values=operation.get("variables"))
+        answer: dict[str, Any] = {"data": result.data}  # type: ignore[union-attr]
+        if result.errors:  # type: ignore[union-attr]
+            answer["errors"] = [_.formatted for _ in result.errors]  # type: ignore[union-attr]
+        return answer
+
+    def _broken_answer(self, body: Any) -> web.Response | None:  # noqa: ANN401
+        """Get the HTML page or GraphQL error answer of a query of a broken item"""
+        item_id = (body.get("variables") or {}).get("id") if isinstance(body, dict) else None
+        if item_id in self.config.html_ids:
+            return web.Response(
+                text="<html><body>Bad Gateway</body></html>", content_type="text/html"
+            )
+        if item_id in self.config.failing_ids:
+            return web.json_response(
+                {"data": None, "errors": [{"message": f"Item {item_id} failed."}]}, status=500
+            )
+        return None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.counters["requests"].value += 1
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self.counters["errors"].value += 1
+            return web.Response(status=503, text="overloaded", headers={"Retry-After": "0"})
+        if request.method == "GET":
+            self.counters["get_requests"].value += 1
+            # Apollo Server CSRF prevention
+            if not request.headers.get("Apollo-Require-Preflight"):
+                raise web.HTTPBadRequest(text="GET requests need a preflight header")
+            body = {
+                key: json.loads(value) for key, value in request.query.items() if key != "query"
+            }
+            if "query" in request.query:
+                body["query"] = request.query["query"]
+        else:
+            body = await request.json()
+        broken = self._broken_answer(body)
+        if broken is not None:
+            return broken
+        if isinstance(body, list):
+            response = web.json_response([self._execute(_) for _ in body])
+        else:
+            response = web.json_response(self._execute(body))
+        if self.config.compression:
+            response.enable_compression()
+        return response
+
+
+def _serve(
+    config: ServerConfig,
+    counters: dict[str, Synchronized],
+    port: "multiprocessing.Queue[int]",
+) -> None:
+    """Run the server until the process is terminated"""
+
+    async def serve() -> None:
+        app = web.Application()
+        handler = _Handler(config, counters)
+        app.router.add_post("/graphql", handler.handle)
+        app.router.add_get("/graphql", handler.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port.put(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+class StandInServer:
+    """GraphQL server with configurable latency (seconds), payload size, errors, compression"""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        latency: float = 0.0,
+        payload_size: int = 100,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        compression: bool = False,
+        html_ids: tuple[str, ...] = (),
+        failing_ids: tuple[str, ...] = (),
+    ) -> None:
+        self.config = ServerConfig(
+            latency=latency,
+            payload_size=payload_size,
+            error_rate=error_rate,
+            seed=seed,
+            compression=compression,
+            html_ids=html_ids,
+            failing_ids=failing_ids,
+        )
+        self._context = multiprocessing.get_context("spawn")
+        self._counters = {
+            name: self._context.Value("q", 0)
+            for name in ("requests", "operations", "errors", "get_requests", "persisted_misses")
+        }
+        self._process: multiprocessing.process.BaseProcess | None = None
+        self.url = ""
+
+    def __enter__(self) -> "StandInServer":
+        """Start the server"""
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Stop the server"""
+        self.stop()
+
+    @property
+    def requests(self) -> int:
+        """Number of received HTTP requests"""
+        return int(self._counters["requests"].value)
+
+    @property
+    def operations(self) -> int:
+        """Number of executed GraphQL operations"""
+        return int(self._counters["operations"].value)
+
+    @property
+    def errors(self) -> int:
+        """Number of requests answered with an error status"""
+        return int(self._counters["errors"].value)
+
+    @property
+    def get_requests(self) -> int:
+        """Number of received GET requests"""
+        return int(self._counters["get_requests"].value)
+
+    @property
+    def persisted_misses(self) -> int:
+        """Number of persisted query hashes which were not known"""
+        return int(self._counters["persisted_misses"].value)
+
+    def start(self) -> None:
+        """Start the server process and wait until it accepts connections"""
+        port: multiprocessing.Queue[int] = self._context.Queue()
+        self._process = self._context.Process(
+            target=_serve, args=(self.config, self._counters, port), daemon=True
+        )
+        self._process.start()
+        self.url = f"http://127.0.0.1:{port.get(timeout=30)}/graphql"
+
+    def stop(self) -> None:
+        """Stop the server process"""
+        if self._process is None:
+            return
+        self._process.terminate()
+        self._process.join()
+        self._process = None
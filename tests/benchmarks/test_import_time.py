@@ -0,0 +1,52 @@
+"""Plugin load benchmark with `python -X importtime`.
+
+Corporate Memory imports the plugin module to discover the plugin, so the client,
+transports and template machinery are imported on first use only.
+"""
+
+import subprocess
+import sys
+
+PLUGIN_MODULE = "cmem_plugin_graphql.workflow.graphql"
+# imported on first use in execute or validation
+LAZY_MODULES = ["aiohttp", "gql", "graphql", "jinja2", "validators"]
+# microseconds the modules of this package may take themselves
+PACKAGE_BUDGET = 250_000
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """Import a module in a fresh interpreter, get self and cumulative time per module"""
+    completed = subprocess.run(  # noqa: S603 # nosec
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        if not self_time.strip().isdigit():
+            continue  # the header
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def test_plugin_module_is_light() -> None:
+    """Test that loading the plugin does not import the client and templates"""
+    times = import_times(PLUGIN_MODULE)
+    assert PLUGIN_MODULE in times
+    loaded = [_ for _ in times if _.split(".")[0] in LAZY_MODULES]
+    assert loaded == []
+
+
+def test_plugin_module_import_time() -> None:
+    """Test that the modules of this package stay within the import time budget"""
+    times = import_times(PLUGIN_MODULE)
+    package = sum(
+        self_time
+        for name, (self_time, _) in times.items()
+        if name.split(".")[0] == "cmem_plugin_graphql"
+    )
+    assert package < PACKAGE_BUDGET
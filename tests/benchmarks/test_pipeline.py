@@ -0,0 +1,233 @@
+"""Request pipeline benchmarks against the local stand-in server.
+
+The row counts are taken from BENCHMARK_ROWS (comma separated, default: 1000).
+Run `pytest --memray tests/benchmarks` to see the peak memory of each case.
+"""
+
+import os
+import socket
+from pathlib import Path
+
+import pytest
+
+from cmem_plugin_graphql.workflow.codec import COMPRESSION_GZIP
+from cmem_plugin_graphql.workflow.endpoints import BALANCING_LATENCY
+from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+from cmem_plugin_graphql.workflow.persisted import PERSISTED_QUERIES_GET
+from tests.benchmarks.bench_pipeline import (
+    QUERY,
+    VARIABLES,
+    BenchmarkCase,
+    BenchmarkExecutionContext,
+    run_benchmark,
+    synthetic_entities,
+)
+from tests.benchmarks.server import StandInServer
+
+BULK_MUTATION = "mutation ($input: [ItemInput!]!) { createItems(input: $input) { id name } }"
+BULK_ITEM = '{"id": "{{ id }}", "name": "{% if not id.endswith(\'7\') %}item {{ id }}{% endif %}"}'
+
+BENCHMARK_ROWS = [int(_) for _ in os.environ.get("BENCHMARK_ROWS", "1000").split(",")]
+
+
+@pytest.mark.parametrize("rows", BENCHMARK_ROWS)
+def test_pipeline(rows: int) -> None:
+    """Test that all rows are processed with concurrent requests"""
+    result = run_benchmark(BenchmarkCase(rows=rows))
+    assert result["entities"] == rows
+    assert result["failed"] == 0
+    assert result["requests"] == rows + 1  # including the schema introspection
+
+
+def test_pipeline_batches_with_errors() -> None:
+    """Test that batches rejected by the server are retried"""
+    rows = 500
+    result = run_benchmark(BenchmarkCase(rows=rows, batch_size=10, error_rate=0.1))
+    assert result["entities"] == rows
+    assert result["failed"] == 0
+    assert result["server_errors"] > 0
+    assert result["requests"] == rows // 10 + 1 + result["server_errors"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 10])
+def test_pipeline_persisted_queries(batch_size: int) -> None:
+    """Test that automatic persisted queries are registered and then sent as hash"""
+    rows = 200
+    result = run_benchmark(
+        BenchmarkCase(
+            rows=rows, batch_size=batch_size, concurrency=1, persisted_queries=PERSISTED_QUERIES_GET
+        )
+    )
+    assert result["entities"] == rows
+    assert result["failed"] == 0
+    # only the operations of the first request are sent without query
+    assert result["persisted_misses"] == batch_size
+    # GET is only used for single operations, batches are posted
+    assert result["get_requests"] == (rows if batch_size == 1 else 0)
+
+
+def test_pipeline_compression() -> None:
+    """Test compressed requests and responses, and the bytes on the wire"""
+    rows = 200
+    result = run_benchmark(
+        BenchmarkCase(
+            rows=rows,
+            payload_size=2000,
+            request_compression=COMPRESSION_GZIP,
+            server_compression=True,
+        )
+    )
+    assert result["entities"] == rows
+    assert result["failed"] == 0
+    assert result["wire_bytes_received"] < result["bytes_received"] / 5
+
+
+def test_pipeline_worker_processes() -> None:
+    """Test that shards processed in worker processes are merged in input order"""
+    rows = 500
+    with StandInServer(latency=0.001) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=8,
+            worker_processes=2,
+            shard_size=50,
+        )
+        context = BenchmarkExecutionContext()
+        results = list(plugin.execute_results([synthetic_entities(rows)], context))
+    assert [_["item"]["id"] for _ in results] == [str(_) for _ in range(rows)]
+    # the requests of the workers are merged, every worker fetches the schema once
+    assert plugin.metrics.requests == rows
+    assert rows + 1 <= server.requests <= rows + 2
+    assert plugin.metrics.counters["processed_entities"] == rows
+    assert context.report.last is not None
+    assert ("Failed entities", "0") in context.report.last.summary
+
+
+def test_pipeline_checkpoint(tmp_path: Path) -> None:
+    """Test that an interrupted execution is resumed after the last completed entity"""
+    rows = 300
+    with StandInServer(latency=0.001) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=8,
+            checkpoint_directory=str(tmp_path),
+        )
+        results = plugin.execute_results(
+            [synthetic_entities(rows)], BenchmarkExecutionContext(), final_report=False
+        )
+        interrupted = [next(results)["item"]["id"] for _ in range(100)]
+        results.close()
+
+        context = BenchmarkExecutionContext()
+        results = plugin.execute_results([synthetic_entities(rows)], context)
+        resumed = [_["item"]["id"] for _ in results]
+    assert plugin.metrics.requests == rows - len(interrupted)
+    assert resumed == [str(_) for _ in range(rows)]
+    assert plugin.metrics.counters["resumed_entities"] == len(interrupted)
+    assert context.report.last is not None
+    assert ("Resumed entities", "100") in context.report.last.summary
+    # the checkpoint of the successful execution is removed
+    assert [_.suffixes for _ in tmp_path.iterdir()] == [[".watermark", ".json"]]
+
+
+def test_pipeline_bulk() -> None:
+    """Test that bulk mutations count the items failed by the server per entity"""
+    rows = 250
+    with StandInServer(latency=0.001) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=BULK_MUTATION,
+            graphql_variable_values=BULK_ITEM,
+            max_concurrent_requests=4,
+            bulk_variable="input",
+            bulk_size=50,
+        )
+        context = BenchmarkExecutionContext()
+        results = list(plugin.execute_results([synthetic_entities(rows)], context))
+    # every chunk has partial data with errors at the items without name
+    assert len(results) == rows // 50
+    assert [_["id"] for _ in results[1]["createItems"][:3]] == ["50", "51", "52"]
+    assert server.operations == rows // 50 + 1  # including the schema introspection
+    assert plugin.metrics.counters["failed_entities"] == rows // 10
+    assert plugin.metrics.counters["processed_entities"] == rows - rows // 10
+
+
+def test_pipeline_html_answer() -> None:
+    """Test that an answer which is not JSON fails its entity only"""
+    with StandInServer(html_ids=("1",)) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=2,
+        )
+        results = list(plugin.execute_results([synthetic_entities(4)], BenchmarkExecutionContext()))
+    assert [_["item"]["id"] for _ in results] == ["0", "2", "3"]
+    assert plugin.metrics.counters["failed_entities"] == 1
+
+
+def test_pipeline_graphql_error_status() -> None:
+    """Test that a GraphQL error sent with status 500 is not an endpoint failure"""
+    with StandInServer(failing_ids=("1",)) as server:
+        plugin = GraphQLPlugin(
+            graphql_url=server.url,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=2,
+            max_retries=3,
+            retry_backoff=0.01,
+        )
+        results = list(plugin.execute_results([synthetic_entities(4)], BenchmarkExecutionContext()))
+        assert server.requests == 4 + 1  # not retried, including the schema introspection
+    assert [_["item"]["id"] for _ in results] == ["0", "2", "3"]
+    assert plugin.metrics.counters["failed_entities"] == 1
+    assert plugin.metrics.as_dict()["endpoints"][server.url]["failures"] == 0
+
+
+def unused_url() -> str:
+    """Get the URL of a local port which does not accept connections"""
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+    return f"http://127.0.0.1:{port}/graphql"
+
+
+def test_pipeline_replicas() -> None:
+    """Test that requests prefer the fast replica and a dead replica is ejected"""
+    rows = 300
+    dead = unused_url()
+    with StandInServer(latency=0.02) as slow, StandInServer(latency=0.001) as fast:
+        plugin = GraphQLPlugin(
+            graphql_url=dead,
+            graphql_query=QUERY,
+            graphql_variable_values=VARIABLES,
+            max_concurrent_requests=4,
+            graphql_replica_urls=f"{slow.url}\n{fast.url}",
+            load_balancing=BALANCING_LATENCY,
+            retry_backoff=0.01,
+        )
+        context = BenchmarkExecutionContext()
+        results = list(plugin.execute_results([synthetic_entities(rows)], context))
+    assert len(results) == rows
+    endpoints = plugin.metrics.as_dict()["endpoints"]
+    assert endpoints[dead]["failures"] == endpoints[dead]["requests"] > 0
+    assert plugin.metrics.counters["ejected_endpoints"] >= 1
+    assert endpoints[fast.url]["requests"] > 2 * endpoints[slow.url]["requests"]
+    assert context.report.last is not None
+    assert any(_.startswith("Endpoints were ejected") for _ in context.report.last.warnings)
+    labels = [label for label, _ in context.report.last.summary]
+    assert {f"Endpoint {_}" for _ in (dead, slow.url, fast.url)} <= set(labels)
+
+
+def test_pipeline_slow_output() -> None:
+    """Test that a slow output throttles fetching, with a bounded queue of results"""
+    rows = 300
+    result = run_benchmark(BenchmarkCase(rows=rows, stage_queue_size=64, output_delay=0.002))
+    assert result["entities"] == rows
+    assert result["failed"] == 0
+    assert result["fetch_blocked_seconds"] > 0
+    assert result["queue_depth_max"] <= 64  # noqa: PLR2004
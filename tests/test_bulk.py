@@ -0,0 +1,67 @@
+"""Bulk mutation tests."""
+
+import asyncio
+from typing import Any
+
+from cmem_plugin_base.dataintegration.plugins import PluginLogger
+from gql.transport.exceptions import TransportQueryError
+
+from cmem_plugin_graphql.workflow.bulk import failed_items
+from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+from cmem_plugin_graphql.workflow.utils import parse_query
+
+BULK_MUTATION = "mutation ($input: [ItemInput!]!) { createItems(input: $input) { id } }"
+
+
+def test_failed_items() -> None:
+    """Test that errors are mapped to the list indexes of their items"""
+    errors = [
+        {"message": "Item needs a name.", "path": ["createItems", 3, "name"]},
+        {"message": "Item needs a name.", "path": ["createItems", 7, "name"]},
+        {"message": "Duplicate id.", "path": ["createItems", 3, "id"]},
+    ]
+    assert failed_items(errors, 10) == {3, 7}
+    assert failed_items([], 10) == set()
+    # errors without item index or out of range fail the whole mutation
+    assert failed_items([{"message": "Not authorized.", "path": ["createItems"]}], 10) is None
+    assert failed_items([{"message": "Not authorized."}], 10) is None
+    assert failed_items(errors, 5) is None
+
+
+class ErrorLogger(PluginLogger):
+    """Logger which keeps the errors"""
+
+    def __init__(self) -> None:
+        self.errors: list[str] = []
+
+    def error(self, message: str) -> None:
+        """Keep the error"""
+        self.errors.append(message)
+
+
+class FailingSession:
+    """Session stand-in which rejects the second item of a bulk mutation"""
+
+    async def execute(self, document: Any, variable_values: dict[str, Any]) -> dict[str, Any]:  # noqa: ANN401, ARG002
+        """Fail with an error of the item at index 1"""
+        raise TransportQueryError(
+            "Item needs a name.",
+            errors=[{"message": "Item needs a name.", "path": ["createItems", 1, "name"]}],
+            data={"createItems": [{"id": "1"}, None]},
+        )
+
+
+def test_bulk_failed_items_log() -> None:
+    """Test that failed items are logged with their index in the chunk"""
+    plugin = GraphQLPlugin(
+        graphql_url="https://example.org/graphql",
+        graphql_query=BULK_MUTATION,
+        graphql_variable_values='{"id": "{{ id }}"}',
+        bulk_variable="input",
+    )
+    plugin.session = FailingSession()  # type: ignore[assignment]
+    plugin.log = log = ErrorLogger()
+    items: list[dict[str, Any] | None] = [None, {"id": "1"}, {"id": "2"}]
+    result = asyncio.run(plugin._execute_bulk(parse_query(BULK_MUTATION), items))  # noqa: SLF001
+    assert result == ({"createItems": [{"id": "1"}, None]}, 3, 2)
+    assert log.errors == ["Failed bulk items: [2]"]
@@ -0,0 +1,80 @@
+"""Cache tests."""
+
+from pathlib import Path
+
+from cmem_plugin_graphql.workflow.cache import ResponseCache, SchemaCache
+
+INTROSPECTION = {"__schema": {"queryType": {"name": "Query"}, "types": []}}
+
+
+def test_schema_cache(tmp_path: Path) -> None:
+    """Test in-memory and on-disk schema cache"""
+    key = SchemaCache.key("https://example.org/graphql", {"Authorization": "Bearer a"})
+    assert key != SchemaCache.key("https://example.org/graphql", {"Authorization": "Bearer b"})
+    assert key != SchemaCache.key("https://example.org/graphql", {})
+
+    cache = SchemaCache(ttl=60, directory=str(tmp_path))
+    cache.clear()
+    assert cache.get(key) is None
+    cache.set(key, INTROSPECTION)
+    assert cache.get(key) == INTROSPECTION
+    assert (tmp_path / f"{key}.json").exists()
+
+    # schema caches share their memory, entries survive a new process via the directory
+    assert SchemaCache(ttl=60).get(key) == INTROSPECTION
+    cache.clear()
+    assert cache.get(key) == INTROSPECTION
+
+    # expired or disabled caches do not return entries
+    assert SchemaCache(ttl=-1, directory=str(tmp_path)).get(key) is None
+    cache.clear()
+    assert SchemaCache(ttl=0, directory=str(tmp_path)).get(key) is None
+    SchemaCache(ttl=0).set(key, INTROSPECTION)
+    assert SchemaCache(ttl=60).get(key) is None
+
+
+def test_response_cache(tmp_path: Path) -> None:
+    """Test response cache LRU, persistence and counters"""
+    url = "https://example.org/graphql"
+    keys = [ResponseCache.key(url, {}, "{ fruit { id } }", {"id": i}) for i in range(3)]
+    assert keys[0] == ResponseCache.key(url, {}, "{ fruit { id } }", {"id": 0})
+    assert ResponseCache.key(url, {}, "{ a }", {"x": 1, "y": 2}) == ResponseCache.key(
+        url, {}, "{ a }", {"y": 2, "x": 1}
+    )
+    assert ResponseCache.key(url, {}, "{ a }", None) == ResponseCache.key(url, {}, "{ a }", {})
+
+    cache = ResponseCache(ttl=60, max_size=2)
+    for index, key in enumerate(keys):
+        cache.set(key, {"fruit": {"id": index}})
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == {"fruit": {"id": 2}}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    persistent = ResponseCache(ttl=60, max_size=2, directory=str(tmp_path))
+    persistent.set(keys[0], {"fruit": {"id": 0}})
+    persistent.clear()
+    assert persistent.get(keys[0]) == {"fruit": {"id": 0}}
+    assert not ResponseCache().enabled
+    # response caches do not share their memory
+    assert ResponseCache(ttl=60, max_size=2).get(keys[2]) is None
+    # schema and response caches do not share their memory
+    assert SchemaCache(ttl=60).get(keys[0]) is None
+
+
+def test_response_cache_directory_size(tmp_path: Path) -> None:
+    """Test that the cache directory is pruned to max_size files"""
+    max_size = 20
+    cache = ResponseCache(ttl=60, max_size=max_size, directory=str(tmp_path))
+    keys = [ResponseCache.key("https://example.org/graphql", {}, "{ a }", _) for _ in range(100)]
+    for index, key in enumerate(keys):
+        cache.set(key, {"a": index})
+        assert len(list(tmp_path.glob("*.json"))) <= max_size + cache.prune_interval
+    cache.prune()
+    assert len(list(tmp_path.glob("*.json"))) == max_size
+    assert cache.get(keys[-1]) == {"a": len(keys) - 1}
+
+    # expired files are removed
+    SchemaCache(ttl=60, directory=str(tmp_path / "schemas")).set(keys[0], INTROSPECTION)
+    expired = SchemaCache(ttl=-1, directory=str(tmp_path / "schemas"))
+    expired.prune()
+    assert list((tmp_path / "schemas").glob("*.json")) == []
@@ -0,0 +1,46 @@
+"""Checkpoint tests."""
+
+from pathlib import Path
+
+from cmem_plugin_graphql.workflow.checkpoint import Checkpoint
+
+
+def test_checkpoint_resume(tmp_path: Path) -> None:
+    """Test that an interrupted execution is resumed with its results"""
+    key = Checkpoint.key("project", "task", "query")
+    checkpoint = Checkpoint(str(tmp_path), key)
+    checkpoint.start()
+    assert not checkpoint.resumed
+    checkpoint.add({"id": 1})
+    checkpoint.add(None)
+    checkpoint.add({"id": 3}, variables={"after": "c3"})
+    checkpoint.close()
+
+    checkpoint = Checkpoint(str(tmp_path), key)
+    checkpoint.start()
+    assert checkpoint.resumed
+    assert checkpoint.position == 3  # noqa: PLR2004
+    assert checkpoint.state["variables"] == {"after": "c3"}
+    assert list(checkpoint.replay()) == [{"id": 1}, {"id": 3}]
+    started = checkpoint.state["started"]
+    checkpoint.add({"id": 4})
+    checkpoint.finish()
+    assert checkpoint.watermark() == started
+    assert sorted(_.name for _ in tmp_path.iterdir()) == [f"{key}.watermark.json"]
+
+
+def test_checkpoint_unsaved_results(tmp_path: Path) -> None:
+    """Test that results after the last saved state are dropped"""
+    checkpoint = Checkpoint(str(tmp_path), "key")
+    checkpoint.start()
+    checkpoint.add({"id": 1})
+    checkpoint.save()
+    checkpoint.add({"id": 2})
+    assert checkpoint.output is not None
+    checkpoint.output.flush()  # written, but the state was not saved (e.g. killed)
+
+    checkpoint = Checkpoint(str(tmp_path), "key")
+    checkpoint.start()
+    assert checkpoint.position == 1
+    assert list(checkpoint.replay()) == [{"id": 1}]
+    assert Checkpoint(str(tmp_path), "other").watermark() is None
@@ -0,0 +1,50 @@
+"""JSON codec and compression tests."""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+from cmem_plugin_graphql.workflow import codec
+from cmem_plugin_graphql.workflow.codec import (
+    COMPRESSION_DEFLATE,
+    COMPRESSION_GZIP,
+    COMPRESSORS,
+    accept_encoding,
+    compress,
+    dumps,
+    loads,
+)
+
+
+def test_json_codec() -> None:
+    """Test serializing to UTF-8 and deserializing text and bytes"""
+    value = {"name": "Äpfel", "ids": [1, 2.5, None, True]}
+    assert isinstance(dumps(value), bytes)
+    assert loads(dumps(value)) == value
+    assert loads(dumps(value).decode("utf-8")) == value
+
+
+def test_compress() -> None:
+    """Test request body compression"""
+    body = dumps([{"query": "{ fruit { id } }"}] * 100)
+    assert gzip.decompress(compress(body, COMPRESSION_GZIP)) == body
+    assert zlib.decompress(compress(body, COMPRESSION_DEFLATE)) == body
+    assert "gzip" in accept_encoding()
+    with pytest.raises(ValueError, match="not available"):
+        compress(body, "unknown")
+    for encoding in COMPRESSORS:
+        assert len(compress(body, encoding)) < len(body)
+
+
+def test_json_codec_big_integers() -> None:
+    """Test that integers beyond 64 bits stay exact without fast decoding"""
+    value = {"id": 123456789012345678901234567890}
+    assert json.loads(dumps(value)) == value
+    assert loads(dumps(value)) == value
+    if codec.orjson is None:
+        with pytest.raises(ValueError, match="orjson"):
+            loads(dumps(value), fast=True)
+    else:
+        assert loads(dumps({"id": 1}), fast=True) == {"id": 1}
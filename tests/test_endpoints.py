@@ -0,0 +1,67 @@
+"""Endpoint load balancing tests."""
+
+import aiohttp
+import pytest
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+from cmem_plugin_graphql.workflow.endpoints import (
+    BALANCING_LATENCY,
+    EJECTION_FAILURES,
+    EndpointPool,
+    is_endpoint_failure,
+)
+
+URLS = ["http://a.example/graphql", "http://b.example/graphql", "http://c.example/graphql"]
+
+
+def test_least_outstanding() -> None:
+    """Test that requests go to the endpoint with the least outstanding requests"""
+    pool = EndpointPool([*URLS, URLS[0]])
+    assert [_.url for _ in pool.endpoints] == URLS
+    first, second, third = (pool.acquire() for _ in range(3))
+    assert [first.url, second.url, third.url] == URLS
+    pool.release(second, 0.01)
+    assert pool.acquire() is second
+    with pytest.raises(ValueError, match="Unknown load balancing"):
+        EndpointPool(URLS, "random")
+
+
+def test_latency_weighted() -> None:
+    """Test that slow endpoints get requests only when the fast ones are busy"""
+    pool = EndpointPool(URLS[:2], BALANCING_LATENCY)
+    fast, slow = pool.endpoints
+    pool.release(pool.acquire(), 0.01)
+    # endpoints without measured latency are tried first
+    assert pool.acquire() is slow
+    pool.release(slow, 0.045)
+    assert [pool.acquire() for _ in range(4)] == [fast, fast, fast, fast]
+    # four requests in flight on the fast endpoint cost more than none on the slow one
+    assert pool.acquire() is slow
+
+
+def test_ejection() -> None:
+    """Test that an endpoint is ejected after consecutive failures"""
+    pool = EndpointPool(URLS[:2])
+    failing, healthy = pool.endpoints
+    for attempt in range(EJECTION_FAILURES):
+        assert {pool.acquire(), pool.acquire()} == {failing, healthy}
+        assert not pool.release(healthy, 0.01)
+        assert pool.release(failing, 0.01, failed=True) == (attempt == EJECTION_FAILURES - 1)
+    assert [pool.acquire() for _ in range(3)] == [healthy, healthy, healthy]
+    # with all endpoints ejected, the first one back is used
+    for _ in range(EJECTION_FAILURES):
+        pool.release(healthy, 0.01, failed=True)
+    assert pool.acquire() is failing
+    # a single endpoint is never ejected
+    single = EndpointPool(URLS[:1])
+    for _ in range(EJECTION_FAILURES):
+        assert not single.release(single.acquire(), 0.01, failed=True)
+
+
+def test_is_endpoint_failure() -> None:
+    """Test which errors count against the health of an endpoint"""
+    assert is_endpoint_failure(TransportServerError("bad gateway", 502))
+    assert is_endpoint_failure(aiohttp.ClientConnectionError())
+    assert is_endpoint_failure(TimeoutError())
+    assert not is_endpoint_failure(TransportServerError("too many requests", 429))
+    assert not is_endpoint_failure(TransportQueryError("Unknown field"))
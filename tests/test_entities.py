@@ -0,0 +1,131 @@
+"""Output entities tests."""
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from cmem_plugin_base.dataintegration.plugins import PluginLogger
+from cmem_plugin_base.dataintegration.utils.entity_builder import build_entities_from_data
+
+from cmem_plugin_graphql.workflow import entities
+from cmem_plugin_graphql.workflow.entities import build_lazy_entities
+
+RESULTS: list[dict[str, Any]] = [
+    {"fruit": {"id": "1", "fruit_name": "Manzana", "tags": ["red", "sweet"]}},
+    {"fruit": {"id": "2", "fruit_name": "Banana", "tags": []}},
+    {"fruit": {"id": "3", "fruit_name": None, "tags": ["yellow"]}},
+]
+
+
+class WarningLogger(PluginLogger):
+    """Logger which keeps the warnings"""
+
+    def __init__(self) -> None:
+        self.warnings: list[str] = []
+
+    def warning(self, message: str) -> None:
+        """Keep the warning"""
+        self.warnings.append(message)
+
+
+def test_lazy_entities(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that lazy entities match the eager entity builder"""
+    monkeypatch.setattr(entities, "SCHEMA_SAMPLE_SIZE", 1)
+    pulled: list[dict[str, Any]] = []
+
+    def results() -> Iterator[dict[str, Any]]:
+        for result in RESULTS:
+            pulled.append(result)
+            yield result
+
+    lazy = build_lazy_entities(results())
+    eager = build_entities_from_data(RESULTS)
+    assert lazy
+    assert eager
+    assert eager.sub_entities
+    assert lazy.sub_entities
+    assert lazy.schema == eager.schema
+    assert len(pulled) == 1
+
+    root = iter(lazy.entities)
+    next(root)
+    assert len(pulled) == 1
+    next(root)
+    assert len(pulled) == 2  # noqa: PLR2004
+    assert len(list(root)) == 1
+
+    lazy_fruits = lazy.sub_entities[0]
+    eager_fruits = eager.sub_entities[0]
+    assert lazy_fruits.schema == eager_fruits.schema
+    assert [_.values for _ in lazy_fruits.entities] == [_.values for _ in eager_fruits.entities]
+
+
+def test_lazy_entities_sub_entities_first() -> None:
+    """Test consuming sub entities before the root entities"""
+    lazy = build_lazy_entities(iter(RESULTS))
+    assert lazy
+    assert lazy.sub_entities
+    assert len(list(lazy.sub_entities[0].entities)) == len(RESULTS)
+    assert len(list(lazy.entities)) == len(RESULTS)
+
+
+def test_lazy_entities_null_values() -> None:
+    """Test that the schema is derived from several results"""
+    lazy = build_lazy_entities(iter([*RESULTS, {"fruit": None}, {"unknown": 1}]))
+    assert lazy
+    assert [_.path for _ in lazy.schema.paths] == ["fruit", "unknown"]
+    assert [_.values for _ in lazy.entities][-2:] == [[[""], [""]], [[""], ["1"]]]
+
+
+def test_lazy_entities_null_before_object() -> None:
+    """Test an object after a null value and an empty list"""
+    lazy = build_lazy_entities(
+        iter(
+            [
+                {"fruit": None, "tags": []},
+                {"fruit": {"id": 1, "name": "a"}, "tags": [{"name": "red"}]},
+            ]
+        )
+    )
+    assert lazy
+    assert lazy.sub_entities
+    assert [(_.is_relation, _.is_single_value) for _ in lazy.schema.paths] == [
+        (True, True),
+        (True, False),
+    ]
+    root = list(lazy.entities)
+    fruits, tags = (list(_.entities) for _ in lazy.sub_entities)
+    assert [_.values for _ in fruits] == [[["1"], ["a"]]]
+    assert [_.values for _ in tags] == [[["red"]]]
+    assert root[1].values == [[fruits[0].uri], [tags[0].uri]]
+
+
+def test_lazy_entities_mixed_values() -> None:
+    """Test that objects and other values of the same key are JSON values"""
+    lazy = build_lazy_entities(iter([{"value": "a"}, {"value": {"id": 1}}, {"value": [1, 2]}]))
+    assert lazy
+    assert lazy.sub_entities == []
+    assert [_.values for _ in lazy.entities] == [[["a"]], [['{"id": 1}']], [["[1, 2]"]]]
+
+
+def test_lazy_entities_outside_schema(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test values after the schema sample which do not fit into the schema"""
+    monkeypatch.setattr(entities, "SCHEMA_SAMPLE_SIZE", 1)
+    log = WarningLogger()
+    results: list[dict[str, Any]] = [
+        {"fruit": None, "tags": [{"name": "red"}]},
+        {"fruit": {"id": 1, "name": "a"}, "tags": "green"},
+        {"fruit": {"id": 2}, "unknown": 1},
+    ]
+    lazy = build_lazy_entities(iter(results), log)
+    assert lazy
+    assert [_.values for _ in lazy.entities][1:] == [
+        [['{"id": 1, "name": "a"}'], []],
+        [['{"id": 2}'], [""]],
+    ]
+    assert len(log.warnings) == 3  # noqa: PLR2004
+
+
+def test_no_results() -> None:
+    """Test that no entities are built without results"""
+    assert build_lazy_entities(iter([])) is None
@@ -14,6 +14,7 @@ from cmem_plugin_base.dataintegration.entity import (
 )
 from requests import HTTPError
 
+from cmem_plugin_graphql.workflow import session
 from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
 from cmem_plugin_graphql.workflow.utils import is_jinja_template
 
@@ -234,6 +235,13 @@ def test_is_string_jinja_template() -> None:
     assert not is_jinja_template(query)
     query = "query allFruits($id:ID!) { fruit(id:$id) { id\n scientific_name } }\n   "
     assert not is_jinja_template(query)
+    query = "query allFruits($id:ID!) { fruit(id:$id) { id\n scientific_name } }\n"
+    assert not is_jinja_template(query)
+    assert is_jinja_template('{"id" : {{ id }}}')
+    assert is_jinja_template("query { fruit(id: 1) { {% for f in fields %}{{ f }} {% endfor %}} }")
+    # templates which render to their own text without context
+    assert is_jinja_template("{{ '{{ id }}' }}")
+    assert is_jinja_template("query { fruits {% raw %}{ id }{% endraw %} }")
 
 
 @needs_cmem
@@ -264,5 +272,67 @@ def test_validate_invalid_inputs() -> None:
         )
 
 
+def test_validate_max_concurrent_requests() -> None:
+    """Test validation of the concurrency limit."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="Maximum concurrent requests"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, max_concurrent_requests=0)
+
+
+def test_validate_throttling() -> None:
+    """Test validation of rate limit and retries."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="Rate limit"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, rate_limit=-1)
+    with pytest.raises(ValueError, match="Maximum retries"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, max_retries=-1)
+
+
+def test_validate_request_compression() -> None:
+    """Test validation of the request compression."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="Unknown request compression"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, request_compression="lzma")
+
+
+def test_validate_checkpoint() -> None:
+    """Test validation of the checkpoint options."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="needs a checkpoint directory"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, incremental_variable="since")
+
+
+def test_validate_bulk() -> None:
+    """Test validation of the bulk options."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="Bulk size"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, bulk_variable="in", bulk_size=0)
+
+
+def test_validate_replicas() -> None:
+    """Test validation of replica URLs and load balancing."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="valid GraphQL replica URL"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, graphql_replica_urls="replica")
+    with pytest.raises(ValueError, match="Unknown load balancing"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, load_balancing="random")
+
+
+def test_validate_stages() -> None:
+    """Test validation of the stage queue size."""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="Stage queue size"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, stage_queue_size=-1)
+
+
+def test_validate_fast_json_decoding(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that fast JSON decoding needs orjson."""
+    monkeypatch.setattr(session, "orjson", None)
+    query = "query{fruit(id:1){id,fruit_name}}"
+    with pytest.raises(ValueError, match="needs the orjson package"):
+        GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query, fast_json_decoding=True)
+    assert not GraphQLPlugin(graphql_url=GRAPHQL_URL, graphql_query=query).fast_json_decoding
+
+
 def test_dummy() -> None:
     """Dummy test to avoid pytest to run amok in case no cmem is available."""
@@ -0,0 +1,65 @@
+"""Execution metrics tests."""
+
+import json
+
+from cmem_plugin_graphql.workflow.metrics import (
+    STAGE_DECODE,
+    STAGE_REQUEST,
+    Metrics,
+    percentile,
+)
+
+
+def test_percentile() -> None:
+    """Test nearest-rank percentiles"""
+    values = [float(_) for _ in range(1, 101)]
+    assert percentile(values, 50) == 50  # noqa: PLR2004
+    assert percentile(values, 95) == 95  # noqa: PLR2004
+    assert percentile(values, 99) == 99  # noqa: PLR2004
+    assert percentile([0.5], 99) == 0.5  # noqa: PLR2004
+    assert percentile([], 50) == 0
+
+
+def test_metrics() -> None:
+    """Test timings, counters, bytes and the report summary"""
+    metrics = Metrics()
+    for milliseconds in range(1, 101):
+        metrics.record(STAGE_REQUEST, milliseconds / 1000)
+    with metrics.time("write"):
+        pass
+    metrics.count("retried_requests")
+    metrics.count("retried_requests", 2)
+    body = metrics.dumps({"query": "{ fruit { id } }"})
+    assert metrics.bytes_sent == len(body)
+    assert metrics.loads('{"data": {"name": "ä"}}') == {"data": {"name": "ä"}}
+    assert metrics.bytes_received == len('{"data": {"name": "ä"}}'.encode())
+
+    result = metrics.as_dict()
+    json.dumps(result)
+    assert result["requests"] == 100  # noqa: PLR2004
+    assert result["counters"] == {"retried_requests": 3}
+    assert result["stages"][STAGE_REQUEST]["p95"] == 0.095  # noqa: PLR2004
+    assert result["stages"][STAGE_DECODE]["count"] == 1
+    summary = dict(metrics.summary())
+    assert summary["Requests"] == "100"
+    assert summary["Request latency p50 / p95 / p99"] == "50.0 ms / 95.0 ms / 99.0 ms"
+    assert "Time writing" in summary
+
+    metrics.reset()
+    assert metrics.requests == 0
+    assert metrics.counters == {}
+
+
+def test_metrics_merge() -> None:
+    """Test merging the metrics of a worker"""
+    metrics = Metrics()
+    metrics.record(STAGE_REQUEST, 0.1)
+    metrics.count("retried_requests")
+    worker = Metrics()
+    worker.record(STAGE_REQUEST, 0.2)
+    worker.count("retried_requests")
+    worker.dumps({"id": 1})
+    metrics.merge(worker)
+    assert metrics.requests == 2  # noqa: PLR2004
+    assert metrics.counters == {"retried_requests": 2}
+    assert metrics.bytes_sent == worker.bytes_sent
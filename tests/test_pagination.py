@@ -0,0 +1,140 @@
+"""Pagination tests."""
+
+import asyncio
+from collections.abc import Coroutine
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from cmem_plugin_graphql.workflow.checkpoint import Checkpoint
+from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+from cmem_plugin_graphql.workflow.pagination import (
+    PAGINATION_CURSOR,
+    PAGINATION_OFFSET,
+    next_page_variables,
+)
+
+GRAPHQL_URL = "https://example.org/graphql"
+CURSOR_QUERY = (
+    "query ($after: String) { shop { fruits(after: $after)"
+    " { edges pageInfo { hasNextPage endCursor } } } }"
+)
+OFFSET_QUERY = "query ($offset: Int, $limit: Int) { fruits(offset: $offset, limit: $limit) }"
+ITEMS = list(range(25))
+
+
+def cursor_page(variable_values: dict[str, Any]) -> dict[str, Any]:
+    """Return a relay connection page"""
+    start = int(variable_values.get("after") or 0)
+    end = min(start + 10, len(ITEMS))
+    return {
+        "shop": {
+            "fruits": {
+                "edges": ITEMS[start:end],
+                "pageInfo": {"hasNextPage": end < len(ITEMS), "endCursor": str(end)},
+            }
+        }
+    }
+
+
+def offset_page(variable_values: dict[str, Any]) -> dict[str, Any]:
+    """Return an offset page"""
+    offset = variable_values["offset"]
+    return {"fruits": ITEMS[offset : offset + variable_values["limit"]]}
+
+
+class PageSession:
+    """Session stand-in which answers with pages and fails after max_requests"""
+
+    def __init__(self, page: Any, max_requests: int | None = None) -> None:  # noqa: ANN401
+        self.page = page
+        self.max_requests = max_requests
+        self.variables: list[dict[str, Any]] = []
+
+    def open(self) -> None:
+        """Open the session"""
+
+    def close(self) -> None:
+        """Close the session"""
+
+    def run(self, coroutine: Coroutine[Any, Any, Any]) -> Any:  # noqa: ANN401
+        """Run a coroutine"""
+        return asyncio.run(coroutine)
+
+    async def execute(self, document: Any, variable_values: dict[str, Any]) -> dict[str, Any]:  # noqa: ANN401, ARG002
+        """Answer with the page of the variables"""
+        if self.max_requests is not None and len(self.variables) >= self.max_requests:
+            raise ConnectionError("endpoint failed")
+        self.variables.append(variable_values)
+        result: dict[str, Any] = self.page(variable_values)
+        return result
+
+
+def cursor_plugin(**parameters: Any) -> GraphQLPlugin:  # noqa: ANN401
+    """Create a plugin with cursor pagination"""
+    return GraphQLPlugin(
+        graphql_url=GRAPHQL_URL,
+        graphql_query=CURSOR_QUERY,
+        pagination=PAGINATION_CURSOR,
+        pagination_path="shop.fruits",
+        pagination_variable="after",
+        **parameters,
+    )
+
+
+def test_cursor_pagination() -> None:
+    """Test following relay cursors"""
+    plugin = cursor_plugin()
+    plugin.session = PageSession(cursor_page)  # type: ignore[assignment]
+    pages = list(plugin.execute_query())
+    assert [page["shop"]["fruits"]["edges"] for page in pages] == [
+        ITEMS[0:10],
+        ITEMS[10:20],
+        ITEMS[20:25],
+    ]
+    with pytest.raises(ValueError, match="not found"):
+        next_page_variables(PAGINATION_CURSOR, pages[0], "fruits", "after", {})
+    with pytest.raises(ValueError, match="pageInfo"):
+        next_page_variables(PAGINATION_CURSOR, pages[0], "shop", "after", {})
+
+
+def test_offset_pagination() -> None:
+    """Test increasing offsets until a page is empty"""
+    plugin = GraphQLPlugin(
+        graphql_url=GRAPHQL_URL,
+        graphql_query=OFFSET_QUERY,
+        graphql_variable_values='{"offset": 0, "limit": 10}',
+        pagination=PAGINATION_OFFSET,
+        pagination_path="fruits",
+        pagination_variable="offset",
+    )
+    plugin.session = PageSession(offset_page)  # type: ignore[assignment]
+    pages = list(plugin.execute_query())
+    assert [page["fruits"] for page in pages] == [ITEMS[0:10], ITEMS[10:20], ITEMS[20:25], []]
+
+
+def test_pagination_resume(tmp_path: Path) -> None:
+    """Test that an interrupted pagination resumes with the next page"""
+    plugin = cursor_plugin(checkpoint_directory=str(tmp_path))
+    plugin.session = PageSession(cursor_page, max_requests=2)  # type: ignore[assignment]
+    checkpoint = Checkpoint(str(tmp_path), "pages")
+    checkpoint.start()
+    pages: list[dict[str, Any]] = []
+    with pytest.raises(ConnectionError):
+        pages.extend(plugin.execute_query(checkpoint))
+    checkpoint.close()
+    assert len(pages) == 2  # noqa: PLR2004
+
+    session = PageSession(cursor_page)
+    plugin.session = session  # type: ignore[assignment]
+    checkpoint = Checkpoint(str(tmp_path), "pages")
+    checkpoint.start()
+    assert checkpoint.position == len(pages)
+    pages = [*checkpoint.replay(), *plugin.execute_query(checkpoint)]
+    assert session.variables == [{"after": "20"}]
+    assert [page["shop"]["fruits"]["edges"] for page in pages] == [
+        ITEMS[0:10],
+        ITEMS[10:20],
+        ITEMS[20:25],
+    ]
@@ -0,0 +1,35 @@
+"""Automatic persisted queries tests."""
+
+import hashlib
+
+from cmem_plugin_graphql.workflow.persisted import (
+    is_persisted_query_not_found,
+    persisted_operation,
+    query_hash,
+)
+
+QUERY = "query { fruit(id: 1) { id } }"
+
+
+def test_persisted_operation() -> None:
+    """Test the request body of persisted queries"""
+    sha256 = hashlib.sha256(QUERY.encode()).hexdigest()
+    assert query_hash(QUERY) == sha256
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+    assert persisted_operation(QUERY, None) == {"extensions": extensions}
+    assert persisted_operation(QUERY, {"id": 1}, include_query=True) == {
+        "extensions": extensions,
+        "query": QUERY,
+        "variables": {"id": 1},
+    }
+
+
+def test_persisted_query_not_found() -> None:
+    """Test the detection of unknown persisted queries"""
+    assert is_persisted_query_not_found({"errors": [{"message": "PersistedQueryNotFound"}]})
+    assert is_persisted_query_not_found(
+        {"errors": [{"message": "unknown", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+    )
+    assert not is_persisted_query_not_found({"errors": [{"message": "Syntax Error"}]})
+    assert not is_persisted_query_not_found({"data": {"fruit": None}})
+    assert not is_persisted_query_not_found([{"errors": []}])
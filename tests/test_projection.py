@@ -0,0 +1,77 @@
+"""Result projection tests."""
+
+from typing import Any
+
+import pytest
+
+from cmem_plugin_graphql.workflow.entities import build_projected_entities
+from cmem_plugin_graphql.workflow.projection import parse_path, parse_projection
+
+RESULTS: list[dict[str, Any]] = [
+    {
+        "shop": {"name": "Market", "owner": {"name": "Ana"}},
+        "fruits": [
+            {"id": "1", "fruit_name": "Manzana", "tags": ["red", "sweet"]},
+            {"id": "2", "fruit_name": None, "tags": [], "origin": {"country": "ES"}},
+        ],
+    },
+    {"shop": {"name": "Kiosk"}, "fruits": []},
+    {"shop": {"name": "Stand"}, "fruits": [{"id": "3", "fruit_name": "Banana"}]},
+]
+
+
+def test_parse_path() -> None:
+    """Test parsing keys, list indexes and [*]"""
+    assert parse_path("$.shop.owner.name") == (("shop", "owner", "name"), None)
+    assert parse_path("fruits[0].id") == (("fruits", 0, "id"), None)
+    assert parse_path("$.data.fruits[*].origin.country") == (
+        ("data", "fruits"),
+        ("origin", "country"),
+    )
+    for path in ("", "$", "fruits..id", "fruits[*].tags[*]", "fruits[x]"):
+        with pytest.raises(ValueError, match="(?i)projection path"):
+            parse_path(path)
+
+
+def test_projection_unnest() -> None:
+    """Test that list items are rows and other columns are repeated"""
+    projection = parse_projection(
+        """
+        shop: $.shop.name
+        $.fruits[*].id
+        name: $.fruits[*].fruit_name
+        fruits[*].tags
+        country: fruits[*].origin
+        """
+    )
+    assert projection
+    assert projection.columns == ["shop", "id", "name", "tags", "country"]
+    entities = build_projected_entities(iter(RESULTS), projection)
+    assert [_.path for _ in entities.schema.paths] == projection.columns
+    assert [_.values for _ in entities.entities] == [
+        [["Market"], ["1"], ["Manzana"], ["red", "sweet"], [""]],
+        [["Market"], ["2"], [""], [], ['{"country": "ES"}']],
+        [["Stand"], ["3"], ["Banana"], [""], [""]],
+    ]
+
+
+def test_projection_without_unnest() -> None:
+    """Test one row per result and missing values"""
+    projection = parse_projection("shop.name\nowner: shop.owner.name\nfirst: fruits[0].id")
+    assert projection
+    assert [list(projection.rows(_)) for _ in RESULTS] == [
+        [[["Market"], ["Ana"], ["1"]]],
+        [[["Kiosk"], [""], [""]]],
+        [[["Stand"], [""], ["3"]]],
+    ]
+
+
+def test_parse_projection_errors() -> None:
+    """Test invalid projections"""
+    assert parse_projection("\n  \n") is None
+    with pytest.raises(ValueError, match="unique names"):
+        parse_projection("shop.name\nname: fruits[*].fruit_name")
+    with pytest.raises(ValueError, match="one list"):
+        parse_projection("fruits[*].id\ntags: shops[*].tags")
+    with pytest.raises(ValueError, match="Invalid projection column"):
+        parse_projection("id:")
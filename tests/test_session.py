@@ -0,0 +1,72 @@
+"""Session tests."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from cmem_plugin_graphql.workflow.session import GraphQLSession, run_ordered
+from cmem_plugin_graphql.workflow.utils import parse_query
+
+
+def test_run_ordered() -> None:
+    """Test ordered results and bounded concurrency"""
+    in_flight = 0
+    max_seen = 0
+
+    async def delayed(value: int) -> int:
+        nonlocal in_flight, max_seen
+        in_flight += 1
+        max_seen = max(max_seen, in_flight)
+        await asyncio.sleep(0.001 * (10 - value))
+        in_flight -= 1
+        return value
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert list(run_ordered(loop, delayed, range(10), max_in_flight=4)) == list(range(10))
+        assert max_seen == 4  # noqa: PLR2004
+        with pytest.raises(ValueError, match="at least 1"):
+            list(run_ordered(loop, delayed, range(10), max_in_flight=0))
+    finally:
+        loop.close()
+
+
+def test_session_not_open() -> None:
+    """Test that a closed session refuses to run requests"""
+    session = GraphQLSession(url="http://localhost/graphql", headers={})
+    assert not session.is_open
+    session.close()
+    with pytest.raises(RuntimeError, match="not open"):
+        list(session.map(asyncio.sleep, [0]))
+
+
+def test_session_deduplicates_queries(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that identical queries are sent once and mutations are always sent"""
+    sent: list[str] = []
+
+    async def request(payload: dict[str, Any], get: bool = False) -> dict[str, Any]:  # noqa: ARG001
+        sent.append(f"{payload['query']} {payload['variables']}")
+        await asyncio.sleep(0.001)
+        return {"data": {"id": payload["variables"]["id"]}}
+
+    query = parse_query("query ($id: Int) { fruit(id: $id) { id } }")
+    mutation = parse_query("mutation ($id: Int) { addFruit(id: $id) { id } }")
+    session = GraphQLSession(url="http://localhost/graphql", headers={}, max_in_flight=3)
+    session._loop = asyncio.new_event_loop()  # noqa: SLF001
+    session._session = object()  # type: ignore[assignment]  # noqa: SLF001
+    session._request = request  # type: ignore[method-assign]  # noqa: SLF001
+    try:
+        ids = [1, 1, 2, 1, 2, 3, 1]
+        results = session.map(lambda _: session.execute(query, {"id": _}), ids)
+        assert [_["id"] for _ in results] == ids
+        assert len(sent) == 3  # noqa: PLR2004
+        assert session.deduplicated == len(ids) - 3
+        list(session.map(lambda _: session.execute(mutation, {"id": _}), [1, 1]))
+        assert len(sent) == 5  # noqa: PLR2004
+        # only the most recent results are kept for later requests
+        monkeypatch.setattr("cmem_plugin_graphql.workflow.session.SHARED_RESULTS_SIZE", 2)
+        list(session.map(lambda _: session.execute(query, {"id": _}), [4, 5, 6, 4]))
+        assert len(sent) == 9  # noqa: PLR2004
+    finally:
+        session.close()
@@ -0,0 +1,130 @@
+"""Pipeline stage tests."""
+
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+from cmem_plugin_base.dataintegration.context import (
+    ExecutionContext,
+    ExecutionReport,
+    ReportContext,
+    TaskContext,
+)
+
+from cmem_plugin_graphql.workflow.metrics import STAGE_FETCH_BLOCKED, Metrics
+from cmem_plugin_graphql.workflow.stages import StageContext, staged
+
+
+def test_staged_backpressure() -> None:
+    """Test that the producer runs ahead of the consumer by at most the queue size"""
+    produced: list[int] = []
+    threads: set[str] = set()
+
+    def items() -> Iterator[int]:
+        try:
+            for item in range(20):
+                produced.append(item)
+                yield item
+        finally:
+            threads.add(threading.current_thread().name)
+
+    metrics = Metrics()
+    results = staged(items(), 3, metrics)
+    consumed: list[int] = []
+    for item in results:
+        time.sleep(0.01)  # a slow consumer
+        # the chunks in the queue, of the consumer and of the waiting producer
+        assert len(produced) - len(consumed) <= 3 * 3
+        consumed.append(item)
+    assert consumed == list(range(20))
+    # the items are closed in the producer thread
+    assert threads == {"results stage"}
+    assert metrics.queue("results")["max"] <= 3  # noqa: PLR2004
+    assert metrics.stage(STAGE_FETCH_BLOCKED)["total"] > 0
+
+
+def test_staged_errors_and_early_stop() -> None:
+    """Test that producer errors are raised and an early stop closes the producer"""
+
+    def failing() -> Iterator[int]:
+        yield 1
+        raise ValueError("failed")
+
+    results = staged(failing(), 10, Metrics())
+    assert next(results) == 1
+    with pytest.raises(ValueError, match="failed"):
+        next(results)
+
+    closed = threading.Event()
+
+    def endless() -> Iterator[int]:
+        try:
+            yield from iter(int, 1)
+        finally:
+            closed.set()
+
+    results = staged(endless(), 10, Metrics())
+    assert next(results) == 0
+    results.close()  # type: ignore[attr-defined]
+    assert closed.is_set()
+    with pytest.raises(ValueError, match="Queue size"):
+        next(staged(endless(), 0, Metrics()))
+
+
+class ThreadReportContext(ReportContext):
+    """Report context which keeps the reports and the threads which updated them"""
+
+    def __init__(self) -> None:
+        self.reports: list[int] = []
+        self.threads: set[str] = set()
+
+    def update(self, report: ExecutionReport) -> None:
+        """Keep the report and the thread"""
+        self.reports.append(report.entity_count)
+        self.threads.add(threading.current_thread().name)
+
+
+class ThreadTaskContext(TaskContext):
+    """Task context which keeps the threads which called it"""
+
+    def __init__(self) -> None:
+        self.threads: set[str] = set()
+
+    def project_id(self) -> str:
+        """Get the project identifier"""
+        self.threads.add(threading.current_thread().name)
+        return "project"
+
+    def task_id(self) -> str:
+        """Get the task identifier"""
+        self.threads.add(threading.current_thread().name)
+        return "task"
+
+
+class ThreadExecutionContext(ExecutionContext):
+    """Execution context which keeps the threads which called it"""
+
+    def __init__(self) -> None:
+        self.report = ThreadReportContext()
+        self.task = ThreadTaskContext()
+        self.user = None
+        self.workflow = None
+
+
+def test_stage_context() -> None:
+    """Test that the producer reports reach the context in the consumer thread"""
+    context = ThreadExecutionContext()
+    stage_context = StageContext(context)
+
+    def items() -> Iterator[int]:
+        assert stage_context.task.project_id() == "project"
+        for item in range(100):
+            stage_context.report.update(ExecutionReport(entity_count=item))
+            yield item
+        stage_context.report.update(ExecutionReport(entity_count=100))
+
+    results = stage_context.relay(staged(items(), 10, Metrics()))
+    assert list(results) == list(range(100))
+    assert context.report.reports[-1] == 100  # noqa: PLR2004
+    assert context.report.threads == context.task.threads == {threading.current_thread().name}
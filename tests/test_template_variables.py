@@ -0,0 +1,90 @@
+"""Template variables tests."""
+
+import pytest
+from graphql import build_schema
+
+from cmem_plugin_graphql.workflow.graphql import GraphQLPlugin
+from cmem_plugin_graphql.workflow.template_variables import (
+    parse_variable_types,
+    rewrite_template,
+)
+from cmem_plugin_graphql.workflow.utils import print_query
+
+SCHEMA = build_schema(
+    """
+    type Fruit { id: ID! name: String }
+    type Query { fruit(id: ID!, name: String, limit: Int, tags: [String!]): Fruit }
+    """
+)
+
+
+def test_rewrite_template() -> None:
+    """Test rewriting placeholders into typed variables"""
+    template = rewrite_template(
+        'query f($name: String) { fruit(id: "{{ id }}", name: $name, limit: {{ n }}) { id } }',
+        SCHEMA,
+    )
+    assert template is not None
+    assert print_query(template.document) == (
+        "query f($name: String, $_jinja0: ID!, $_jinja1: Int) {\n"
+        "  fruit(id: $_jinja0, name: $name, limit: $_jinja1) {\n    id\n  }\n}"
+    )
+    assert template.variable_values({"id": "a1", "n": "3"}) == {"_jinja0": "a1", "_jinja1": 3}
+    # list items get the item type
+    template = rewrite_template('{ fruit(id: 1, tags: ["{{ tag }}"]) { id } }', SCHEMA)
+    assert template is not None
+    assert "$_jinja0: String!" in print_query(template.document)
+
+
+def test_rewrite_template_declared_types() -> None:
+    """Test rewriting without schema, with declared placeholder types"""
+    query = '{ fruit(id: "{{ id }}") { id } }'
+    assert rewrite_template(query) is None
+    template = rewrite_template(query, None, (("id", "ID!"),))
+    assert template is not None
+    # values are read like the content of a string in the query text
+    assert template.variable_values({"id": r"caf\u00e9"}) == {"_jinja0": "café"}
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        '{ fruit(id: "fruit {{ id }}") { id } }',
+        '{% if id %}{ fruit(id: "{{ id }}") { id } }{% endif %}',
+        "{ fruit(id: 1) { {{ field }} } }",
+        "{ fruit(id: 1) { id } }",
+        '{ fruit(id: "{{ id }}") { id } } { fruit(id: 2) { id } }',
+    ],
+)
+def test_rewrite_template_unsupported(query: str) -> None:
+    """Test templates which are rendered per entity"""
+    assert rewrite_template(query, SCHEMA) is None
+
+
+def test_parse_variable_types() -> None:
+    """Test parsing declared placeholder types"""
+    assert parse_variable_types("") == {}
+    assert parse_variable_types("id: ID!\n\nvalues.count : [Int]\n") == {
+        "id": "ID!",
+        "values.count": "[Int]",
+    }
+    with pytest.raises(ValueError, match="Invalid variable type declaration"):
+        parse_variable_types("ID!")
+    with pytest.raises(ValueError, match="Invalid GraphQL type"):
+        parse_variable_types("id: !ID")
+
+
+def test_prepare_request() -> None:
+    """Test requests of rewritten templates, also with static variables"""
+    plugin = GraphQLPlugin(
+        graphql_url="https://example.org/graphql",
+        graphql_query='{ fruit(id: "{{ id }}", name: $name) { id } }',
+        graphql_variable_values='{"name": "{{ name }}"}',
+        template_variables=True,
+        template_variable_types="id: ID!",
+    )
+    plugin.variable_template = plugin.get_variable_template()
+    request = plugin._prepare_request({"id": "1", "name": "apple"})  # noqa: SLF001
+    assert request is not None
+    assert request[0] is plugin.variable_template.document  # type: ignore[union-attr]
+    assert request[1] == {"name": "apple", "_jinja0": "1"}
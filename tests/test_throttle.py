@@ -0,0 +1,98 @@
+"""Rate limiting and retry tests."""
+
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import aiohttp
+import pytest
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from cmem_plugin_graphql.workflow.throttle import (
+    AdaptiveConcurrency,
+    TokenBucket,
+    is_overloaded,
+    is_retryable,
+    retry_after,
+    retry_delay,
+)
+
+
+def server_error(status: int, headers: dict[str, str] | None = None) -> TransportServerError:
+    """Create a transport error as raised by gql for an HTTP error response"""
+    cause = aiohttp.ClientResponseError(
+        request_info=None,  # type: ignore[arg-type]
+        history=(),
+        status=status,
+        headers=CIMultiDictProxy(CIMultiDict(headers or {})),
+    )
+    error = TransportServerError(f"{status}", status)
+    error.__cause__ = cause
+    return error
+
+
+def test_token_bucket() -> None:
+    """Test that the token bucket limits the request rate after the burst"""
+
+    async def take(bucket: TokenBucket, count: int) -> float:
+        start = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(take(TokenBucket(rate=0), 1000)) < 0.1  # noqa: PLR2004
+    assert asyncio.run(take(TokenBucket(rate=100, burst=1), 11)) >= 0.09  # noqa: PLR2004
+
+
+def test_adaptive_concurrency() -> None:
+    """Test AIMD adaption of the concurrency limit"""
+    limit = AdaptiveConcurrency(maximum=8)
+    with pytest.raises(ValueError, match="at least 1"):
+        AdaptiveConcurrency(maximum=0)
+
+    async def run() -> None:
+        epochs = [await limit.acquire() for _ in range(8)]
+        waiting = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        # a burst of rejections halves the limit once
+        for epoch in epochs[:4]:
+            limit.release(epoch, overloaded=True)
+        assert limit.limit == 4  # noqa: PLR2004
+        assert not waiting.done()
+        for epoch in epochs[4:]:
+            limit.release(epoch)
+        await waiting
+        assert limit.in_flight == 1
+        assert 4 < limit.limit < 5  # noqa: PLR2004
+
+    asyncio.run(run())
+
+
+def test_retry_policy() -> None:
+    """Test which errors are retried and how long to wait"""
+    assert is_overloaded(server_error(429))
+    assert not is_overloaded(server_error(500))
+    assert is_retryable(server_error(503), idempotent=False)
+    assert is_retryable(server_error(429), idempotent=False)
+    assert is_retryable(server_error(502))
+    assert is_retryable(server_error(504))
+    assert not is_retryable(server_error(502), idempotent=False)
+    assert not is_retryable(server_error(504), idempotent=False)
+    assert not is_retryable(server_error(400))
+    assert not is_retryable(TransportQueryError("invalid"))
+    assert is_retryable(aiohttp.ServerDisconnectedError())
+    assert not is_retryable(aiohttp.ServerDisconnectedError(), idempotent=False)
+    assert is_retryable(TimeoutError())
+
+    assert retry_after(server_error(429)) is None
+    assert retry_after(server_error(429, {"Retry-After": "2"})) == 2  # noqa: PLR2004
+    date = format_datetime(datetime.now(tz=UTC) + timedelta(seconds=30), usegmt=True)
+    assert 25 < (retry_after(server_error(503, {"Retry-After": date})) or 0) <= 30  # noqa: PLR2004
+    assert retry_after(server_error(503, {"Retry-After": "soon"})) is None
+
+    for attempt in range(10):
+        assert 0 <= retry_delay(attempt, backoff=0.5) <= min(60, 0.5 * 2**attempt)
+    assert 2 <= retry_delay(0, backoff=0.5, requested=2) <= 2.5  # noqa: PLR2004
@@ -0,0 +1,75 @@
+"""Utils tests."""
+
+import pytest
+from cmem_plugin_base.dataintegration.entity import Entities, Entity, EntityPath, EntitySchema
+from graphql import GraphQLSyntaxError
+
+from cmem_plugin_graphql.workflow.utils import (
+    batched,
+    create_entity,
+    get_dict,
+    get_entities_from_list,
+    get_template,
+    is_query,
+    parse_query,
+    print_query,
+)
+
+
+def test_parse_query_memoized() -> None:
+    """Test that equal query texts share one parsed document"""
+    query = "query{fruit(id:1){id,fruit_name}}"
+    assert parse_query(query) is parse_query(query)
+    assert parse_query(query) is not parse_query("query{fruit(id:2){id,fruit_name}}")
+    with pytest.raises(GraphQLSyntaxError):
+        parse_query("query1{fruit(id:1){id,fruit_name}}")
+
+
+def test_get_template_memoized() -> None:
+    """Test that templates are compiled once"""
+    source = '{"id" : {{ id }}}'
+    assert get_template(source) is get_template(source)
+    assert get_template(source).render({"id": 1}) == '{"id" : 1}'
+
+
+def test_batched() -> None:
+    """Test splitting iterables into batches"""
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+
+
+def test_get_dict() -> None:
+    """Test conversion of entities to dicts"""
+    schema = EntitySchema(type_uri="", paths=[EntityPath("id"), EntityPath("name")])
+    entities = Entities(
+        entities=iter([Entity("urn:1", [["1"], ["Apple"]]), Entity("urn:2", [["2"], []])]),
+        schema=schema,
+    )
+    assert list(get_dict(entities)) == [{"id": "1", "name": "Apple"}, {"id": "2", "name": ""}]
+
+
+def test_get_entities_from_list() -> None:
+    """Test conversion of dicts to entities"""
+    data = [{"id": 1, "origin": {"country": "x"}}, {"id": 2, "name": "Banana", "origin": None}]
+    entities = get_entities_from_list(data, uri_prefix="urn:row:")
+    assert [path.path for path in entities.schema.paths] == ["id", "origin", "name"]
+    rows = list(entities.entities)
+    assert [row.uri for row in rows] == ["urn:row:0", "urn:row:1"]
+    assert [row.values for row in rows] == [
+        [[1], ['{"country": "x"}'], []],
+        [[2], [], ["Banana"]],
+    ]
+    assert next(get_entities_from_list(data).entities).uri.startswith("urn:uuid:")
+
+    entity = create_entity(["name", "id"], data[1], entity_uri="urn:row:1")
+    assert entity.uri == "urn:row:1"
+    assert entity.values == [["Banana"], [2]]
+
+
+def test_is_query() -> None:
+    """Test detection of query operations"""
+    assert is_query(parse_query("{ fruit { id } }"))
+    assert is_query(parse_query("query a { fruit { id } } fragment f on Fruit { id }"))
+    assert not is_query(parse_query("mutation { addFruit(id: 1) { id } }"))
+    assert not is_query(parse_query("query a { fruit { id } } mutation b { addFruit { id } }"))
+    assert print_query(parse_query("{fruit{id}}")) == print_query(parse_query("{ fruit { id } }"))
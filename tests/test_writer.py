@@ -0,0 +1,40 @@
+"""Writer tests."""
+
+import json
+
+import pytest
+
+from cmem_plugin_graphql.workflow.writer import (
+    OUTPUT_FORMAT_JSON,
+    OUTPUT_FORMAT_JSON_LINES,
+    JsonResultWriter,
+)
+
+RESULTS = [
+    {"fruit": {"id": "1", "fruit_name": "Manzana", "tags": ["a", "b\nc"]}},
+    {"fruit": None},
+    {"fruits": []},
+]
+
+
+def write(results: list, output_format: str, pretty_print: bool) -> str:
+    """Write results and return the serialization"""
+    with JsonResultWriter(output_format, pretty_print) as writer:
+        for result in results:
+            writer.write(result)
+        return writer.finish().read().decode("utf-8")
+
+
+@pytest.mark.parametrize("results", [RESULTS, RESULTS[:1], []])
+def test_json_writer(results: list) -> None:
+    """Test JSON array output"""
+    assert write(results, OUTPUT_FORMAT_JSON, pretty_print=True) == json.dumps(results, indent=2)
+    assert write(results, OUTPUT_FORMAT_JSON, pretty_print=False) == json.dumps(results)
+
+
+def test_json_lines_writer() -> None:
+    """Test JSON Lines output"""
+    lines = write(RESULTS, OUTPUT_FORMAT_JSON_LINES, pretty_print=True).splitlines()
+    assert [json.loads(line) for line in lines] == RESULTS
+    with pytest.raises(ValueError, match="Unknown output format"):
+        JsonResultWriter("xml")